@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 from flask import Flask, app
 from flask_cors import CORS
@@ -7,7 +8,12 @@ from flask_jwt_extended import JWTManager
 load_dotenv()
 jwt = JWTManager()
 
-def create_app():
+def create_app(preload=False, warm_up=True):
+    """
+    The Flask app. preload=True when it's built in a gunicorn master before
+    workers fork (see wsgi.py); warm_up=False leaves loading the text-emotion
+    model (and starting model processes) to the first request that needs it.
+    """
     app = Flask(__name__)
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
     app.config["JWT_TOKEN_LOCATION"] = ["headers"]
@@ -15,7 +21,7 @@ def create_app():
     app,
     resources={r"/api/*": {"origins": "http://127.0.0.1:3000"}},
     supports_credentials=True,
-    allow_headers=["Authorization", "Content-Type"],
+    allow_headers=["Authorization", "Content-Type", "Idempotency-Key", "Prefer"],
     methods=["GET", "POST", "OPTIONS"]
 )
     
@@ -24,11 +30,25 @@ def create_app():
     # from .your_blueprint import your_blueprint
     # app.register_blueprint(your_blueprint)
     jwt.init_app(app)
+
+    # A preloading master would open Mongo connections its workers inherit;
+    # there each worker runs this after forking (gunicorn.conf.py post_fork)
+    if not preload:
+        from db import ensure_indexes
+        ensure_indexes()
+
     from app.routes import health
     app.register_blueprint(health.health_bp)
 
-    #from .routes import emotion_text
-    #app.register_blueprint(emotion_text.bp)
+    from .routes import emotion_text
+    app.register_blueprint(emotion_text.bp)
+    # Load the text-emotion model in the background; everything else serves right away.
+    # Not when it was preloaded: warm-up inference in a gunicorn master would
+    # start torch threads that don't survive the fork. Nor in a process started
+    # by multiprocessing (e.g. a model process re-importing a script under spawn)
+    if warm_up and os.getenv("SENTIMENT_WARMUP", "1") == "1" and not emotion_text.analyzer.ready \
+            and multiprocessing.parent_process() is None:
+        emotion_text.analyzer.start_warm_up()
 
     from .routes.spotify_routes import spotify_bp
     app.register_blueprint(spotify_bp)
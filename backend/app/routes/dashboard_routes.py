@@ -1,7 +1,12 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from db import moods_collection, playlists_collection
 from datetime import datetime, timedelta
+from app.services.mood_schema import make_mood_record, decode_emotion, samples_between
+from app.services.mood_rollups import mood_totals, day_start
+from app.services.mood_writer import BufferFullError
+from app.services.mood_ingest import ingest_moods
+from app.services.mood_runs import open_run, expand_runs
 
 dashboard_bp = Blueprint("dashboard", __name__)
 @dashboard_bp.route("/api/dashboard/summary", methods=["GET"])
@@ -9,12 +14,14 @@ dashboard_bp = Blueprint("dashboard", __name__)
 def dashboard_summary():
     spotify_id = get_jwt_identity()
 
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0)
+    # Exactly midnight, so today is summed from its rollup rather than scanned
+    today = day_start(datetime.utcnow())
 
-    moods_today = moods_collection.count_documents({
-        "spotify_id": spotify_id,
-        "timestamp": {"$gte": today}
-    })
+    moods_today = sum(mood_totals(spotify_id, today)[0].values())
+
+    current_run = open_run(spotify_id)
+    if current_run:
+        moods_today += samples_between(current_run, today)
 
     playlists_today = playlists_collection.count_documents({
         "spotify_id": spotify_id,
@@ -22,29 +29,36 @@ def dashboard_summary():
     })
 
     last_mood = moods_collection.find(
-        {"spotify_id": spotify_id}
-    ).sort("timestamp", -1).limit(1)
+        {"u": spotify_id},
+        {"_id": 0, "e": 1, "c": 1}
+    ).sort("t", -1).limit(1)
 
-    last_mood = list(last_mood)
+    last_mood = [current_run] if current_run else list(last_mood)
 
     return jsonify({
         "playlists_today": playlists_today,
-        "current_mood": last_mood[0]["mood"] if last_mood else None,
-        "confidence": round(last_mood[0]["confidence"] * 100, 1) if last_mood else 0
+        "current_mood": decode_emotion(last_mood[0]["e"]) if last_mood else None,
+        "confidence": round(last_mood[0]["c"] * 100, 1) if last_mood else 0
     })
 @dashboard_bp.route("/api/dashboard/mood-timeline", methods=["GET"])
 @jwt_required()
 def mood_timeline():
     spotify_id = get_jwt_identity()
 
-    moods = moods_collection.find(
-        {"spotify_id": spotify_id}
-    ).sort("timestamp", -1).limit(20)
+    moods = list(moods_collection.find(
+        {"u": spotify_id},
+        {"_id": 0, "t": 1, "te": 1, "e": 1, "c": 1, "n": 1}
+    ).sort("t", -1).limit(20))
+
+    current_run = open_run(spotify_id)
+    if current_run:
+        moods.insert(0, current_run)
+    moods = expand_runs(moods, 20)
 
     data = [{
-        "mood": m["mood"],
-        "confidence": m["confidence"],
-        "timestamp": m["timestamp"]
+        "mood": decode_emotion(m["e"]),
+        "confidence": m["c"],
+        "timestamp": m["t"]
     } for m in moods]
 
     return jsonify(data)
@@ -54,11 +68,14 @@ def save_mood():
     spotify_id = get_jwt_identity()
     data = request.json
 
-    moods_collection.insert_one({
-        "spotify_id": spotify_id,
-        "mood": data["mood"],
-        "confidence": data["confidence"],
-        "timestamp": datetime.utcnow()
-    })
+    try:
+        mood_entry = make_mood_record(spotify_id, data["mood"], data["confidence"])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid mood: {e}"}), 400
+
+    try:
+        ingest_moods([mood_entry])
+    except BufferFullError as e:
+        return jsonify({"error": "Mood storage is busy, try again shortly", "details": str(e)}), 503
 
     return jsonify({"status": "saved"})
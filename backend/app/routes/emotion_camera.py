@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify
-from db import moods_collection
-from datetime import datetime
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from pymongo.errors import BulkWriteError
+from app.services.mood_schema import make_mood_record, CAMERA_CONFIDENCE_SCALE
+from app.services.mood_writer import BufferFullError
+from app.services.mood_ingest import ingest_moods
+from app.services.mood_runs import MOOD_STORAGE_MODE
 
 emotion_cam_bp = Blueprint("emotion_camera", __name__, url_prefix="/api/emotion")
 
+# Enough for a few minutes of 5-second samples; larger uploads should be split
+MAX_BATCH_SIZE = 500
+
 @emotion_cam_bp.route("/store", methods=["POST"])
 @jwt_required()
 def analyze_frame():
@@ -25,17 +31,89 @@ def analyze_frame():
     user_id = get_jwt_identity()  # associate emotion with the logged-in user
     
 
-    mood_entry = {
-        "user_id": user_id,
-        "emotion": data["emotion"],
-        "confidence": data["confidence"],
-        "timestamp": data.get("timestamp", datetime.utcnow())
-    }
+    try:
+        mood_entry = make_mood_record(
+            user_id,
+            data["emotion"],
+            data["confidence"],
+            data.get("timestamp"),
+            CAMERA_CONFIDENCE_SCALE
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
 
-    moods_collection.insert_one(mood_entry)
+    try:
+        ingest_moods([mood_entry])
+    except BufferFullError as e:
+        return jsonify({"error": "Mood storage is busy, try again shortly", "details": str(e)}), 503
 
     return jsonify({"message": "Emotion saved successfully"}), 200
 
+@emotion_cam_bp.route("/store-batch", methods=["POST"])
+@jwt_required()
+def analyze_frames():
+    """
+    Stores many buffered emotion samples in one request.
+    Expects JSON:
+    {
+        "samples": [
+            {"emotion": "happy", "confidence": 92, "timestamp": "2026-01-15T13:40:00Z"},
+            ...
+        ]
+    }
+    Invalid samples are skipped and reported by their index in "rejected".
+    """
+    data = request.get_json()
+    samples = data.get("samples") if isinstance(data, dict) else None
+
+    if not isinstance(samples, list) or not samples:
+        return jsonify({"error": "A non-empty samples array is required"}), 400
+
+    if len(samples) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} samples per batch"}), 413
+
+    user_id = get_jwt_identity()
+
+    mood_entries = []
+    indexes = []
+    rejected = []
+    for index, sample in enumerate(samples):
+        try:
+            mood_entries.append(make_mood_record(
+                user_id,
+                sample["emotion"],
+                sample["confidence"],
+                sample.get("timestamp"),
+                CAMERA_CONFIDENCE_SCALE
+            ))
+            indexes.append(index)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            rejected.append({"index": index, "error": f"Invalid sample: {e}"})
+
+    stored = 0
+    if mood_entries:
+        # Through the write buffer like single samples (folded into runs first when storing runs)
+        try:
+            ingest_moods(mood_entries)
+            stored = len(mood_entries)
+        except BufferFullError as e:
+            return jsonify({"error": "Mood storage is busy, try again shortly", "details": str(e)}), 503
+        except BulkWriteError as e:
+            # Only with MOOD_WRITE_MODE=direct; with runs the failed documents aren't these samples
+            if MOOD_STORAGE_MODE == "runs":
+                raise
+            stored = e.details.get("nInserted", 0)
+            for error in e.details.get("writeErrors", []):
+                rejected.append({"index": indexes[error["index"]], "error": error.get("errmsg", "Write failed")})
+
+    rejected.sort(key=lambda r: r["index"])
+
+    return jsonify({
+        "message": f"Stored {stored} of {len(samples)} samples",
+        "stored": stored,
+        "rejected": rejected
+    }), 200
+
 @emotion_cam_bp.route("/test-auth", methods=["GET"])
 @jwt_required()
 def test_auth():
@@ -1,10 +1,38 @@
 from flask import Blueprint, request, jsonify
-from app.services.sentiment_analyzer import SentimentAnalyzer
+from app.services.sentiment_analyzer import get_analyzer, NOT_LOADED, FAILED
+from app.services.inference_pool import InferenceQueueFullError, InferenceTimeoutError, InferenceWorkerError
 
 bp = Blueprint('emotion_text', __name__, url_prefix='/api/emotion')
 
-# Initialize analyzer once
-analyzer = SentimentAnalyzer()
+# Most texts accepted by one /analyze-text-batch call
+MAX_BATCH_TEXTS = 256
+
+# Shared analyzer; the model loads in the background, not at import
+analyzer = get_analyzer()
+
+def model_unavailable():
+    """A 503 response while the model isn't ready (starting its load if nobody has), else None"""
+    if analyzer.ready:
+        return None
+    if analyzer.state == NOT_LOADED:
+        analyzer.start_warm_up()
+    if analyzer.state == FAILED:
+        return jsonify({"error": "Text emotion model failed to load", "model": analyzer.status()}), 503
+    return jsonify({"error": "Text emotion model is loading, try again shortly", "model": analyzer.status()}), 503, {"Retry-After": "5"}
+
+@bp.errorhandler(InferenceQueueFullError)
+def inference_busy(e):
+    # Shed load instead of queueing requests that would time out anyway
+    return jsonify({"error": "Text emotion model is busy, try again shortly"}), 503, {"Retry-After": "1"}
+
+@bp.errorhandler(InferenceWorkerError)
+def inference_crashed(e):
+    # The call has already been retried once on a fresh model process
+    return jsonify({"error": "Text emotion model crashed, try again shortly"}), 503, {"Retry-After": "5"}
+
+@bp.errorhandler(InferenceTimeoutError)
+def inference_timeout(e):
+    return jsonify({"error": str(e)}), 504
 
 @bp.route('/analyze-text', methods=['POST'])
 def analyze_text():
@@ -13,7 +41,45 @@ def analyze_text():
     if not data or "text" not in data:
         return jsonify({"error": "Text is required"}), 400
 
+    unavailable = model_unavailable()
+    if unavailable:
+        return unavailable
+
     text = data["text"]
-    result = analyzer.analyze_text(text)
+    mode = data.get("mode", "auto")
+    if mode not in ("auto", "short", "long"):
+        return jsonify({"error": "mode must be auto, short or long"}), 400
+
+    if mode == "short":
+        # Only what fits in one window is scored
+        result = analyzer.analyze_text(text)
+    else:
+        # Texts longer than the model's limit are scored in overlapping windows
+        spans = analyzer.split_windows(text)
+        if mode == "long" or len(spans) > 1:
+            result = analyzer.analyze_long_text(text, spans)
+        else:
+            result = analyzer.analyze_text(text)
 
     return jsonify(result), 200
+
+@bp.route('/analyze-text-batch', methods=['POST'])
+def analyze_text_batch():
+    data = request.get_json()
+
+    if not data or not isinstance(data.get("texts"), list):
+        return jsonify({"error": "texts must be a list of strings"}), 400
+
+    texts = data["texts"]
+    if len(texts) > MAX_BATCH_TEXTS:
+        return jsonify({"error": f"At most {MAX_BATCH_TEXTS} texts per request"}), 413
+    if not all(isinstance(text, str) for text in texts):
+        return jsonify({"error": "texts must be a list of strings"}), 400
+
+    unavailable = model_unavailable()
+    if unavailable:
+        return unavailable
+
+    results = analyzer.analyze_texts(texts)
+
+    return jsonify({"results": results}), 200
@@ -1,7 +1,29 @@
 from flask import Blueprint,jsonify
+from app.services.mood_writer import mood_writer_stats
+from app.services.mood_watcher import AUTO_PLAYLIST_UPDATES, get_refresh_scheduler
+from app.services.spotify_client import spotify
+from app.services.sentiment_analyzer import get_analyzer
 
 health_bp=Blueprint('health', __name__, url_prefix='/api')
 
 @health_bp.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status':'healthy', 'message':'backend is running '})
\ No newline at end of file
+    analyzer = get_analyzer()
+    return jsonify({
+        'status':'healthy',
+        'message':'backend is running ',
+        # Text emotion endpoints answer 503 until this is ready
+        'ready': analyzer.ready,
+        'models': {'sentiment': analyzer.status()},
+    })
+
+@health_bp.route('/health/ingest', methods=['GET'])
+def ingest_health():
+    stats = {'mood_writer': mood_writer_stats()}
+    if AUTO_PLAYLIST_UPDATES:
+        stats['playlist_refresh'] = get_refresh_scheduler().stats()
+    return jsonify(stats)
+
+@health_bp.route('/health/spotify', methods=['GET'])
+def spotify_health():
+    return jsonify({'circuits': {family: breaker.stats() for family, breaker in spotify.breakers.items()}})
@@ -1,8 +1,6 @@
 from flask import Blueprint, jsonify, request
-import requests
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
-from collections import Counter
 import traceback
 import sys
 import os
@@ -29,8 +27,38 @@ except ImportError as e:
     moods_collection = db["moods"]
     print("✅ Database collections loaded via fallback")
 
+from app.services.mood_schema import decode_emotion, samples_between
+from app.services.mood_rollups import mood_totals
+from app.services.mood_runs import open_run
+from app.services.spotify_client import spotify
+from app.services.spotify_token import get_access_token
+from app.services.candidate_sourcing import source_candidates
+from app.services.recommendation_cache import save_last_good, load_last_good
+from app.services.preview_cache import save_preview, load_preview, PREVIEW_TTL
+from app.services.track_index import get_track_index, queue_autofill
+from app.services.playlist_service import sync_playlist, record_playlist, MOOD_PLAYLIST_NAME
+from app.services.single_flight import single_flight, freeze
+from app.services.playlist_jobs import (
+    submit_job, get_job, wait_for_job, JobQueueFullError, JOB_SUCCEEDED, JOB_FAILED
+)
+
 playlist_bp = Blueprint("playlist", __name__)
 
+# "spotify" asks /v1/recommendations first and uses the local track index as a
+# fallback; "local" serves from the index first and only calls Spotify when it
+# can't fill the request
+RECOMMENDATION_SOURCE = os.getenv("RECOMMENDATION_SOURCE", "spotify")
+# Add the audio features of tracks Spotify recommends to the local index
+TRACK_INDEX_AUTOFILL = os.getenv("TRACK_INDEX_AUTOFILL", "1") == "1"
+# "new" creates a fresh playlist per generate; "persistent" keeps one playlist
+# per user and only sends the track differences. Requests can pass
+# "playlist_mode" to override.
+PLAYLIST_MODE = os.getenv("PLAYLIST_MODE", "new")
+# Let generate run as a background job: for "Prefer: respond-async" clients
+# (202 + job ID) and to deduplicate Idempotency-Key retries; 0 always runs it
+# on the request thread
+PLAYLIST_JOBS = os.getenv("PLAYLIST_JOBS", "1") == "1"
+
 # Mood to genre/energy mapping - USING VALID SPOTIFY GENRES ONLY
 # Valid genres list: https://developer.spotify.com/documentation/web-api/reference/get-recommendation-genres
 MOOD_TO_SPOTIFY_PARAMS = {
@@ -38,108 +66,107 @@ MOOD_TO_SPOTIFY_PARAMS = {
         "seed_genres": ["pop", "dance", "happy"],
         "target_valence": 0.8,
         "target_energy": 0.7,
-        "min_tempo": 120
+        "min_tempo": 120,
+        "search_query": "happy upbeat positive"
     },
     "sad": {
         "seed_genres": ["acoustic", "piano", "sad"],
         "target_valence": 0.2,
         "target_energy": 0.3,
-        "max_tempo": 100
+        "max_tempo": 100,
+        "search_query": "sad emotional melancholy"
     },
     "angry": {
         "seed_genres": ["rock", "metal", "hard-rock"],
         "target_valence": 0.3,
         "target_energy": 0.9,
-        "min_tempo": 140
+        "min_tempo": 140,
+        "search_query": "aggressive intense rock"
     },
     "neutral": {
         "seed_genres": ["chill", "indie", "ambient"],
         "target_valence": 0.5,
         "target_energy": 0.5,
-        "target_tempo": 110
+        "target_tempo": 110,
+        "search_query": "chill relaxing ambient"
     },
     "surprised": {
         "seed_genres": ["electronic", "edm", "house"],
         "target_valence": 0.7,
         "target_energy": 0.8,
-        "min_tempo": 125
+        "min_tempo": 125,
+        "search_query": "energetic exciting"
     },
     "fear": {
         "seed_genres": ["ambient", "classical", "soundtracks"],
         "target_valence": 0.2,
         "target_energy": 0.4,
-        "max_tempo": 90
+        "max_tempo": 90,
+        "search_query": "dark atmospheric"
     },
     "disgust": {
         "seed_genres": ["alternative", "grunge", "punk"],
         "target_valence": 0.3,
         "target_energy": 0.6,
-        "target_tempo": 115
+        "target_tempo": 115,
+        "search_query": "alternative punk"
     }
 }
 
 
 def get_spotify_token(user):
-    """Helper to get valid Spotify access token"""
-    return user.get("spotify_access_token")
+    """Helper to get valid Spotify access token (refreshed shortly before it expires)"""
+    return get_access_token(user["spotify_id"])
+
+
+def recommendation_key(spotify_id, mood_params, limit=20):
+    return (spotify_id, freeze(mood_params), limit)
 
 
+# Identical concurrent requests (double clicks, re-renders) share one computation
+@single_flight(key=lambda user_id, days=7: (user_id, days))
 def analyze_user_moods(user_id, days=7):
     """Analyze user's mood patterns over the last N days"""
     try:
         cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Query moods - handle both datetime and string timestamps
-        moods = list(moods_collection.find({
-            "user_id": user_id
-        }))
-        
-        print(f"📊 Found {len(moods)} total moods for user {user_id}")
-        
-        # Filter by date (handle string timestamps from your frontend)
-        filtered_moods = []
-        for mood in moods:
-            timestamp_str = mood.get("timestamp")
-            if timestamp_str:
-                try:
-                    # Parse ISO format timestamp - remove 'Z' and parse
-                    mood_date = datetime.fromisoformat(timestamp_str.replace('Z', ''))
-                    
-                    # Debug: print first mood date
-                    if len(filtered_moods) == 0:
-                        print(f"🕐 First mood timestamp: {timestamp_str}")
-                        print(f"🕐 Parsed as: {mood_date}")
-                        print(f"🕐 Cutoff date: {cutoff_date}")
-                        print(f"🕐 Is within range: {mood_date >= cutoff_date}")
-                    
-                    if mood_date >= cutoff_date:
-                        filtered_moods.append(mood)
-                except Exception as parse_error:
-                    print(f"⚠️ Failed to parse timestamp: {timestamp_str} - {parse_error}")
-                    # Include it anyway if we can't parse the date
-                    filtered_moods.append(mood)
-        
-        print(f"📊 {len(filtered_moods)} moods within last {days} days")
-        
-        if not filtered_moods:
+
+        # Whole days are summed from the daily rollups, only the partial
+        # first day is scanned in the moods collection
+        counts, confidence_sums = mood_totals(user_id, cutoff_date)
+
+        # Include the samples of the run still being collected that fall in the window
+        current_run = open_run(user_id)
+        if current_run:
+            recent = samples_between(current_run, cutoff_date)
+            counts[current_run["e"]] += recent
+            confidence_sums[current_run["e"]] += current_run["c"] * recent
+
+        total_moods = sum(counts.values())
+        print(f"📊 {total_moods} moods within last {days} days for user {user_id}")
+
+        if not total_moods:
             print(f"❌ No moods found within {days} days")
             return None
-        
+
         # Count mood occurrences
-        mood_counts = Counter([m["emotion"].lower() for m in filtered_moods])
-        
+        mood_counts = {
+            decode_emotion(code): count
+            for code, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+            if count
+        }
+
         # Calculate dominant mood
-        dominant_mood = mood_counts.most_common(1)[0][0]
-        
-        # Calculate average confidence
-        avg_confidence = sum(m["confidence"] for m in filtered_moods) / len(filtered_moods)
-        
-        print(f"✅ Dominant mood: {dominant_mood} from {len(filtered_moods)} moods")
-        
+        dominant_mood = next(iter(mood_counts))
+
+        # Calculate average confidence (as a percentage, like the camera sends it)
+        avg_confidence = sum(confidence_sums.values()) / total_moods * 100
+
+        print(f"✅ Dominant mood: {dominant_mood} from {total_moods} moods")
+
         return {
             "dominant_mood": dominant_mood,
-            "mood_distribution": dict(mood_counts),
-            "total_moods": len(filtered_moods),
+            "mood_distribution": mood_counts,
+            "total_moods": total_moods,
             "avg_confidence": avg_confidence,
             "days_analyzed": days
         }
@@ -149,141 +176,60 @@ def analyze_user_moods(user_id, days=7):
         return None
 
 
-def get_spotify_recommendations(access_token, mood_params, limit=20):
-    """Get track recommendations from Spotify based on mood - using user's top tracks as seeds"""
-    try:
-        # Strategy: Use user's top tracks instead of genres since genre seeds aren't working
-        # This is actually better for personalization!
-        
-        # First, get user's top tracks
-        top_tracks_url = "https://api.spotify.com/v1/me/top/tracks"
-        headers = {"Authorization": f"Bearer {access_token}"}
-        
-        print(f"🎵 Getting user's top tracks for seed...")
-        top_response = requests.get(
-            top_tracks_url,
-            headers=headers,
-            params={"limit": 5, "time_range": "medium_term"}
-        )
-        
-        if top_response.status_code != 200:
-            print(f"⚠️ Couldn't get top tracks: {top_response.status_code} - {top_response.text}")
-            print(f"🔄 Falling back to search-based recommendations...")
-            # Fallback: search for tracks based on mood
-            return get_recommendations_via_search(access_token, mood_params, limit)
-        
-        top_tracks = top_response.json().get("items", [])
-        if not top_tracks:
-            print(f"⚠️ No top tracks found, using search fallback")
-            return get_recommendations_via_search(access_token, mood_params, limit)
-        
-        # Get track IDs for seeds (max 5)
-        seed_tracks = [track["id"] for track in top_tracks[:5]]
-        
-        print(f"✅ Using {len(seed_tracks)} seed tracks from user's top tracks")
-        
-        # Now get recommendations based on those tracks + mood parameters
-        url = "https://api.spotify.com/v1/recommendations"
-        
-        params = {
-            "limit": min(limit, 100),
-            "seed_tracks": ",".join(seed_tracks[:5]),  # Max 5 seeds
-        }
-        
-        # Add mood-based audio features
-        if "target_valence" in mood_params:
-            params["target_valence"] = mood_params["target_valence"]
-        if "target_energy" in mood_params:
-            params["target_energy"] = mood_params["target_energy"]
-        if "min_tempo" in mood_params:
-            params["min_tempo"] = mood_params["min_tempo"]
-        if "max_tempo" in mood_params:
-            params["max_tempo"] = mood_params["max_tempo"]
-        if "target_tempo" in mood_params:
-            params["target_tempo"] = mood_params["target_tempo"]
-        
-        print(f"🎵 Requesting recommendations with track seeds and mood params")
-        response = requests.get(url, headers=headers, params=params)
-        
-        print(f"📡 Spotify API Response Status: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"❌ Spotify API error: {response.status_code}")
-            print(f"Response: {response.text}")
-            # Final fallback
-            return get_recommendations_via_search(access_token, mood_params, limit)
-        
-        data = response.json()
-        print(f"✅ Got {len(data.get('tracks', []))} recommendations")
-        return data
-        
-    except Exception as e:
-        print(f"❌ Error getting recommendations: {str(e)}")
-        traceback.print_exc()
+def get_local_recommendations(mood_params, limit=20):
+    """Recommendations from the local track index, or None if it can't fill the request"""
+    tracks = get_track_index().nearest(mood_params, k=limit)
+    if len(tracks) < limit:
         return None
+    print(f"✅ Got {len(tracks)} recommendations from the local track index")
+    return {"tracks": tracks}
 
 
-def get_recommendations_via_search(access_token, mood_params, limit=20):
-    """Fallback: Get recommendations by searching for mood-related playlists"""
+@single_flight(key=recommendation_key)
+def get_spotify_recommendations(spotify_id, mood_params, limit=20):
+    """
+    Get track recommendations for the mood: top-track seeds, top-artist seeds
+    and a mood search are asked at once, merged and ranked against the mood.
+    If Spotify can't answer, the user's last good recommendations for the
+    mood are returned with "stale": True.
+    """
     try:
-        headers = {"Authorization": f"Bearer {access_token}"}
-        
-        # Map mood to search query
-        mood_queries = {
-            "happy": "happy upbeat positive",
-            "sad": "sad emotional melancholy",
-            "angry": "aggressive intense rock",
-            "neutral": "chill relaxing ambient",
-            "surprised": "energetic exciting",
-            "fear": "dark atmospheric",
-            "disgust": "alternative punk"
-        }
-        
-        # Get dominant mood from params (we'll pass it separately)
-        search_query = mood_queries.get("neutral", "chill relaxing")  # default
-        
-        print(f"🔍 Searching for tracks with query: {search_query}")
-        
-        # Search for tracks
-        search_url = "https://api.spotify.com/v1/search"
-        response = requests.get(
-            search_url,
-            headers=headers,
-            params={
-                "q": search_query,
-                "type": "track",
-                "limit": limit
-            }
-        )
-        
-        if response.status_code != 200:
-            print(f"❌ Search failed: {response.status_code}")
-            return None
-        
-        data = response.json()
-        tracks = data.get("tracks", {}).get("items", [])
-        
-        print(f"✅ Found {len(tracks)} tracks via search")
-        
-        # Format to match recommendations API response
+        if RECOMMENDATION_SOURCE == "local":
+            local = get_local_recommendations(mood_params, limit)
+            if local:
+                return local
+        
+        if spotify.circuit_open("recommendations") and spotify.circuit_open("search"):
+            # Every source would fail fast anyway
+            print(f"⚡ Spotify circuits open, skipping candidate sourcing")
+            tracks = None
+        else:
+            tracks = source_candidates(spotify_id, mood_params, limit)
+        
+        if not tracks:
+            last_good = load_last_good(spotify_id, mood_params, limit)
+            if last_good:
+                print(f"🕰️ Serving last good recommendations from {last_good['fetched_at']}")
+                return {"tracks": last_good["tracks"], "stale": True, "fetched_at": last_good["fetched_at"].isoformat()}
+            print(f"⚠️ No candidates from Spotify, trying the local track index")
+            return get_local_recommendations(mood_params, limit)
+        
+        save_last_good(spotify_id, mood_params, tracks)
+        if TRACK_INDEX_AUTOFILL:
+            # Grow the local index with what Spotify recommends, off the request path
+            queue_autofill(spotify_id, tracks)
         return {"tracks": tracks}
         
     except Exception as e:
-        print(f"❌ Search fallback failed: {str(e)}")
+        print(f"❌ Error getting recommendations: {str(e)}")
         traceback.print_exc()
         return None
 
 
-def create_spotify_playlist(access_token, user_id, name, description, track_uris):
+def create_spotify_playlist(spotify_id, name, description, track_uris):
     """Create a new Spotify playlist and add tracks"""
     try:
         # Create playlist
-        create_url = f"https://api.spotify.com/v1/users/{user_id}/playlists"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        
         playlist_data = {
             "name": name,
             "description": description,
@@ -291,7 +237,7 @@ def create_spotify_playlist(access_token, user_id, name, description, track_uris
         }
         
         print(f"📝 Creating playlist: {name}")
-        response = requests.post(create_url, headers=headers, json=playlist_data)
+        response = spotify.post(f"/users/{spotify_id}/playlists", user_id=spotify_id, json=playlist_data)
         
         if response.status_code != 201:
             print(f"❌ Failed to create playlist: {response.status_code}")
@@ -302,12 +248,10 @@ def create_spotify_playlist(access_token, user_id, name, description, track_uris
         playlist_id = playlist["id"]
         
         # Add tracks to playlist
-        add_tracks_url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
-        
         print(f"🎵 Adding {len(track_uris)} tracks to playlist")
-        track_response = requests.post(
-            add_tracks_url,
-            headers=headers,
+        track_response = spotify.post(
+            f"/playlists/{playlist_id}/tracks",
+            user_id=spotify_id,
             json={"uris": track_uris}
         )
         
@@ -348,67 +292,108 @@ def analyze_moods():
         return jsonify({"error": str(e)}), 500
 
 
-@playlist_bp.route("/api/playlist/generate", methods=["POST"])
-@jwt_required()
-def generate_playlist():
-    """Generate a Spotify playlist based on user's moods"""
+def build_playlist(spotify_id, data):
+    """
+    The work behind generate: resolve the tracks (from a preview or fresh
+    recommendations), then create or sync the playlist on Spotify.
+    Returns (payload, http_status).
+    """
     try:
-        spotify_id = get_jwt_identity()
         print(f"🎵 Generating playlist for user: {spotify_id}")
         
         # Get user from database
         user = users_collection.find_one({"spotify_id": spotify_id})
         if not user:
             print(f"❌ User not found: {spotify_id}")
-            return jsonify({"error": "User not found"}), 404
+            return {"error": "User not found"}, 404
         
         access_token = get_spotify_token(user)
         if not access_token:
             print(f"❌ No Spotify access token for user: {spotify_id}")
-            return jsonify({"error": "No Spotify access token. Please login again."}), 401
+            return {"error": "No Spotify access token. Please login again."}, 401
         
         # Get parameters from request
-        data = request.get_json() or {}
         days = data.get("days", 7)
         num_tracks = data.get("num_tracks", 20)
         mood_override = data.get("mood")
         
-        # Analyze moods
-        if mood_override and mood_override.lower() in MOOD_TO_SPOTIFY_PARAMS:
-            dominant_mood = mood_override.lower()
-            mood_analysis = {"dominant_mood": dominant_mood, "override": True}
-            print(f"🎭 Using override mood: {dominant_mood}")
-        else:
-            mood_analysis = analyze_user_moods(spotify_id, days)
-            if not mood_analysis:
-                print(f"❌ No mood data found for user: {spotify_id}")
-                return jsonify({
-                    "error": "No mood data found",
-                    "message": f"No moods recorded in the last {days} days. Try using the camera to record some moods first!"
-                }), 404
-            dominant_mood = mood_analysis["dominant_mood"]
-            print(f"🎭 Detected dominant mood: {dominant_mood}")
+        # Reuse what the user just previewed instead of recomputing it
+        preview = load_preview(data["preview_id"], spotify_id) if data.get("preview_id") else None
         
-        # Get mood parameters
-        mood_params = MOOD_TO_SPOTIFY_PARAMS.get(
-            dominant_mood,
-            MOOD_TO_SPOTIFY_PARAMS["neutral"]
-        )
-        
-        # Get recommendations from Spotify
-        recommendations = get_spotify_recommendations(
-            access_token,
-            mood_params,
-            limit=num_tracks
-        )
-        
-        if not recommendations or "tracks" not in recommendations:
-            print(f"❌ Failed to get recommendations from Spotify")
-            return jsonify({"error": "Failed to get recommendations from Spotify. Your token may have expired."}), 500
-        
-        # Extract track URIs
-        track_uris = [track["uri"] for track in recommendations["tracks"]]
-        print(f"✅ Got {len(track_uris)} track recommendations")
+        if preview:
+            dominant_mood = preview["dominant_mood"]
+            mood_analysis = preview["mood_analysis"]
+            days = preview["days"]
+            track_uris = preview["track_uris"]
+            stale = False
+            print(f"♻️ Using preview {preview['_id']}: {len(track_uris)} tracks, mood {dominant_mood}")
+        else:
+            if data.get("preview_id"):
+                print(f"⚠️ Preview {data['preview_id']} not found or expired, recomputing")
+            
+            # Analyze moods
+            if mood_override and mood_override.lower() in MOOD_TO_SPOTIFY_PARAMS:
+                dominant_mood = mood_override.lower()
+                mood_analysis = {"dominant_mood": dominant_mood, "override": True}
+                print(f"🎭 Using override mood: {dominant_mood}")
+            else:
+                mood_analysis = analyze_user_moods(spotify_id, days)
+                if not mood_analysis:
+                    print(f"❌ No mood data found for user: {spotify_id}")
+                    return {
+                        "error": "No mood data found",
+                        "message": f"No moods recorded in the last {days} days. Try using the camera to record some moods first!"
+                    }, 404
+                dominant_mood = mood_analysis["dominant_mood"]
+                print(f"🎭 Detected dominant mood: {dominant_mood}")
+        
+            # Get mood parameters
+            mood_params = MOOD_TO_SPOTIFY_PARAMS.get(
+                dominant_mood,
+                MOOD_TO_SPOTIFY_PARAMS["neutral"]
+            )
+        
+            # Get recommendations from Spotify
+            recommendations = get_spotify_recommendations(
+                spotify_id,
+                mood_params,
+                limit=num_tracks
+            )
+        
+            if not recommendations or "tracks" not in recommendations:
+                print(f"❌ Failed to get recommendations from Spotify")
+                return {"error": "Failed to get recommendations from Spotify"}, 500
+        
+            # Extract track URIs
+            track_uris = [track["uri"] for track in recommendations["tracks"]]
+            stale = recommendations.get("stale", False)
+            print(f"✅ Got {len(track_uris)} track recommendations")
+        
+        # Persistent mode: update the user's one MoodBeats playlist in place
+        if data.get("playlist_mode", PLAYLIST_MODE) == "persistent":
+            try:
+                sync = sync_playlist(user, track_uris)
+            except Exception as e:
+                print(f"❌ Failed to update mood playlist: {str(e)}")
+                traceback.print_exc()
+                return {"error": "Failed to update playlist on Spotify"}, 500
+            
+            record_playlist(spotify_id, sync["playlist_id"], MOOD_PLAYLIST_NAME, dominant_mood,
+                            len(track_uris), "persistent")
+            return {
+                "success": True,
+                "playlist": {
+                    "id": sync["playlist_id"],
+                    "name": MOOD_PLAYLIST_NAME,
+                    "url": f"https://open.spotify.com/playlist/{sync['playlist_id']}",
+                    "tracks_added": sync["added"],
+                    "tracks_removed": sync["removed"],
+                    "total_tracks": len(track_uris)
+                },
+                "mood_analysis": mood_analysis,
+                "dominant_mood": dominant_mood,
+                "stale": stale
+            }, 200
         
         # Create playlist name and description
         playlist_name = f"Mood Mix: {dominant_mood.title()}"
@@ -419,7 +404,6 @@ def generate_playlist():
         
         # Create playlist
         playlist = create_spotify_playlist(
-            access_token,
             spotify_id,
             playlist_name,
             playlist_description,
@@ -428,11 +412,12 @@ def generate_playlist():
         
         if not playlist:
             print(f"❌ Failed to create playlist on Spotify")
-            return jsonify({"error": "Failed to create playlist on Spotify"}), 500
+            return {"error": "Failed to create playlist on Spotify"}, 500
         
         print(f"✅ Playlist created successfully: {playlist['id']}")
+        record_playlist(spotify_id, playlist["id"], playlist["name"], dominant_mood, len(track_uris), "new")
         
-        return jsonify({
+        return {
             "success": True,
             "playlist": {
                 "id": playlist["id"],
@@ -441,8 +426,74 @@ def generate_playlist():
                 "tracks_added": len(track_uris)
             },
             "mood_analysis": mood_analysis,
-            "dominant_mood": dominant_mood
-        }), 201
+            "dominant_mood": dominant_mood,
+            "stale": stale
+        }, 201
+    
+    except Exception as e:
+        print(f"❌ Error in build_playlist: {str(e)}")
+        traceback.print_exc()
+        return {"error": str(e), "details": "Check server logs for more info"}, 500
+
+
+def format_job(job):
+    """The job fields a client polls for"""
+    response = {
+        "job_id": job["_id"],
+        "status": job["status"],
+        "status_url": f"/api/playlist/jobs/{job['_id']}",
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat(),
+    }
+    if job["status"] in (JOB_SUCCEEDED, JOB_FAILED):
+        response["http_status"] = job.get("http_status")
+        response["result"] = job.get("result")
+    return response
+
+
+@playlist_bp.route("/api/playlist/generate", methods=["POST"])
+@jwt_required()
+def generate_playlist():
+    """
+    Generate a Spotify playlist based on user's moods.
+    Answers with the playlist (200/201) once it's built. Clients sending
+    "Prefer: respond-async" get 202 with a job_id at once instead, and poll
+    /api/playlist/jobs/<job_id> for the result. Retrying with the same
+    Idempotency-Key header returns the original job instead of a new playlist.
+    """
+    try:
+        spotify_id = get_jwt_identity()
+        data = request.get_json() or {}
+        
+        idempotency_key = request.headers.get("Idempotency-Key") or data.pop("idempotency_key", None)
+        respond_async = "respond-async" in request.headers.get("Prefer", "")
+        
+        # Without a key there's nothing to deduplicate, so synchronous calls just run
+        if not PLAYLIST_JOBS or not (respond_async or idempotency_key):
+            payload, status = build_playlist(spotify_id, data)
+            return jsonify(payload), status
+        
+        # Fail fast on what would fail the job anyway
+        if not users_collection.find_one({"spotify_id": spotify_id}, {"_id": 1}):
+            print(f"❌ User not found: {spotify_id}")
+            return jsonify({"error": "User not found"}), 404
+        
+        try:
+            job, created = submit_job(spotify_id, data, build_playlist, idempotency_key=idempotency_key)
+        except JobQueueFullError as e:
+            return jsonify({"error": "Too many playlists being generated, try again shortly", "details": str(e)}), 503
+        
+        if created:
+            print(f"🧾 Queued playlist job {job['_id']} for user: {spotify_id}")
+        else:
+            print(f"♻️ Idempotency key reused, returning job {job['_id']}")
+        
+        if not respond_async:
+            # Synchronous client: answer like build_playlist would, once the job is done
+            job = wait_for_job(job)
+            if job["status"] in (JOB_SUCCEEDED, JOB_FAILED):
+                return jsonify(job["result"]), job["http_status"]
+        return jsonify(format_job(job)), 202
     
     except Exception as e:
         print(f"❌ Error in generate_playlist: {str(e)}")
@@ -450,6 +501,23 @@ def generate_playlist():
         return jsonify({"error": str(e), "details": "Check server logs for more info"}), 500
 
 
+@playlist_bp.route("/api/playlist/jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def playlist_job_status(job_id):
+    """Status of a generate job, with its result once it has finished"""
+    try:
+        job = get_job(job_id, get_jwt_identity())
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        
+        return jsonify(format_job(job)), 200
+    
+    except Exception as e:
+        print(f"❌ Error in playlist_job_status: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
 @playlist_bp.route("/api/playlist/preview-recommendations", methods=["POST"])
 @jwt_required()
 def preview_recommendations():
@@ -490,7 +558,7 @@ def preview_recommendations():
         )
         
         recommendations = get_spotify_recommendations(
-            access_token,
+            spotify_id,
             mood_params,
             limit=num_tracks
         )
@@ -508,13 +576,25 @@ def preview_recommendations():
             "image": track["album"]["images"][0]["url"] if track["album"]["images"] else None
         } for track in recommendations["tracks"]]
         
+        preview_id = save_preview(
+            spotify_id,
+            dominant_mood,
+            mood_analysis,
+            days,
+            [track["uri"] for track in tracks]
+        )
+        
         print(f"✅ Preview complete: {len(tracks)} tracks")
         
         return jsonify({
             "mood_analysis": mood_analysis,
             "dominant_mood": dominant_mood,
             "recommendations": tracks,
-            "mood_params": mood_params
+            "mood_params": mood_params,
+            "preview_id": preview_id,
+            "preview_expires_in": PREVIEW_TTL,
+            # Last good recommendations served while Spotify is unavailable
+            "stale": recommendations.get("stale", False)
         }), 200
     
     except Exception as e:
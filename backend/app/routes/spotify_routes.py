@@ -1,9 +1,10 @@
 from flask import Blueprint, redirect, request
-import requests
 import base64
 import os
 
 from db import users_collection
+from app.services.spotify_client import spotify, SPOTIFY_ACCOUNTS_URL
+from app.services.spotify_token import store_spotify_tokens
 from flask_jwt_extended import create_access_token
 
 spotify_bp = Blueprint("spotify", __name__)
@@ -39,13 +40,12 @@ def spotify_callback():
     code = request.args.get("code")
 
     # 🔹 Exchange code for Spotify tokens
-    token_url = "https://accounts.spotify.com/api/token"
     auth_header = base64.b64encode(
         f"{CLIENT_ID}:{CLIENT_SECRET}".encode()
     ).decode()
 
-    response = requests.post(
-        token_url,
+    response = spotify.post(
+        f"{SPOTIFY_ACCOUNTS_URL}/api/token",
         data={
             "grant_type": "authorization_code",
             "code": code,
@@ -62,11 +62,9 @@ def spotify_callback():
     spotify_refresh_token = token_data.get("refresh_token")
 
     # 🔹 Get Spotify user profile
-    profile = requests.get(
-        "https://api.spotify.com/v1/me",
-        headers={
-            "Authorization": f"Bearer {spotify_access_token}"
-        },
+    profile = spotify.get(
+        "/me",
+        access_token=spotify_access_token,
     ).json()
 
     spotify_id = profile["id"]
@@ -78,11 +76,15 @@ def spotify_callback():
             "spotify_id": spotify_id,
             "email": profile.get("email"),
             "display_name": profile.get("display_name"),
-            "spotify_access_token": spotify_access_token,
-            "spotify_refresh_token": spotify_refresh_token,
         }},
         upsert=True
     )
+    store_spotify_tokens(
+        spotify_id,
+        spotify_access_token,
+        token_data.get("expires_in"),
+        spotify_refresh_token
+    )
 
     # 🔐 CREATE JWT FOR YOUR APP
     jwt_token = create_access_token(identity=spotify_id)
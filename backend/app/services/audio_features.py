@@ -0,0 +1,112 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from db import audio_features_collection
+from app.services.spotify_client import spotify
+from app.services.rate_limiter import current_priority
+
+# Spotify's batch limit for /v1/audio-features
+AUDIO_FEATURES_BATCH = 100
+# Batches fetched in parallel for one lookup
+AUDIO_FEATURES_CONCURRENCY = int(os.getenv("AUDIO_FEATURES_CONCURRENCY", 4))
+# Tracks whose features are kept in memory in front of Mongo
+AUDIO_FEATURES_CACHE_SIZE = int(os.getenv("AUDIO_FEATURES_CACHE_SIZE", 100000))
+
+# Only what we rank and filter on; the full Spotify object is much bigger
+FEATURE_FIELDS = ("valence", "energy", "tempo", "danceability", "acousticness")
+
+# track_id -> {field: value}; a track Spotify has no features for maps to None
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=AUDIO_FEATURES_CONCURRENCY, thread_name_prefix="audio-features")
+
+
+def _remember(features):
+    with _cache_lock:
+        for track_id, values in features.items():
+            _cache[track_id] = values
+            _cache.move_to_end(track_id)
+        while len(_cache) > AUDIO_FEATURES_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _fetch_batch(spotify_id, track_ids, priority=None, deadline=None):
+    response = spotify.get(
+        "/audio-features", user_id=spotify_id, priority=priority, params={"ids": ",".join(track_ids)},
+        deadline=deadline
+    )
+    if response.status_code != 200:
+        print(f"⚠️ Couldn't get audio features: {response.status_code} - {response.text}")
+        return {}
+
+    features = {track_id: None for track_id in track_ids}
+    for item in response.json().get("audio_features", []):
+        if item:
+            features[item["id"]] = {field: item.get(field) for field in FEATURE_FIELDS}
+    return features
+
+
+def get_audio_features(spotify_id, track_ids, deadline=None):
+    """
+    Audio features for many tracks at once: {track_id: {valence, energy, tempo, ...}}.
+    Served from the in-memory LRU, then the audio_features collection; the
+    rest is fetched from Spotify in concurrent 100-ID batches and stored,
+    each giving up at `deadline` (see SpotifyClient.request).
+    Tracks Spotify has no features for are left out of the result.
+    """
+    track_ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id))
+    result = {}
+
+    missing = []
+    with _cache_lock:
+        for track_id in track_ids:
+            if track_id in _cache:
+                _cache.move_to_end(track_id)
+                result[track_id] = _cache[track_id]
+            else:
+                missing.append(track_id)
+
+    if missing:
+        stored = {
+            doc["_id"]: doc.get("features")
+            for doc in audio_features_collection.find({"_id": {"$in": missing}}, {"features": 1})
+        }
+        _remember(stored)
+        result.update(stored)
+        missing = [track_id for track_id in missing if track_id not in stored]
+
+    if missing:
+        batches = [missing[i:i + AUDIO_FEATURES_BATCH] for i in range(0, len(missing), AUDIO_FEATURES_BATCH)]
+        fetched = {}
+        # The pool threads don't inherit this thread's rate-limit priority
+        priority = current_priority()
+        for features in _executor.map(lambda batch: _fetch_batch(spotify_id, batch, priority, deadline), batches):
+            fetched.update(features)
+
+        if fetched:
+            now = datetime.utcnow()
+            audio_features_collection.bulk_write([
+                UpdateOne({"_id": track_id}, {"$set": {"features": values, "fetched_at": now}}, upsert=True)
+                for track_id, values in fetched.items()
+            ], ordered=False)
+            _remember(fetched)
+            result.update(fetched)
+
+    return {track_id: values for track_id, values in result.items() if values}
+
+
+def within_tempo(features, mood_params):
+    """Whether a track's tempo satisfies the mood's min_tempo/max_tempo"""
+    tempo = features.get("tempo")
+    if tempo is None:
+        return True
+    if "min_tempo" in mood_params and tempo < mood_params["min_tempo"]:
+        return False
+    if "max_tempo" in mood_params and tempo > mood_params["max_tempo"]:
+        return False
+    return True
@@ -0,0 +1,173 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
+
+from app.services.spotify_client import spotify
+from app.services.seed_cache import get_seed_track_ids, get_seed_artist_ids
+from app.services.audio_features import get_audio_features, within_tempo
+from app.services.rate_limiter import current_priority, spotify_priority
+from app.services.track_index import TEMPO_SCALE
+
+# Seconds for sourcing and ranking together; whatever has arrived by then is used
+SOURCING_DEADLINE = float(os.getenv("SOURCING_DEADLINE", 4.0))
+# Source lookups and rankings running at once, across all requests in the process
+SOURCING_CONCURRENCY = int(os.getenv("SOURCING_CONCURRENCY", 16))
+
+# Mood params Spotify's /recommendations understands
+RECOMMENDATION_PARAMS = ("target_valence", "target_energy", "min_tempo", "max_tempo", "target_tempo")
+# Distance given to tracks we have no audio features for: behind good matches,
+# ahead of poor ones
+UNKNOWN_DISTANCE = 0.1
+
+_executor = ThreadPoolExecutor(max_workers=SOURCING_CONCURRENCY, thread_name_prefix="sourcing")
+
+
+def recommend_from_seeds(spotify_id, mood_params, limit, seed_tracks=None, seed_artists=None, deadline=None):
+    """Tracks from /v1/recommendations for up to 5 seeds; None on failure"""
+    params = {"limit": min(limit, 100)}
+    if seed_tracks:
+        params["seed_tracks"] = ",".join(seed_tracks[:5])
+    if seed_artists:
+        params["seed_artists"] = ",".join(seed_artists[:5])
+    for name in RECOMMENDATION_PARAMS:
+        if name in mood_params:
+            params[name] = mood_params[name]
+
+    response = spotify.get("/recommendations", user_id=spotify_id, params=params, deadline=deadline)
+    if response.status_code != 200:
+        print(f"❌ Spotify recommendations error: {response.status_code} - {response.text}")
+        return None
+    return response.json().get("tracks", [])
+
+
+def search_for_mood(spotify_id, mood_params, limit, deadline=None):
+    """Tracks from a search for the mood's query; None on failure"""
+    query = mood_params.get("search_query", "chill relaxing")
+    response = spotify.get(
+        "/search",
+        user_id=spotify_id,
+        params={"q": query, "type": "track", "limit": min(limit, 50)},
+        deadline=deadline
+    )
+    if response.status_code != 200:
+        print(f"❌ Search failed: {response.status_code}")
+        return None
+    return response.json().get("tracks", {}).get("items", [])
+
+
+def _from_top_tracks(spotify_id, mood_params, limit, deadline=None):
+    seeds = get_seed_track_ids(spotify_id, deadline=deadline)
+    if not seeds:
+        return None
+    return recommend_from_seeds(spotify_id, mood_params, limit, seed_tracks=seeds, deadline=deadline)
+
+
+def _from_top_artists(spotify_id, mood_params, limit, deadline=None):
+    seeds = get_seed_artist_ids(spotify_id, deadline=deadline)
+    if not seeds:
+        return None
+    return recommend_from_seeds(spotify_id, mood_params, limit, seed_artists=seeds, deadline=deadline)
+
+
+SOURCES = (
+    ("top_tracks", _from_top_tracks),
+    ("top_artists", _from_top_artists),
+    ("search", search_for_mood),
+)
+
+
+def rank_candidates(spotify_id, tracks, mood_params, deadline=None):
+    """
+    Order tracks by distance to the mood's target valence/energy/tempo and
+    drop those outside its tempo bounds. Tracks without audio features are
+    kept, behind close matches.
+    """
+    features = get_audio_features(spotify_id, [track.get("id") for track in tracks], deadline=deadline)
+    target_valence = mood_params.get("target_valence", 0.5)
+    target_energy = mood_params.get("target_energy", 0.5)
+
+    scored = []
+    for position, track in enumerate(tracks):
+        values = features.get(track.get("id"))
+        if values is None:
+            distance = UNKNOWN_DISTANCE
+        elif not within_tempo(values, mood_params):
+            continue
+        else:
+            distance = (values.get("valence", 0.5) - target_valence) ** 2 \
+                + (values.get("energy", 0.5) - target_energy) ** 2
+            if "target_tempo" in mood_params and values.get("tempo") is not None:
+                distance += ((values["tempo"] - mood_params["target_tempo"]) / TEMPO_SCALE) ** 2
+        # Ties keep source order
+        scored.append((distance, position, track))
+
+    scored.sort(key=lambda item: item[:2])
+    return [track for _, _, track in scored]
+
+
+def source_candidates(spotify_id, mood_params, limit=20, timeout=SOURCING_DEADLINE):
+    """
+    Ask every source at once (top-track seeds, top-artist seeds, mood
+    search), then merge what arrived, dedupe by URI and rank against the
+    mood, all within `timeout` seconds: ranking gets what's left, and if
+    that runs out the candidates come back in source order. Returns up to
+    `limit` tracks, or None if no source answered in time.
+    """
+    priority = current_priority()
+    deadline = time.monotonic() + timeout
+
+    def run(fn, *args, **kwargs):
+        # Pool threads don't inherit the caller's rate-limit priority
+        with spotify_priority(priority):
+            return fn(*args, **kwargs)
+
+    # Every Spotify call below, retries and rate-limit waits included, stops at
+    # the deadline, so late sources and rankings free their thread
+    futures = [
+        # Ask for spares: ranking drops off-tempo tracks
+        (name, _executor.submit(run, source, spotify_id, mood_params, limit * 2, deadline=deadline))
+        for name, source in SOURCES
+    ]
+    wait([future for _, future in futures], timeout=max(deadline - time.monotonic(), 0))
+
+    candidates = {}
+    answered = []
+    for name, future in futures:
+        if not future.done():
+            # Not started yet (the pool is busy) means it never will be useful
+            future.cancel()
+            print(f"⏱️ Candidate source {name} missed the {timeout}s deadline")
+            continue
+        if future.exception() is not None:
+            print(f"❌ Candidate source {name} failed: {future.exception()}")
+            continue
+        tracks = future.result()
+        if tracks is None:
+            continue
+        answered.append(name)
+        for track in tracks:
+            if track and track.get("uri"):
+                candidates.setdefault(track["uri"], track)
+
+    if not answered:
+        return None
+
+    unranked = list(candidates.values())
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        print(f"⏱️ No time left to rank candidates, using source order")
+        return unranked[:limit]
+
+    ranking = _executor.submit(run, rank_candidates, spotify_id, unranked, mood_params, deadline=deadline)
+    try:
+        tracks = ranking.result(timeout=remaining)[:limit]
+    except TimeoutError:
+        ranking.cancel()
+        print(f"⏱️ Ranking missed the {timeout}s deadline, using source order")
+        return unranked[:limit]
+    except Exception as e:
+        print(f"❌ Ranking candidates failed, using source order: {e}")
+        return unranked[:limit]
+
+    print(f"✅ {len(tracks)} candidates from {', '.join(answered)}")
+    return tracks
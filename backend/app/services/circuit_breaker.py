@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+
+import requests
+
+# Consecutive failures that open a circuit...
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+# ...and how long it stays open before one probe call is let through
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling Spotify while the endpoint family's circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after `failure_threshold` consecutive failures. Once
+    `reset_timeout` has passed, a single probe call is allowed (half-open):
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Whether a call may go out now; in half-open only the probe may"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, success):
+        """Report a call's outcome; None means it never reached Spotify"""
+        with self._lock:
+            self._probing = False
+            if success is None:
+                return
+            if success:
+                if self._state != CLOSED:
+                    print(f"🟢 Spotify {self.name} circuit closed")
+                self._state = CLOSED
+                self._failures = 0
+                return
+
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    print(f"🔴 Spotify {self.name} circuit open for {self.reset_timeout}s")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        return {"state": self.state, "failures": self._failures}
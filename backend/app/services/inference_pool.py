@@ -0,0 +1,359 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+# Model processes; 0 runs inference inside the web process
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 1))
+# CPUs the model processes are pinned to, e.g. "2-7" or "2,3,6,7"; split evenly between them
+INFERENCE_CPU_AFFINITY = os.getenv("INFERENCE_CPU_AFFINITY", "")
+# Calls waiting for or running in the pool before new ones are turned away
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", 64))
+# "spawn" gives each model process a clean interpreter (no inherited threads or sockets)
+INFERENCE_START_METHOD = os.getenv("INFERENCE_START_METHOD", "spawn")
+# Longest a model process may take to load before it's killed, in seconds
+INFERENCE_LOAD_TIMEOUT = float(os.getenv("INFERENCE_LOAD_TIMEOUT", 600))
+# Set by gunicorn.conf.py: the unix socket of the one inference service every
+# web worker shares (see serve()); without it each process runs its own pool
+INFERENCE_ADDRESS = os.getenv("INFERENCE_ADDRESS", "")
+INFERENCE_AUTHKEY = os.getenv("INFERENCE_AUTHKEY", "")
+
+
+class InferenceQueueFullError(Exception):
+    """Raised when INFERENCE_QUEUE_SIZE calls are already queued or running"""
+
+
+class InferenceTimeoutError(Exception):
+    """Raised when a call gets no answer from the pool in time"""
+
+
+class InferenceWorkerError(Exception):
+    """Raised when a model process (or the inference service) dies or can't be reached"""
+
+
+def parse_cpu_list(spec):
+    """"0-3,6" -> [0, 1, 2, 3, 6]"""
+    cpus = []
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def cpu_groups(cpus, workers):
+    """Split the CPUs into one contiguous group per worker (sharing if there are too few)"""
+    if not cpus:
+        return [None] * workers
+    if len(cpus) < workers:
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    size = len(cpus) // workers
+    return [cpus[i * size:(i + 1) * size] for i in range(workers)]
+
+
+# --- Runs in the model processes ---
+
+def _serve_model(conn, cpus):
+    """Load the model, report its window size, then answer (method, args) calls until the pipe closes"""
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+        try:
+            import torch
+
+            # One intra-op thread per pinned CPU, not one per CPU on the host
+            torch.set_num_threads(len(cpus))
+        except ImportError:
+            pass
+
+    from app.services.sentiment_analyzer import SentimentAnalyzer
+
+    analyzer = SentimentAnalyzer()
+    analyzer.load()
+    conn.send(("ready", analyzer.window))
+    print(f"🧠 Inference worker {os.getpid()} ready (cpus: {cpus or 'any'})")
+
+    while True:
+        try:
+            method, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            reply = ("ok", getattr(analyzer, method)(*args))
+        except Exception as e:
+            reply = ("error", e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The result or exception didn't pickle
+            conn.send(("error", RuntimeError(repr(e))))
+
+
+class _ModelProcess:
+    def __init__(self, context, cpus):
+        self.cpus = cpus
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve_model, args=(child, cpus), daemon=True)
+        self.process.start()
+        child.close()
+
+    def wait_ready(self, timeout):
+        """Block until the model has loaded; returns its window size"""
+        try:
+            if not self.conn.poll(timeout):
+                raise InferenceTimeoutError(f"Model process didn't load within {timeout}s")
+            _, window = self.conn.recv()
+        except (EOFError, OSError):
+            raise InferenceWorkerError(f"Model process exited while loading (code {self.process.exitcode})")
+        return window
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+# --- Runs in the web process (or the shared inference service) ---
+
+class InferencePool:
+    """
+    Model calls in separate processes, so inference never holds the web
+    process's GIL. Calls are bounded by `queue_size` and wait at most
+    `timeout`. A process that misses the timeout is killed and replaced
+    in the background; one that dies mid-call is replaced and the call
+    retried once on another.
+    """
+
+    def __init__(self, workers=1, cpus=None, queue_size=64, timeout=30, start_method="spawn",
+                 load_timeout=600):
+        self.workers = workers
+        self.groups = cpu_groups(cpus or [], workers)
+        self.timeout = timeout
+        self.load_timeout = load_timeout
+        self.queue_size = queue_size
+        self._context = multiprocessing.get_context(start_method)
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        # Model processes not serving a call right now
+        self._idle = queue.Queue()
+        self._window = None
+        self._stats = {"calls": 0, "rejected": 0, "timeouts": 0, "restarts": 0}
+
+    def start(self):
+        """Start every model process and wait until they've loaded; returns the model's window size"""
+        with self._lock:
+            if self._window is None:
+                # They load in parallel; waiting for each in turn takes as long as the slowest
+                processes = [_ModelProcess(self._context, cpus) for cpus in self.groups]
+                try:
+                    windows = [process.wait_ready(self.load_timeout) for process in processes]
+                except Exception:
+                    for process in processes:
+                        process.kill()
+                    raise
+                for process in processes:
+                    self._idle.put(process)
+                self._window = windows[0]
+            return self._window
+
+    def _replace(self, process, reason):
+        print(f"♻️ Inference worker {process.process.pid} {reason}, replacing it")
+        process.kill()
+        self._stats["restarts"] += 1
+        threading.Thread(target=self._respawn, args=(process.cpus,), name="inference-respawn", daemon=True).start()
+
+    def _respawn(self, cpus):
+        while True:
+            process = _ModelProcess(self._context, cpus)
+            try:
+                process.wait_ready(self.load_timeout)
+            except Exception as e:
+                print(f"❌ Replacement inference worker failed to load: {e}")
+                process.kill()
+                time.sleep(5)
+                continue
+            self._idle.put(process)
+            return
+
+    def call(self, method, *args):
+        """Run analyzer.<method>(*args) in a model process and return its result"""
+        if not self._slots.acquire(blocking=False):
+            self._stats["rejected"] += 1
+            raise InferenceQueueFullError(f"Inference queue is full ({self.queue_size} calls)")
+        try:
+            self._stats["calls"] += 1
+            deadline = time.monotonic() + self.timeout
+            for attempt in range(2):
+                try:
+                    process = self._idle.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    self._stats["timeouts"] += 1
+                    raise InferenceTimeoutError(f"No inference worker free within {self.timeout}s")
+                try:
+                    process.conn.send((method, args))
+                    if not process.conn.poll(max(deadline - time.monotonic(), 0)):
+                        # Hung or just too slow: either way it would hold its slot indefinitely
+                        self._replace(process, "timed out")
+                        self._stats["timeouts"] += 1
+                        raise InferenceTimeoutError(f"No inference result within {self.timeout}s")
+                    status, value = process.conn.recv()
+                except (EOFError, OSError):
+                    self._replace(process, "died")
+                    if attempt:
+                        raise InferenceWorkerError("Inference worker died twice running this call")
+                    continue
+                self._idle.put(process)
+                if status == "error":
+                    raise value
+                return value
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {**self._stats, "workers": self.workers, "cpus": self.groups, "idle": self._idle.qsize()}
+
+
+class InferenceClient:
+    """
+    The InferencePool interface, forwarded to the inference service over a
+    unix socket, so every web worker on the host shares one set of model
+    processes instead of starting its own.
+    """
+
+    def __init__(self, address, authkey, workers=1, timeout=30, load_timeout=600):
+        self.address = address
+        self.authkey = authkey
+        # Sizes the caller's batcher: one batch in flight per model process
+        self.workers = workers
+        self.timeout = timeout
+        self.load_timeout = load_timeout
+        self._connections = []
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "timeouts": 0, "errors": 0}
+
+    def _request(self, timeout, *request):
+        for attempt in range(2):
+            with self._lock:
+                conn = self._connections.pop() if self._connections else None
+            reused = conn is not None
+            try:
+                conn = conn or Client(self.address, authkey=self.authkey)
+                conn.send(request)
+                if not conn.poll(timeout):
+                    conn.close()
+                    self._stats["timeouts"] += 1
+                    raise InferenceTimeoutError(f"No answer from the inference service within {timeout}s")
+                status, value = conn.recv()
+            except (EOFError, OSError) as e:
+                if conn:
+                    conn.close()
+                # A pooled connection may predate a service restart; retry once on a new one
+                if reused and not attempt:
+                    continue
+                self._stats["errors"] += 1
+                raise InferenceWorkerError(f"Inference service unavailable: {e}")
+            with self._lock:
+                self._connections.append(conn)
+            if status == "error":
+                raise value
+            return value
+
+    def start(self):
+        """Wait for the service to come up (it listens once its models have loaded); returns the window size"""
+        deadline = time.monotonic() + self.load_timeout
+        while True:
+            try:
+                return self._request(self.load_timeout, "start", ())
+            except InferenceWorkerError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(1)
+
+    def call(self, method, *args):
+        """Run analyzer.<method>(*args) in the service's pool and return its result"""
+        self._stats["calls"] += 1
+        # A little longer than the service's own timeout, so its InferenceTimeoutError arrives first
+        return self._request(self.timeout + 5, "call", (method, *args))
+
+    def stats(self):
+        return {**self._stats, "workers": self.workers, "address": self.address}
+
+
+def _serve_client(pool, conn):
+    with conn:
+        while True:
+            try:
+                method, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if method not in ("start", "call", "stats"):
+                    raise ValueError(f"Unknown inference service method: {method}")
+                reply = ("ok", getattr(pool, method)(*args))
+            except Exception as e:
+                reply = ("error", e)
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+            except Exception as e:
+                conn.send(("error", RuntimeError(repr(e))))
+
+
+def serve(address, authkey):
+    """
+    Run the inference service: one InferencePool shared by every web worker.
+    gunicorn.conf.py starts it as `python -m app.services.inference_pool`.
+    """
+    from app.services.sentiment_analyzer import SENTIMENT_TIMEOUT
+
+    pool = InferencePool(
+        workers=INFERENCE_WORKERS,
+        cpus=parse_cpu_list(INFERENCE_CPU_AFFINITY),
+        queue_size=INFERENCE_QUEUE_SIZE,
+        timeout=SENTIMENT_TIMEOUT,
+        start_method=INFERENCE_START_METHOD,
+        load_timeout=INFERENCE_LOAD_TIMEOUT,
+    )
+    pool.start()
+
+    # Left behind by a service that was killed
+    if os.path.exists(address):
+        os.unlink(address)
+    with Listener(address, authkey=authkey) as listener:
+        print(f"🧠 Inference service listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, multiprocessing.AuthenticationError) as e:
+                print(f"⚠️ Rejected inference service connection: {e}")
+                continue
+            threading.Thread(target=_serve_client, args=(pool, conn), name="inference-client", daemon=True).start()
+
+
+def make_inference_pool(timeout):
+    """The pool configured by INFERENCE_* (not started yet), or None for in-process inference"""
+    if INFERENCE_WORKERS <= 0:
+        return None
+    if INFERENCE_ADDRESS:
+        return InferenceClient(
+            INFERENCE_ADDRESS, INFERENCE_AUTHKEY.encode(), INFERENCE_WORKERS, timeout, INFERENCE_LOAD_TIMEOUT
+        )
+    return InferencePool(
+        workers=INFERENCE_WORKERS,
+        cpus=parse_cpu_list(INFERENCE_CPU_AFFINITY),
+        queue_size=INFERENCE_QUEUE_SIZE,
+        timeout=timeout,
+        start_method=INFERENCE_START_METHOD,
+        load_timeout=INFERENCE_LOAD_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    # Re-import so pickled exceptions name app.services.inference_pool, not __main__
+    from app.services.inference_pool import serve as serve_pool
+
+    serve_pool(INFERENCE_ADDRESS, INFERENCE_AUTHKEY.encode())
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class BatcherFullError(Exception):
+    """Raised when max_queue items are already waiting"""
+
+
+class MicroBatcher:
+    """
+    Gathers single items submitted from many threads and runs them through
+    `fn(items) -> results` together: a batch goes out once `max_batch_size`
+    items are waiting or the oldest has waited `max_wait` seconds. Up to
+    `concurrency` batches run at once, and at most `max_queue` items wait
+    (None for no limit).
+    """
+
+    def __init__(self, fn, max_batch_size=32, max_wait=0.005, name="micro-batcher", concurrency=1,
+                 max_queue=None):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._stats = {"batches": 0, "items": 0, "max_batch": 0, "rejected": 0}
+        for i in range(concurrency):
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True).start()
+
+    def submit(self, item):
+        """Queue an item; returns a Future for its result"""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items):
+        """Queue all the items or, if they don't fit, none (BatcherFullError)"""
+        futures = [Future() for _ in items]
+        with self._lock:
+            if self.max_queue is not None and len(self._queue) + len(futures) > self.max_queue:
+                self._stats["rejected"] += len(futures)
+                raise BatcherFullError(f"{len(self._queue)} items already waiting (limit {self.max_queue})")
+            self._queue.extend(zip(items, futures))
+            self._not_empty.notify()
+        return futures
+
+    def _next_batch(self):
+        with self._lock:
+            while not self._queue:
+                self._not_empty.wait()
+            # Give concurrent callers a moment to join the batch
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._not_empty.wait(remaining)
+            count = min(len(self._queue), self.max_batch_size)
+            batch = [self._queue.popleft() for _ in range(count)]
+            # Hand what's left to another idle thread rather than waiting for the next submit
+            if self._queue:
+                self._not_empty.notify()
+            return batch
+
+    def _run(self):
+        while True:
+            # Skip callers that cancelled while waiting
+            batch = [(item, future) for item, future in self._next_batch() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.fn(items)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["items"] += len(items)
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(items))
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "queued": len(self._queue)}
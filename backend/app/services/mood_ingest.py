@@ -0,0 +1,17 @@
+from app.services.mood_runs import MOOD_STORAGE_MODE, get_run_tracker
+from app.services.mood_watcher import watch_moods
+from app.services.mood_writer import save_moods
+
+
+def ingest_moods(records):
+    """Store canonical mood samples, either as-is or folded into runs (MOOD_STORAGE_MODE).
+
+    Raises BufferFullError when the write buffer cannot take the records.
+    """
+    watch_moods(records)
+
+    if MOOD_STORAGE_MODE == "runs":
+        records = get_run_tracker().add(records)
+
+    if records:
+        save_moods(records)
@@ -19,6 +19,10 @@ MOOD_TO_SEED = {
         "valence": 0.7,
         "energy": 0.8
     },
+    "surprised": {
+        "valence": 0.7,
+        "energy": 0.8
+    },
     "fear": {
         "valence": 0.2,
         "energy": 0.6
@@ -0,0 +1,250 @@
+import os
+import time
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne, ReturnDocument
+
+from db import moods_collection, mood_rollups_collection, migrations_collection
+from app.services.mood_schema import samples_between, samples_between_expr
+
+# Per-user daily rollup documents:
+#   {"u": <spotify_id>, "d": <UTC midnight>, "n": {"<code>": count}, "cs": {"<code>": confidence sum}}
+# Counts are keyed by emotion code (as a string, since they are field names).
+# A stored run that crosses midnight is split between the days (samples_between).
+
+ROLLUP_BACKFILL_ID = "mood_rollups_backfill"
+# When ingest started $inc-ing rollups; days from then on must not be replaced by a backfill
+ROLLUP_LIVE_ID = "mood_rollups_live"
+
+# Seconds a "not backfilled yet" answer is trusted before migrations is asked again
+ROLLUP_READY_RECHECK = float(os.getenv("ROLLUP_READY_RECHECK", 60))
+
+_backfilled = False
+_backfill_checked_at = None
+_live_marked = False
+
+DAY = timedelta(days=1)
+DAY_MS = DAY // timedelta(milliseconds=1)
+
+
+def max_run_span():
+    """Longest a stored run lasts, so range scans also find runs that began before the range"""
+    # Imported here: mood_runs imports the writer, which imports this module
+    from app.services.mood_runs import MOOD_RUN_MAX_SECONDS
+
+    return timedelta(seconds=MOOD_RUN_MAX_SECONDS)
+
+
+def day_start(moment):
+    """UTC midnight of the day containing `moment`"""
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def mark_rollups_live(docs=()):
+    """Record (once) when rollups started being maintained at ingest; returns that moment.
+
+    `docs` are the moods being rolled up right now. If the first marking finds
+    no other moods, there is no history to backfill and rollups are complete.
+    """
+    global _live_marked, _backfilled
+    since = datetime.utcnow()
+    previous = migrations_collection.find_one_and_update(
+        {"_id": ROLLUP_LIVE_ID},
+        {"$setOnInsert": {"since": since}},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+    _live_marked = True
+    if previous:
+        return previous["since"]
+
+    ids = [doc["_id"] for doc in docs if "_id" in doc]
+    if not moods_collection.find_one({"_id": {"$nin": ids}}, {"_id": 1}):
+        migrations_collection.update_one(
+            {"_id": ROLLUP_BACKFILL_ID},
+            {"$set": {"completed": True, "completed_at": since}},
+            upsert=True
+        )
+        _backfilled = True
+        print("✅ New mood database: rollups are complete without a backfill")
+    return since
+
+
+def apply_rollups(docs):
+    """$inc the daily rollups for mood documents that were just stored.
+
+    Failures are logged rather than raised: the samples themselves are already
+    stored and `python manage.py backfill-rollups` rebuilds the rollups.
+    """
+    if not _live_marked:
+        try:
+            mark_rollups_live(docs)
+        except Exception as e:
+            print(f"❌ Failed to mark mood rollups live: {e}")
+
+    increments = defaultdict(lambda: defaultdict(int))
+    for doc in docs:
+        day = day_start(doc["t"])
+        while day <= doc.get("te", doc["t"]):
+            n = samples_between(doc, day, day + DAY)
+            if n:
+                increments[(doc["u"], day)][f"n.{doc['e']}"] += n
+                increments[(doc["u"], day)][f"cs.{doc['e']}"] += doc["c"] * n
+            day += DAY
+
+    if not increments:
+        return
+
+    operations = [
+        UpdateOne({"u": user_id, "d": day}, {"$inc": dict(inc)}, upsert=True)
+        for (user_id, day), inc in increments.items()
+    ]
+    try:
+        mood_rollups_collection.bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"❌ Failed to update mood rollups: {e}")
+        traceback.print_exc()
+
+
+def rollups_ready():
+    """Whether rollups cover the full mood history (the backfill has completed)"""
+    global _backfilled, _backfill_checked_at
+    if _backfilled:
+        return True
+    # Until the backfill has run, don't ask Mongo on every request
+    now = time.monotonic()
+    if _backfill_checked_at is not None and now - _backfill_checked_at < ROLLUP_READY_RECHECK:
+        return False
+    _backfill_checked_at = now
+    marker = migrations_collection.find_one({"_id": ROLLUP_BACKFILL_ID}, {"completed": 1})
+    _backfilled = bool(marker and marker.get("completed"))
+    return _backfilled
+
+
+def sum_rollups(user_id, since_day):
+    """Per-emotion (counts, confidence_sums) from the user's rollups on or after `since_day`"""
+    counts = defaultdict(int)
+    confidence_sums = defaultdict(float)
+    for rollup in mood_rollups_collection.find(
+        {"u": user_id, "d": {"$gte": since_day}},
+        {"_id": 0, "n": 1, "cs": 1}
+    ):
+        for code, count in rollup.get("n", {}).items():
+            counts[int(code)] += int(count)
+        for code, confidence_sum in rollup.get("cs", {}).items():
+            confidence_sums[int(code)] += confidence_sum
+    return counts, confidence_sums
+
+
+def sum_moods(user_id, since, until=None):
+    """Per-emotion (counts, confidence_sums) straight from the moods collection.
+
+    Runs overlapping either end of the range only count their samples inside it.
+    """
+    time_range = {"$gte": since - max_run_span()}
+    if until is not None:
+        time_range["$lt"] = until
+
+    counts = defaultdict(int)
+    confidence_sums = defaultdict(float)
+    for group in moods_collection.aggregate([
+        {"$match": {"u": user_id, "t": time_range}},
+        {"$project": {"_id": 0, "e": 1, "c": 1, "n": samples_between_expr(since, until)}},
+        {"$match": {"n": {"$gt": 0}}},
+        {"$group": {
+            "_id": "$e",
+            "count": {"$sum": "$n"},
+            "confidence_sum": {"$sum": {"$multiply": ["$c", "$n"]}}
+        }}
+    ]):
+        counts[group["_id"]] += group["count"]
+        confidence_sums[group["_id"]] += group["confidence_sum"]
+    return counts, confidence_sums
+
+
+def mood_totals(user_id, since):
+    """Per-emotion (counts, confidence_sums) for stored moods since `since`.
+
+    Whole days come from the rollups; only the partial first day is scanned
+    in the moods collection. Falls back to a full scan until the backfill ran.
+    """
+    if not rollups_ready():
+        return sum_moods(user_id, since)
+
+    first_full_day = day_start(since)
+    if first_full_day < since:
+        first_full_day += timedelta(days=1)
+
+    counts, confidence_sums = sum_rollups(user_id, first_full_day)
+    if since < first_full_day:
+        partial_counts, partial_sums = sum_moods(user_id, since, first_full_day)
+        for code, count in partial_counts.items():
+            counts[code] += count
+            confidence_sums[code] += partial_sums[code]
+    return counts, confidence_sums
+
+
+def backfill_rollups():
+    """Rebuild the rollups of past days from the moods collection.
+
+    Only days before both the day ingest started maintaining rollups and
+    today are rebuilt: nothing $incs those any more, so replacing them can't
+    lose a concurrent increment. Returns True once the rebuilt days reach the
+    live ones (the rollups are complete), False if it has to run again later.
+    """
+    global _backfilled
+
+    cutover = day_start(mark_rollups_live()) + timedelta(days=1)
+    until = min(cutover, day_start(datetime.utcnow()))
+
+    first_day = {"$dateFromParts": {"year": {"$year": "$t"}, "month": {"$month": "$t"}, "day": {"$dayOfMonth": "$t"}}}
+    next_day = {"$add": ["$d", DAY_MS]}
+    moods_collection.aggregate([
+        {"$match": {"t": {"$lt": until}}},
+        {"$project": {"_id": 0, "u": 1, "t": 1, "te": 1, "e": 1, "c": 1, "n": 1, "d": first_day}},
+        # Runs last far less than a day (MOOD_RUN_MAX_SECONDS), so touch their first day and at most the next
+        {"$project": {"u": 1, "e": 1, "c": 1, "parts": [
+            {"d": "$d", "n": samples_between_expr("$d", next_day)},
+            {"d": next_day, "n": samples_between_expr(next_day, {"$add": ["$d", 2 * DAY_MS]})},
+        ]}},
+        {"$unwind": "$parts"},
+        # Days from `until` on are live; the part of a run spilling into them is left alone
+        {"$match": {"parts.n": {"$gt": 0}, "parts.d": {"$lt": until}}},
+        {"$group": {
+            "_id": {"u": "$u", "d": "$parts.d", "e": {"$toString": "$e"}},
+            "n": {"$sum": "$parts.n"},
+            "cs": {"$sum": {"$multiply": ["$c", "$parts.n"]}}
+        }},
+        {"$group": {
+            "_id": {"u": "$_id.u", "d": "$_id.d"},
+            "n": {"$push": {"k": "$_id.e", "v": "$n"}},
+            "cs": {"$push": {"k": "$_id.e", "v": "$cs"}}
+        }},
+        {"$project": {
+            "_id": 0,
+            "u": "$_id.u",
+            "d": "$_id.d",
+            "n": {"$arrayToObject": "$n"},
+            "cs": {"$arrayToObject": "$cs"}
+        }},
+        {"$merge": {
+            "into": mood_rollups_collection.name,
+            "on": ["u", "d"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ], allowDiskUse=True)
+
+    if until < cutover:
+        print(f"⏳ Rollups rebuilt up to {until:%Y-%m-%d}; run again after {cutover:%Y-%m-%d} to finish")
+        return False
+
+    migrations_collection.update_one(
+        {"_id": ROLLUP_BACKFILL_ID},
+        {"$set": {"completed": True, "completed_at": datetime.utcnow()}},
+        upsert=True
+    )
+    _backfilled = True
+    return True
@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.services.mood_writer import save_moods
+
+# "samples" stores every detection; "runs" collapses consecutive detections of
+# the same emotion into one {u, t, te, e, c, n} document, where t/te are the
+# first/last sample times, c the mean confidence and n the sample count
+MOOD_STORAGE_MODE = os.getenv("MOOD_STORAGE_MODE", "samples")
+
+# A run is closed and written once it holds this many samples...
+MOOD_RUN_MAX_SAMPLES = int(os.getenv("MOOD_RUN_MAX_SAMPLES", 720))
+# ...spans this many seconds...
+MOOD_RUN_MAX_SECONDS = int(os.getenv("MOOD_RUN_MAX_SECONDS", 3600))
+# ...or has a gap of this many seconds between sample times (the camera was switched off)
+MOOD_RUN_MAX_GAP = int(os.getenv("MOOD_RUN_MAX_GAP", 60))
+# Open runs nothing has arrived for in this many seconds are moved to moods;
+# longer than the gap, since /store-batch clients deliver samples late
+MOOD_RUN_IDLE_CLOSE = int(os.getenv("MOOD_RUN_IDLE_CLOSE", 300))
+
+
+def split_chunks(records, max_samples, max_span, max_gap):
+    """Group time-sorted samples of one user into chunks that can each extend a run in one update"""
+    chunks = []
+    for record in records:
+        chunk = chunks[-1] if chunks else None
+        if chunk is None or (
+            chunk[0]["e"] != record["e"]
+            or len(chunk) >= max_samples
+            or record["t"] - chunk[0]["t"] >= max_span
+            or record["t"] - chunk[-1]["t"] > max_gap
+        ):
+            chunks.append([record])
+        else:
+            chunk.append(record)
+    return chunks
+
+
+def to_document(run):
+    """An open run in stored mood document shape"""
+    return {
+        "u": run["u"],
+        "t": run["t"],
+        "te": run["te"],
+        "e": run["e"],
+        "c": run["cs"] / run["n"],
+        "n": run["n"],
+    }
+
+
+class MoodRunTracker:
+    """
+    Keeps each user's open run as one document (_id = user) in Mongo, so every
+    worker extends and reads the same run and a restart loses nothing. Samples
+    are added with a conditional $inc; a run that can't take them is swapped
+    for a new one atomically, and handed back to be stored in moods.
+    """
+
+    def __init__(self, collection, max_samples=720, max_seconds=3600, max_gap=60, idle_close=300):
+        self.collection = collection
+        self.max_samples = max_samples
+        self.max_span = timedelta(seconds=max_seconds)
+        self.max_gap = timedelta(seconds=max_gap)
+        self.idle_close = timedelta(seconds=idle_close)
+
+    def add(self, records):
+        """Fold canonical mood samples into open runs; returns the runs this closed"""
+        by_user = {}
+        for record in sorted(records, key=lambda r: r["t"]):
+            by_user.setdefault(record["u"], []).append(record)
+
+        closed = []
+        for user_id, user_records in by_user.items():
+            for chunk in split_chunks(user_records, self.max_samples, self.max_span, self.max_gap):
+                closed.extend(self._add_chunk(user_id, chunk))
+        return closed
+
+    def _extends(self, chunk):
+        """Filter matching an open run that the chunk may extend"""
+        return {
+            "e": chunk[0]["e"],
+            "n": {"$lte": self.max_samples - len(chunk)},
+            "t": {"$gt": chunk[-1]["t"] - self.max_span},
+            "te": {"$gte": chunk[0]["t"] - self.max_gap},
+        }
+
+    def _add_chunk(self, user_id, chunk):
+        now = datetime.utcnow()
+        while True:
+            extended = self.collection.find_one_and_update(
+                {"_id": user_id, **self._extends(chunk)},
+                {
+                    "$inc": {"n": len(chunk), "cs": sum(record["c"] for record in chunk)},
+                    "$max": {"te": chunk[-1]["t"]},
+                    "$set": {"seen": now},
+                },
+                projection={"_id": 1},
+            )
+            if extended:
+                return []
+
+            # Replace whatever run is there, unless another worker just made one we can extend
+            try:
+                previous = self.collection.find_one_and_replace(
+                    {"_id": user_id, "$nor": [self._extends(chunk)]},
+                    {
+                        "u": user_id,
+                        "t": chunk[0]["t"],
+                        "te": chunk[-1]["t"],
+                        "e": chunk[0]["e"],
+                        "n": len(chunk),
+                        "cs": sum(record["c"] for record in chunk),
+                        "seen": now,
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.BEFORE,
+                )
+            except DuplicateKeyError:
+                continue
+            return [to_document(previous)] if previous else []
+
+    def sweep(self, now=None):
+        """Close runs nothing has arrived for within idle_close"""
+        now = now or datetime.utcnow()
+        closed = []
+        for run in self.collection.find({"seen": {"$lt": now - self.idle_close}}):
+            # Only if it wasn't extended meanwhile; other workers sweep too
+            if self.collection.find_one_and_delete({"_id": run["_id"], "seen": run["seen"]}):
+                closed.append(to_document(run))
+        return closed
+
+    def open_run(self, user_id):
+        """The user's current run in stored document shape, or None"""
+        run = self.collection.find_one({"_id": user_id})
+        return to_document(run) if run else None
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_run_tracker():
+    """Return the process-wide run tracker, starting its idle sweeper on first use"""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                from db import mood_open_runs_collection
+
+                _tracker = MoodRunTracker(
+                    mood_open_runs_collection,
+                    MOOD_RUN_MAX_SAMPLES, MOOD_RUN_MAX_SECONDS, MOOD_RUN_MAX_GAP, MOOD_RUN_IDLE_CLOSE
+                )
+                threading.Thread(target=_sweep_forever, name="mood-run-sweeper", daemon=True).start()
+    return _tracker
+
+
+def _sweep_forever():
+    while True:
+        time.sleep(max(MOOD_RUN_IDLE_CLOSE / 4, 1))
+        try:
+            closed = _tracker.sweep()
+            if closed:
+                save_moods(closed)
+        except Exception as e:
+            print(f"❌ Failed to close idle mood runs: {e}")
+            traceback.print_exc()
+
+
+def open_run(user_id):
+    """The user's open (not yet in moods) run, when storing runs"""
+    if MOOD_STORAGE_MODE != "runs":
+        return None
+    return get_run_tracker().open_run(user_id)
+
+
+def expand_runs(docs, limit):
+    """Turn stored mood documents (newest first) into at most `limit` samples, newest first.
+
+    Runs are spread back into n evenly spaced samples at the run's mean confidence,
+    so readers see the same shape whether moods were stored as samples or runs.
+    """
+    samples = []
+    for doc in docs:
+        n = doc.get("n", 1)
+        if n == 1:
+            samples.append({"e": doc["e"], "c": doc["c"], "t": doc["t"]})
+        else:
+            step = (doc["te"] - doc["t"]) / (n - 1)
+            for i in range(n - 1, -1, -1):
+                samples.append({"e": doc["e"], "c": doc["c"], "t": doc["t"] + step * i})
+                if len(samples) >= limit:
+                    break
+        if len(samples) >= limit:
+            break
+    return samples[:limit]
@@ -0,0 +1,144 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+# Canonical mood document stored in the moods collection:
+#   {"u": <spotify_id>, "t": <BSON datetime, UTC>, "e": <emotion code>, "c": <confidence 0-1>}
+# Short keys and an integer emotion code keep each sample small and let the
+# (u, t, e, c, n) index answer range queries without touching the documents.
+# When moods are stored as runs (see mood_runs.py) a document also carries
+# te (last sample time) and n (sample count), and c is the run's mean.
+
+EMOTIONS = ["neutral", "happy", "sad", "angry", "surprised", "fear", "disgust"]
+
+EMOTION_CODES = {name: code for code, name in enumerate(EMOTIONS)}
+
+# Aggregation expression that treats a plain sample as a run of one
+SAMPLE_COUNT = {"$ifNull": ["$n", 1]}
+
+# Confidence scales by source: the camera sends percentages, everything else 0-1
+CAMERA_CONFIDENCE_SCALE = 100
+UNIT_CONFIDENCE_SCALE = 1
+
+# face-api.js and the older mappers use slightly different names
+EMOTION_ALIASES = {
+    "fearful": "fear",
+    "disgusted": "disgust",
+    "surprise": "surprised",
+}
+
+
+def encode_emotion(emotion):
+    """Return the integer code for an emotion name, raising ValueError if unknown"""
+    name = str(emotion).strip().lower()
+    name = EMOTION_ALIASES.get(name, name)
+    if name not in EMOTION_CODES:
+        raise ValueError(f"Unknown emotion: {emotion}")
+    return EMOTION_CODES[name]
+
+
+def decode_emotion(code):
+    """Return the emotion name for an integer code"""
+    return EMOTIONS[code]
+
+
+def normalize_confidence(confidence, scale=UNIT_CONFIDENCE_SCALE):
+    """Return confidence as a 0-1 float, given the scale its source uses (1 or 100)"""
+    value = float(confidence) / scale
+    # NaN would slip past the range check and poison every average it joins
+    if not math.isfinite(value) or value < 0 or value > 1:
+        raise ValueError(f"Confidence out of range: {confidence}")
+    return value
+
+
+def samples_between(doc, since=None, until=None):
+    """How many of a stored document's samples fall in [since, until) (None is unbounded).
+
+    A run's n samples are taken as evenly spaced from t to te, as expand_runs()
+    spreads them, so a run straddling a window edge or midnight is split
+    between the two sides instead of counted wholly at its start.
+    """
+    n = doc.get("n", 1)
+    span = doc.get("te", doc["t"]) - doc["t"]
+    if n <= 1 or not span:
+        inside = (since is None or doc["t"] >= since) and (until is None or doc["t"] < until)
+        return n if inside else 0
+
+    # Index of the first sample at or after `bound`, in integer microseconds to stay exact
+    def first_at(bound):
+        offset = (bound - doc["t"]) // timedelta(microseconds=1)
+        return -(-offset * (n - 1) // (span // timedelta(microseconds=1)))
+
+    first = 0 if since is None else max(0, first_at(since))
+    end = n if until is None else min(n, first_at(until))
+    return max(0, end - first)
+
+
+def samples_between_expr(since=None, until=None):
+    """Aggregation expression for samples_between() of each document; since/until may be expressions"""
+    span = {"$subtract": [{"$ifNull": ["$te", "$t"]}, "$t"]}
+
+    def first_at(bound):
+        return {"$ceil": {"$divide": [
+            {"$multiply": [{"$subtract": [bound, "$t"]}, {"$subtract": [SAMPLE_COUNT, 1]}]}, span
+        ]}}
+
+    first = 0 if since is None else {"$max": [0, first_at(since)]}
+    end = SAMPLE_COUNT if until is None else {"$min": [SAMPLE_COUNT, first_at(until)]}
+    inside = [{"$gte": ["$t", since]}] if since is not None else []
+    inside += [{"$lt": ["$t", until]}] if until is not None else []
+    return {"$cond": [
+        {"$or": [{"$lte": [SAMPLE_COUNT, 1]}, {"$eq": [span, 0]}]},
+        {"$cond": [{"$and": inside}, SAMPLE_COUNT, 0]},
+        {"$max": [0, {"$subtract": [end, first]}]},
+    ]}
+
+
+def parse_timestamp(timestamp):
+    """Return a naive UTC datetime from a datetime, an ISO string or None"""
+    if timestamp is None:
+        return datetime.utcnow()
+    if isinstance(timestamp, datetime):
+        parsed = timestamp
+    else:
+        parsed = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def make_mood_record(user_id, emotion, confidence, timestamp=None, scale=UNIT_CONFIDENCE_SCALE):
+    """Build a canonical mood document, raising ValueError on invalid input"""
+    return {
+        "u": user_id,
+        "t": parse_timestamp(timestamp),
+        "e": encode_emotion(emotion),
+        "c": normalize_confidence(confidence, scale),
+    }
+
+
+def from_legacy(doc):
+    """Convert a pre-unification mood document to the canonical shape.
+
+    Handles both the camera shape {user_id, emotion, confidence, timestamp: <ISO string>}
+    and the dashboard shape {spotify_id, mood, confidence, timestamp: <datetime>}.
+    A missing timestamp is taken from the ObjectId's creation time.
+    """
+    # Only the camera shape has user_id, and the camera stored percentages
+    if "user_id" in doc:
+        user_id, emotion, scale = doc["user_id"], doc.get("emotion"), CAMERA_CONFIDENCE_SCALE
+    else:
+        user_id, emotion, scale = doc.get("spotify_id"), doc.get("mood"), UNIT_CONFIDENCE_SCALE
+    if not user_id:
+        raise ValueError("Mood has no user")
+    if doc.get("confidence") is None:
+        raise ValueError("Mood has no confidence")
+
+    # Never default to now: that would re-date old moods to the migration run
+    timestamp = doc.get("timestamp")
+    if timestamp is None:
+        if not hasattr(doc["_id"], "generation_time"):
+            raise ValueError("Mood has no timestamp")
+        timestamp = doc["_id"].generation_time
+    record = make_mood_record(user_id, emotion, doc["confidence"], timestamp, scale)
+    record["_id"] = doc["_id"]
+    return record
@@ -0,0 +1,235 @@
+import os
+import queue
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from db import users_collection
+from app.services.mood_schema import decode_emotion
+from app.services.playlist_service import sync_playlist
+from app.services.rate_limiter import BACKGROUND, spotify_priority
+from app.services.recommendations import get_tracks_for_mood
+
+# Refresh users' MoodBeats playlist in the background when their mood changes
+AUTO_PLAYLIST_UPDATES = os.getenv("AUTO_PLAYLIST_UPDATES", "0") == "1"
+# A new mood must hold for this many seconds before the playlist follows it
+MOOD_CHANGE_DEBOUNCE = int(os.getenv("MOOD_CHANGE_DEBOUNCE", 60))
+# At most this many playlist refreshes per worker process talk to Spotify at once
+PLAYLIST_REFRESH_CONCURRENCY = int(os.getenv("PLAYLIST_REFRESH_CONCURRENCY", 2))
+# And each user's playlist is refreshed at most once per this many seconds
+PLAYLIST_REFRESH_MIN_INTERVAL = int(os.getenv("PLAYLIST_REFRESH_MIN_INTERVAL", 300))
+# Tracks put in the playlist on each refresh
+PLAYLIST_REFRESH_TRACKS = int(os.getenv("PLAYLIST_REFRESH_TRACKS", 20))
+# Each process's refresh workers look for due refreshes this often, in seconds
+PLAYLIST_REFRESH_POLL = float(os.getenv("PLAYLIST_REFRESH_POLL", 5))
+# A claimed refresh that hasn't finished by then (its worker died) can be claimed again
+PLAYLIST_REFRESH_LEASE = int(os.getenv("PLAYLIST_REFRESH_LEASE", 120))
+# Sample batches waiting to be watched; more are dropped, not queued, so ingest never waits
+MOOD_WATCH_QUEUE = int(os.getenv("MOOD_WATCH_QUEUE", 1000))
+
+
+def refresh_mood_playlist(spotify_id, emotion):
+    """Point the user's MoodBeats playlist at tracks for `emotion`"""
+    user = users_collection.find_one({"spotify_id": spotify_id})
+    if not user or user.get("mood_playlist_emotion") == emotion:
+        return
+
+    # Through user_id, so an expired token is refreshed instead of failing with 401
+    track_uris = get_tracks_for_mood(emotion, limit=PLAYLIST_REFRESH_TRACKS, user_id=spotify_id)
+    if not track_uris:
+        print(f"⚠️ No tracks for {emotion}, leaving {spotify_id}'s playlist alone")
+        return
+
+    sync_playlist(user, track_uris)
+    users_collection.update_one({"spotify_id": spotify_id}, {"$set": {"mood_playlist_emotion": emotion}})
+
+
+class PlaylistRefreshScheduler:
+    """
+    Watches incoming mood samples and refreshes a user's playlist once a
+    changed mood has held for `debounce` seconds. State lives on the user
+    document, so every worker process sees all of a user's samples:
+      mood_watch_e / mood_watch_since   current mood and when it started
+      mood_watch_scheduled              mood a refresh was last scheduled for
+      mood_refresh_emotion / _at        pending refresh and when it may run
+      mood_refresh_lease                until when a worker holds it
+      mood_refreshed_at                 when the last refresh finished
+    Changes that arrive while a refresh is pending or running are merged
+    into one follow-up refresh, at most one per `min_interval` seconds.
+    Samples handed to submit() are observed on a background thread, so the
+    ingest path never waits on those updates.
+    """
+
+    def __init__(self, refresh, collection, debounce=60, concurrency=2, min_interval=300,
+                 poll_interval=5, lease=120, queue_size=1000):
+        self.refresh = refresh
+        self.collection = collection
+        self.debounce = timedelta(seconds=debounce)
+        self.min_interval = timedelta(seconds=min_interval)
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease)
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "refreshed": 0, "failed": 0, "dropped": 0}
+        self._pending = queue.Queue(maxsize=queue_size)
+
+        threading.Thread(target=self._observe_forever, name="mood-watch", daemon=True).start()
+        for i in range(concurrency):
+            threading.Thread(target=self._work, name=f"playlist-refresh-{i}", daemon=True).start()
+
+    def submit(self, records):
+        """Queue samples for observe() on the watcher thread; returns False (and drops them) if it's behind"""
+        try:
+            self._pending.put_nowait(records)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += len(records)
+            return False
+
+    def _observe_forever(self):
+        while True:
+            records = list(self._pending.get())
+            # Batches that queued up meanwhile go in the same pass
+            while True:
+                try:
+                    records += self._pending.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self.observe(records)
+            except Exception as e:
+                print(f"❌ Couldn't watch mood changes: {e}")
+                traceback.print_exc()
+
+    def observe(self, records):
+        """Feed canonical mood samples (any users, any order)"""
+        latest = {}
+        for record in records:
+            if record["u"] not in latest or record["t"] >= latest[record["u"]]["t"]:
+                latest[record["u"]] = record
+
+        for user_id, record in latest.items():
+            # A different mood restarts the debounce (matches nothing when unchanged)
+            self.collection.update_one(
+                {"spotify_id": user_id, "mood_watch_e": {"$ne": record["e"]}},
+                {"$set": {"mood_watch_e": record["e"], "mood_watch_since": record["t"]}}
+            )
+            # Held long enough and not yet scheduled: schedule it, at most once per min_interval
+            scheduled = self.collection.update_one(
+                {
+                    "spotify_id": user_id,
+                    "mood_watch_e": record["e"],
+                    "mood_watch_since": {"$lte": record["t"] - self.debounce},
+                    "mood_watch_scheduled": {"$ne": record["e"]},
+                },
+                [{"$set": {
+                    "mood_watch_scheduled": record["e"],
+                    "mood_refresh_emotion": decode_emotion(record["e"]),
+                    "mood_refresh_at": {"$max": [
+                        "$$NOW",
+                        {"$add": ["$mood_refreshed_at", self.min_interval.total_seconds() * 1000]},
+                    ]},
+                }}]
+            )
+            if scheduled.modified_count:
+                with self._lock:
+                    self._stats["scheduled"] += 1
+
+    def _claim(self):
+        """Lease the most overdue refresh, or None"""
+        now = datetime.utcnow()
+        return self.collection.find_one_and_update(
+            {
+                "mood_refresh_at": {"$lte": now},
+                "mood_refresh_emotion": {"$exists": True},
+                "$or": [
+                    {"mood_refresh_lease": {"$exists": False}},
+                    {"mood_refresh_lease": {"$lt": now}},
+                ],
+            },
+            {"$set": {"mood_refresh_lease": now + self.lease}},
+            projection={"spotify_id": 1, "mood_refresh_emotion": 1},
+            sort=[("mood_refresh_at", 1)],
+        )
+
+    def _finish(self, user_id, emotion):
+        now = datetime.utcnow()
+        done = self.collection.update_one(
+            {"spotify_id": user_id, "mood_refresh_emotion": emotion},
+            {
+                "$set": {"mood_refreshed_at": now},
+                "$unset": {"mood_refresh_emotion": "", "mood_refresh_at": "", "mood_refresh_lease": ""},
+            }
+        )
+        if not done.modified_count:
+            # The mood changed again meanwhile; that refresh waits out min_interval
+            self.collection.update_one(
+                {"spotify_id": user_id, "mood_refresh_emotion": {"$exists": True}},
+                {
+                    "$set": {"mood_refreshed_at": now, "mood_refresh_at": now + self.min_interval},
+                    "$unset": {"mood_refresh_lease": ""},
+                }
+            )
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"❌ Couldn't look for playlist refreshes: {e}")
+                job = None
+            if job is None:
+                time.sleep(self.poll_interval)
+                continue
+
+            user_id, emotion = job["spotify_id"], job["mood_refresh_emotion"]
+            try:
+                print(f"🎚️ Refreshing mood playlist for {user_id}: {emotion}")
+                with spotify_priority(BACKGROUND):
+                    self.refresh(user_id, emotion)
+                outcome = "refreshed"
+            except Exception as e:
+                print(f"❌ Playlist refresh failed for {user_id}: {e}")
+                traceback.print_exc()
+                outcome = "failed"
+            with self._lock:
+                self._stats[outcome] += 1
+
+            try:
+                self._finish(user_id, emotion)
+            except Exception as e:
+                # The lease expires and another worker picks it up
+                print(f"❌ Couldn't record playlist refresh for {user_id}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "pending": self._pending.qsize()}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_refresh_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = PlaylistRefreshScheduler(
+                    refresh_mood_playlist,
+                    users_collection,
+                    debounce=MOOD_CHANGE_DEBOUNCE,
+                    concurrency=PLAYLIST_REFRESH_CONCURRENCY,
+                    min_interval=PLAYLIST_REFRESH_MIN_INTERVAL,
+                    poll_interval=PLAYLIST_REFRESH_POLL,
+                    lease=PLAYLIST_REFRESH_LEASE,
+                    queue_size=MOOD_WATCH_QUEUE,
+                )
+    return _scheduler
+
+
+def watch_moods(records):
+    """Let the background playlist updater see new mood samples (if AUTO_PLAYLIST_UPDATES)"""
+    if AUTO_PLAYLIST_UPDATES and records:
+        get_refresh_scheduler().submit(records)
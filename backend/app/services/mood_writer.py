@@ -0,0 +1,262 @@
+import atexit
+import os
+import threading
+import time
+import traceback
+from collections import deque
+
+from pymongo.errors import BulkWriteError
+
+from db import moods_collection
+from app.services.mood_rollups import apply_rollups
+
+# "buffered" queues mood records and bulk-inserts them from a background
+# thread; "direct" writes them on the request thread like before
+MOOD_WRITE_MODE = os.getenv("MOOD_WRITE_MODE", "buffered")
+
+# Flush when this many records are queued...
+MOOD_FLUSH_SIZE = int(os.getenv("MOOD_FLUSH_SIZE", 500))
+# ...or when the oldest queued record is this many seconds old
+MOOD_FLUSH_INTERVAL = float(os.getenv("MOOD_FLUSH_INTERVAL", 2.0))
+# Hard cap on queued records before the backpressure policy kicks in
+MOOD_BUFFER_CAPACITY = int(os.getenv("MOOD_BUFFER_CAPACITY", 20000))
+# "block" waits for room (up to MOOD_BUFFER_BLOCK_TIMEOUT seconds),
+# "drop_oldest" discards the oldest queued records, "reject" fails at once
+MOOD_BUFFER_POLICY = os.getenv("MOOD_BUFFER_POLICY", "block")
+MOOD_BUFFER_BLOCK_TIMEOUT = float(os.getenv("MOOD_BUFFER_BLOCK_TIMEOUT", 1.0))
+
+BUFFER_POLICIES = ("block", "drop_oldest", "reject")
+
+
+class BufferFullError(Exception):
+    """Raised when the write buffer is at capacity and cannot take more records"""
+
+
+def write_moods(records):
+    """Insert mood documents and fold the ones that were stored into the daily rollups"""
+    try:
+        moods_collection.insert_many(records, ordered=False)
+    except BulkWriteError as e:
+        # A duplicate key is a record an earlier attempt inserted before raising
+        # (e.g. a network error on the reply), so it was never rolled up: do it now
+        failed = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != 11000}
+        apply_rollups([record for index, record in enumerate(records) if index not in failed])
+        raise
+    apply_rollups(records)
+
+
+class MoodWriteBuffer:
+    """Bounded in-process write-behind queue for mood records"""
+
+    def __init__(self, writer, flush_size=500, flush_interval=2.0,
+                 capacity=20000, policy="block", block_timeout=1.0):
+        if policy not in BUFFER_POLICIES:
+            raise ValueError(f"Unknown buffer policy: {policy}")
+
+        # Called with each batch; raises like Collection.insert_many(ordered=False)
+        self.writer = writer
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.capacity = capacity
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        # Each entry is (enqueued_at, record)
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+
+        self._stats = {
+            "flushed": 0,
+            "dropped": 0,
+            "rejected": 0,
+            "failed_flushes": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": 0.0,
+        }
+
+    def start(self):
+        """Start the background flusher thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mood-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, records):
+        """Queue records for writing, applying the backpressure policy when full"""
+        with self._lock:
+            if self._closed:
+                raise BufferFullError("Mood writer is shut down")
+
+            overflow = len(self._queue) + len(records) - self.capacity
+            if overflow > 0:
+                if self.policy == "reject":
+                    self._stats["rejected"] += len(records)
+                    raise BufferFullError("Mood buffer is full")
+
+                if self.policy == "drop_oldest":
+                    for _ in range(min(overflow, len(self._queue))):
+                        self._queue.popleft()
+                        self._stats["dropped"] += 1
+                else:
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) + len(records) > self.capacity:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or self._closed:
+                            self._stats["rejected"] += len(records)
+                            raise BufferFullError("Timed out waiting for room in the mood buffer")
+                        self._not_empty.notify()
+                        self._not_full.wait(remaining)
+
+            now = time.monotonic()
+            self._queue.extend((now, record) for record in records)
+
+            if len(self._queue) >= self.flush_size:
+                self._not_empty.notify()
+
+    def flush(self):
+        """Write everything currently queued; returns the number of records written"""
+        written = 0
+        while True:
+            with self._lock:
+                batch = self._take_batch()
+            if not batch:
+                return written
+            if not self._write(batch):
+                return written
+            written += len(batch)
+
+    def close(self):
+        """Stop accepting records, drain the queue and stop the flusher"""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        """Queue depth and flush counters/latency for monitoring"""
+        with self._lock:
+            depth = len(self._queue)
+            oldest_age = time.monotonic() - self._queue[0][0] if self._queue else 0.0
+            return {
+                "policy": self.policy,
+                "capacity": self.capacity,
+                "queue_depth": depth,
+                "oldest_age_s": round(oldest_age, 3),
+                **self._stats,
+            }
+
+    def _take_batch(self):
+        # Caller holds self._lock
+        batch = []
+        while self._queue and len(batch) < self.flush_size:
+            batch.append(self._queue.popleft()[1])
+        if batch:
+            self._not_full.notify_all()
+        return batch
+
+    def _due(self):
+        # Caller holds self._lock
+        if not self._queue:
+            return False
+        if len(self._queue) >= self.flush_size:
+            return True
+        return time.monotonic() - self._queue[0][0] >= self.flush_interval
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed and not self._due():
+                    if self._queue:
+                        wait = self.flush_interval - (time.monotonic() - self._queue[0][0])
+                        self._not_empty.wait(max(wait, 0.01))
+                    else:
+                        self._not_empty.wait(self.flush_interval)
+                if self._closed:
+                    return
+                batch = self._take_batch()
+
+            if batch and not self._write(batch):
+                # Back off before retrying so a down database isn't hammered
+                time.sleep(min(self.flush_interval, 1.0))
+
+    def _requeue(self, records):
+        with self._lock:
+            self._stats["failed_flushes"] += 1
+            now = time.monotonic()
+            self._queue.extendleft((now, record) for record in reversed(records))
+
+    def _write(self, batch):
+        """Insert one batch; on failure the batch is put back at the front of the queue"""
+        with self._flush_lock:
+            started = time.perf_counter()
+            try:
+                self.writer(batch)
+            except BulkWriteError as e:
+                # Duplicate keys mean an earlier attempt already wrote the record;
+                # anything else is retried with the next flush
+                retry = [batch[error["index"]] for error in e.details.get("writeErrors", [])
+                         if error.get("code") != 11000]
+                if retry:
+                    print(f"⚠️ {len(retry)} mood records failed to write, requeueing")
+                    self._requeue(retry)
+                    return False
+            except Exception as e:
+                print(f"❌ Mood flush of {len(batch)} records failed: {e}")
+                traceback.print_exc()
+                self._requeue(batch)
+                return False
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._stats["flushed"] += len(batch)
+                self._stats["last_flush_ms"] = round(elapsed_ms, 2)
+                self._stats["max_flush_ms"] = round(max(self._stats["max_flush_ms"], elapsed_ms), 2)
+            return True
+
+
+_mood_writer = None
+_mood_writer_lock = threading.Lock()
+
+
+def get_mood_writer():
+    """Return the process-wide mood write buffer, starting it on first use"""
+    global _mood_writer
+    if _mood_writer is None:
+        with _mood_writer_lock:
+            if _mood_writer is None:
+                _mood_writer = MoodWriteBuffer(
+                    write_moods,
+                    flush_size=MOOD_FLUSH_SIZE,
+                    flush_interval=MOOD_FLUSH_INTERVAL,
+                    capacity=MOOD_BUFFER_CAPACITY,
+                    policy=MOOD_BUFFER_POLICY,
+                    block_timeout=MOOD_BUFFER_BLOCK_TIMEOUT,
+                ).start()
+                atexit.register(_mood_writer.close)
+    return _mood_writer
+
+
+def save_moods(records):
+    """Persist canonical mood records, buffered or directly depending on MOOD_WRITE_MODE.
+
+    Raises BufferFullError when the buffer cannot take the records.
+    """
+    if MOOD_WRITE_MODE == "direct":
+        write_moods(records)
+    else:
+        get_mood_writer().submit(records)
+
+
+def mood_writer_stats():
+    """Buffer stats, or just the write mode when nothing has been buffered yet"""
+    if MOOD_WRITE_MODE == "direct" or _mood_writer is None:
+        return {"mode": MOOD_WRITE_MODE}
+    return {"mode": MOOD_WRITE_MODE, **_mood_writer.stats()}
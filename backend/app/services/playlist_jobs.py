@@ -0,0 +1,209 @@
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db import playlist_jobs_collection
+
+# Generate jobs run on this many background threads per process
+PLAYLIST_JOB_WORKERS = int(os.getenv("PLAYLIST_JOB_WORKERS", 4))
+# Jobs waiting for a worker before new ones are turned away with 503
+PLAYLIST_JOB_QUEUE_SIZE = int(os.getenv("PLAYLIST_JOB_QUEUE_SIZE", 100))
+# A queued or running job not updated for this long was lost (e.g. a restart)
+PLAYLIST_JOB_TIMEOUT = int(os.getenv("PLAYLIST_JOB_TIMEOUT", 300))
+# Workers touch their queued and running jobs this often, in seconds, so a
+# long one isn't taken for lost; keep it well under PLAYLIST_JOB_TIMEOUT
+PLAYLIST_JOB_HEARTBEAT = float(os.getenv("PLAYLIST_JOB_HEARTBEAT", 30))
+# How long job results, and their idempotency keys, are kept
+PLAYLIST_JOB_TTL = int(os.getenv("PLAYLIST_JOB_TTL", 24 * 3600))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """Raised when every worker is busy and the job queue is at capacity"""
+
+
+def _update_job(job_id, fields, statuses):
+    """Set fields on the job if its status is still one of `statuses`; returns whether it was"""
+    now = datetime.utcnow()
+    updated = playlist_jobs_collection.update_one(
+        {"_id": job_id, "status": {"$in": list(statuses)}},
+        {"$set": {**fields, "updated_at": now, "expires_at": now + timedelta(seconds=PLAYLIST_JOB_TTL)}}
+    )
+    return updated.matched_count > 0
+
+
+class PlaylistJobPool:
+    """
+    Bounded pool of worker threads running jobs recorded in playlist_jobs.
+    Each task is called as task(spotify_id, params) and returns
+    (payload, http_status); a 2xx status marks the job succeeded.
+    Every `heartbeat` seconds the pool touches the jobs it holds, so
+    get_job only reports a job lost once its process stopped doing that.
+    """
+
+    def __init__(self, workers=4, queue_size=100, heartbeat=30):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.heartbeat = heartbeat
+        self._held = set()
+        self._held_lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"playlist-job-{i}", daemon=True).start()
+        threading.Thread(target=self._beat, name="playlist-job-heartbeat", daemon=True).start()
+
+    def submit(self, job_id, task, spotify_id, params):
+        with self._held_lock:
+            self._held.add(job_id)
+        try:
+            self._queue.put_nowait((job_id, task, spotify_id, params))
+        except queue.Full:
+            with self._held_lock:
+                self._held.discard(job_id)
+            raise JobQueueFullError(f"{self._queue.maxsize} playlist jobs already waiting")
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat)
+            with self._held_lock:
+                held = list(self._held)
+            if not held:
+                continue
+            try:
+                playlist_jobs_collection.update_many(
+                    {"_id": {"$in": held}, "status": {"$in": [JOB_QUEUED, JOB_RUNNING]}},
+                    {"$set": {"updated_at": datetime.utcnow()}}
+                )
+            except Exception as e:
+                print(f"❌ Couldn't touch {len(held)} playlist jobs: {e}")
+
+    def _work(self):
+        while True:
+            job_id, task, spotify_id, params = self._queue.get()
+            # Nothing may end this loop: a dead worker would shrink the pool for good
+            try:
+                self._run(job_id, task, spotify_id, params)
+            except Exception as e:
+                print(f"❌ Playlist job {job_id} crashed: {e}")
+                traceback.print_exc()
+                try:
+                    _update_job(job_id, {"status": JOB_FAILED, "http_status": 500, "result": {"error": str(e)}},
+                                (JOB_QUEUED, JOB_RUNNING))
+                except Exception as e:
+                    # Left queued/running; get_job reports it failed once PLAYLIST_JOB_TIMEOUT passes
+                    print(f"❌ Couldn't mark playlist job {job_id} failed: {e}")
+            finally:
+                with self._held_lock:
+                    self._held.discard(job_id)
+
+    def _run(self, job_id, task, spotify_id, params):
+        if not _update_job(job_id, {"status": JOB_RUNNING}, (JOB_QUEUED,)):
+            # Already reported failed (it waited too long); the client may have retried
+            print(f"⚠️ Playlist job {job_id} was given up on before it started, skipping")
+            return
+        payload, http_status = task(spotify_id, params)
+        status = JOB_SUCCEEDED if 200 <= http_status < 300 else JOB_FAILED
+        # A job reported failed meanwhile stays failed; the client was already told
+        finished = {"status": status, "http_status": http_status, "result": payload}
+        if not _update_job(job_id, finished, (JOB_RUNNING,)):
+            print(f"⚠️ Playlist job {job_id} finished after it was given up on, result dropped")
+            return
+        print(f"🧾 Playlist job {job_id} {status} ({http_status})")
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "capacity": self._queue.maxsize}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_job_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PlaylistJobPool(workers=PLAYLIST_JOB_WORKERS, queue_size=PLAYLIST_JOB_QUEUE_SIZE,
+                                        heartbeat=PLAYLIST_JOB_HEARTBEAT)
+    return _pool
+
+
+def submit_job(spotify_id, params, task, idempotency_key=None):
+    """
+    Record a job for the user and queue task(spotify_id, params) on the pool.
+    Returns (job, created). With an idempotency key the user already used,
+    the existing job is returned instead and nothing new runs.
+    Raises JobQueueFullError when the pool cannot take the job.
+    """
+    now = datetime.utcnow()
+    job = {
+        "_id": uuid.uuid4().hex,
+        "u": spotify_id,
+        "status": JOB_QUEUED,
+        "params": params,
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + timedelta(seconds=PLAYLIST_JOB_TTL),
+    }
+    if idempotency_key:
+        job["idempotency_key"] = idempotency_key
+
+    try:
+        playlist_jobs_collection.insert_one(job)
+    except DuplicateKeyError:
+        existing = playlist_jobs_collection.find_one({"u": spotify_id, "idempotency_key": idempotency_key})
+        if existing:
+            return _check_stale(existing), False
+        raise  # expired between the insert and the lookup; let the client retry
+
+    try:
+        get_job_pool().submit(job["_id"], task, spotify_id, params)
+    except JobQueueFullError:
+        # Free the idempotency key so the client's retry can actually run
+        playlist_jobs_collection.delete_one({"_id": job["_id"]})
+        raise
+    return job, True
+
+
+def _check_stale(job):
+    """Mark a queued/running job whose worker stopped touching it as failed"""
+    if job["status"] not in (JOB_QUEUED, JOB_RUNNING):
+        return job
+    if datetime.utcnow() - job["updated_at"] < timedelta(seconds=PLAYLIST_JOB_TIMEOUT):
+        return job
+
+    stale = playlist_jobs_collection.find_one_and_update(
+        {"_id": job["_id"], "status": job["status"], "updated_at": job["updated_at"]},
+        {"$set": {
+            "status": JOB_FAILED,
+            "http_status": 500,
+            "result": {"error": "Job was interrupted, please try again"},
+            "updated_at": datetime.utcnow(),
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+    return stale or playlist_jobs_collection.find_one({"_id": job["_id"]}) or job
+
+
+def get_job(job_id, spotify_id):
+    """The user's job with this ID, or None"""
+    job = playlist_jobs_collection.find_one({"_id": job_id, "u": spotify_id})
+    return _check_stale(job) if job else None
+
+
+def wait_for_job(job, timeout=PLAYLIST_JOB_TIMEOUT, poll_interval=0.25):
+    """The job once it has finished, or as it stands when `timeout` seconds have passed"""
+    deadline = time.monotonic() + timeout
+    while job["status"] in (JOB_QUEUED, JOB_RUNNING) and time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        job = get_job(job["_id"], job["u"]) or job
+    return job
@@ -1,21 +1,250 @@
-import requests
+import time
+from datetime import datetime, timedelta
 
-def get_or_create_playlist(user, spotify_token):
+from db import users_collection, playlists_collection
+from app.services.spotify_client import spotify
+
+# Spotify accepts at most this many URIs per add/remove call
+PLAYLIST_URI_BATCH = 100
+
+MOOD_PLAYLIST_NAME = "MoodBeats 🎭"
+
+# A worker creating a user's playlist holds this claim; a crashed one's expires
+PLAYLIST_CREATE_CLAIM = timedelta(seconds=30)
+# How long another caller waits for that creation to finish
+PLAYLIST_CREATE_WAIT = 10
+
+
+def record_playlist(spotify_id, playlist_id, name, mood, track_count, mode):
+    """Log a generated playlist (the dashboard counts these per day)"""
+    playlists_collection.insert_one({
+        "spotify_id": spotify_id,
+        "playlist_id": playlist_id,
+        "name": name,
+        "mood": mood,
+        "tracks": track_count,
+        "mode": mode,
+        "created_at": datetime.utcnow(),
+    })
+
+
+def get_or_create_playlist(user, spotify_token=None):
+    """
+    The user's MoodBeats playlist id, creating it on Spotify if needed.
+    Concurrent callers (double clicks, several workers) create at most one:
+    the first claims the user document, the others wait for its result.
+    """
     if "mood_playlist_id" in user:
         return user["mood_playlist_id"]
 
-    res = requests.post(
-        "https://api.spotify.com/v1/users/{}/playlists".format(user["spotify_id"]),
-        headers={
-            "Authorization": f"Bearer {spotify_token}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "name": "MoodBeats 🎭",
-            "description": "Updates in real time with your mood",
-            "public": False,
-        },
-    )
+    spotify_id = user["spotify_id"]
+    deadline = time.monotonic() + PLAYLIST_CREATE_WAIT
+    while True:
+        now = datetime.utcnow()
+        claimed = users_collection.find_one_and_update(
+            {
+                "spotify_id": spotify_id,
+                "mood_playlist_id": {"$exists": False},
+                "$or": [
+                    {"mood_playlist_creating": {"$exists": False}},
+                    {"mood_playlist_creating": {"$lt": now - PLAYLIST_CREATE_CLAIM}},
+                ],
+            },
+            {"$set": {"mood_playlist_creating": now}},
+            projection={"_id": 1},
+        )
+        if claimed:
+            break
+
+        current = users_collection.find_one({"spotify_id": spotify_id}, {"mood_playlist_id": 1})
+        if current and current.get("mood_playlist_id"):
+            user["mood_playlist_id"] = current["mood_playlist_id"]
+            return current["mood_playlist_id"]
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Mood playlist for {spotify_id} is still being created")
+        time.sleep(0.2)
 
-    playlist = res.json()
+    try:
+        res = spotify.post(
+            f"/users/{spotify_id}/playlists",
+            user_id=spotify_id,
+            json={
+                "name": MOOD_PLAYLIST_NAME,
+                "description": "Updates in real time with your mood",
+                "public": False,
+            },
+        )
+        res.raise_for_status()
+        playlist = res.json()
+    except Exception:
+        users_collection.update_one({"spotify_id": spotify_id}, {"$unset": {"mood_playlist_creating": ""}})
+        raise
+
+    # Remember it, so every later update goes to the same playlist
+    users_collection.update_one(
+        {"spotify_id": spotify_id},
+        {
+            "$set": {
+                "mood_playlist_id": playlist["id"],
+                "mood_playlist_snapshot_id": playlist.get("snapshot_id"),
+                "mood_playlist_uris": [],
+            },
+            "$unset": {"mood_playlist_creating": ""},
+        }
+    )
+    user["mood_playlist_id"] = playlist["id"]
+    user["mood_playlist_snapshot_id"] = playlist.get("snapshot_id")
+    user["mood_playlist_uris"] = []
     return playlist["id"]
+
+
+def get_playlist_snapshot(spotify_id, playlist_id):
+    """The playlist's current snapshot_id, or None if it no longer exists"""
+    res = spotify.get(f"/playlists/{playlist_id}", user_id=spotify_id, params={"fields": "snapshot_id"})
+    if res.status_code == 404:
+        return None
+    res.raise_for_status()
+    return res.json()["snapshot_id"]
+
+
+def get_playlist_track_uris(spotify_id, playlist_id):
+    """Every track URI currently in the playlist, following pagination"""
+    uris = []
+    url = f"/playlists/{playlist_id}/tracks"
+    params = {"fields": "items(track(uri)),next", "limit": 100}
+    while url:
+        res = spotify.get(url, user_id=spotify_id, params=params)
+        res.raise_for_status()
+        page = res.json()
+        uris.extend(item["track"]["uri"] for item in page.get("items", []) if item.get("track"))
+        url = page.get("next")
+        params = None  # the next URL already carries them
+    return uris
+
+
+def plan_moves(current, desired):
+    """
+    Single-track reorder moves, as (range_start, insert_before), that turn
+    `current` into `desired` (the same distinct items in another order).
+    """
+    current = list(current)
+    moves = []
+    for position, uri in enumerate(desired):
+        if current[position] != uri:
+            found = current.index(uri, position)
+            moves.append((found, position))
+            current.insert(position, current.pop(found))
+    return moves
+
+
+def batches(count):
+    """Spotify calls needed to send `count` URIs"""
+    return -(-count // PLAYLIST_URI_BATCH)
+
+
+def replace_playlist(spotify_id, playlist_id, uris):
+    """Replace the playlist's tracks with `uris`, in order; returns the new snapshot_id"""
+    res = spotify.put(f"/playlists/{playlist_id}/tracks", user_id=spotify_id,
+                      json={"uris": uris[:PLAYLIST_URI_BATCH]})
+    res.raise_for_status()
+    snapshot_id = res.json()["snapshot_id"]
+    for start in range(PLAYLIST_URI_BATCH, len(uris), PLAYLIST_URI_BATCH):
+        res = spotify.post(f"/playlists/{playlist_id}/tracks", user_id=spotify_id,
+                           json={"uris": uris[start:start + PLAYLIST_URI_BATCH]})
+        res.raise_for_status()
+        snapshot_id = res.json()["snapshot_id"]
+    return snapshot_id
+
+
+def sync_playlist(user, desired_uris):
+    """
+    Make the user's single MoodBeats playlist contain exactly `desired_uris`,
+    in that order: only the removals and additions needed are sent (in
+    batches of 100), then tracks are moved into rank order. When that takes
+    more calls than rewriting the list, the list is replaced instead.
+    Returns {"playlist_id", "snapshot_id", "added", "removed"}.
+    """
+    spotify_id = user["spotify_id"]
+    playlist_id = get_or_create_playlist(user)
+
+    snapshot_id = get_playlist_snapshot(spotify_id, playlist_id)
+    if snapshot_id is None:
+        # The user deleted it on Spotify; start a fresh one
+        print(f"⚠️ Mood playlist {playlist_id} is gone, creating a new one")
+        # Only if nobody has replaced it already
+        users_collection.update_one(
+            {"spotify_id": spotify_id, "mood_playlist_id": playlist_id},
+            {"$unset": {"mood_playlist_id": ""}}
+        )
+        user.pop("mood_playlist_id", None)
+        playlist_id = get_or_create_playlist(user)
+        snapshot_id = user["mood_playlist_snapshot_id"]
+        current_uris = []
+    elif snapshot_id == user.get("mood_playlist_snapshot_id") and "mood_playlist_uris" in user:
+        # Unchanged since our last sync, so our copy of the track list is current
+        current_uris = user["mood_playlist_uris"]
+    else:
+        current_uris = get_playlist_track_uris(spotify_id, playlist_id)
+
+    desired_uris = list(dict.fromkeys(desired_uris))
+    desired_set = set(desired_uris)
+    current_set = set(current_uris)
+    to_remove = [uri for uri in dict.fromkeys(current_uris) if uri not in desired_set]
+    to_add = [uri for uri in desired_uris if uri not in current_set]
+
+    retained = [uri for uri in current_uris if uri in desired_set]
+    diffed = retained + to_add
+    if len(set(retained)) == len(retained):
+        moves = plan_moves(diffed, desired_uris)
+        diff_calls = batches(len(to_remove)) + batches(len(to_add)) + len(moves)
+    else:
+        # Duplicates of a kept track can only be cleaned up by a rewrite
+        moves, diff_calls = None, None
+    if diff_calls is None or diff_calls > batches(len(desired_uris)):
+        snapshot_id = replace_playlist(spotify_id, playlist_id, desired_uris)
+        return _synced(user, playlist_id, snapshot_id, desired_uris, len(to_add), len(to_remove))
+
+    for start in range(0, len(to_remove), PLAYLIST_URI_BATCH):
+        batch = to_remove[start:start + PLAYLIST_URI_BATCH]
+        res = spotify.delete(
+            f"/playlists/{playlist_id}/tracks",
+            user_id=spotify_id,
+            json={"tracks": [{"uri": uri} for uri in batch], "snapshot_id": snapshot_id}
+        )
+        res.raise_for_status()
+        snapshot_id = res.json()["snapshot_id"]
+
+    for start in range(0, len(to_add), PLAYLIST_URI_BATCH):
+        batch = to_add[start:start + PLAYLIST_URI_BATCH]
+        res = spotify.post(f"/playlists/{playlist_id}/tracks", user_id=spotify_id, json={"uris": batch})
+        res.raise_for_status()
+        snapshot_id = res.json()["snapshot_id"]
+
+    for range_start, insert_before in moves:
+        res = spotify.put(
+            f"/playlists/{playlist_id}/tracks",
+            user_id=spotify_id,
+            json={"range_start": range_start, "insert_before": insert_before,
+                  "range_length": 1, "snapshot_id": snapshot_id}
+        )
+        res.raise_for_status()
+        snapshot_id = res.json()["snapshot_id"]
+
+    return _synced(user, playlist_id, snapshot_id, desired_uris, len(to_add), len(to_remove))
+
+
+def _synced(user, playlist_id, snapshot_id, final_uris, added, removed):
+    users_collection.update_one(
+        {"spotify_id": user["spotify_id"]},
+        {"$set": {"mood_playlist_snapshot_id": snapshot_id, "mood_playlist_uris": final_uris}}
+    )
+    user["mood_playlist_snapshot_id"] = snapshot_id
+    user["mood_playlist_uris"] = final_uris
+
+    print(f"🔁 Synced mood playlist {playlist_id}: +{added} / -{removed}")
+    return {
+        "playlist_id": playlist_id,
+        "snapshot_id": snapshot_id,
+        "added": added,
+        "removed": removed,
+    }
@@ -1,14 +1,14 @@
-import requests
+from app.services.spotify_client import spotify
+from app.services.playlist_service import PLAYLIST_URI_BATCH
 
 def add_tracks(playlist_id, tracks, spotify_token):
     if not tracks:
         return
 
-    requests.post(
-        f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
-        headers={
-            "Authorization": f"Bearer {spotify_token}",
-            "Content-Type": "application/json",
-        },
-        json={"uris": tracks},
-    )
+    # Spotify takes at most 100 URIs per call
+    for start in range(0, len(tracks), PLAYLIST_URI_BATCH):
+        spotify.post(
+            f"/playlists/{playlist_id}/tracks",
+            access_token=spotify_token,
+            json={"uris": tracks[start:start + PLAYLIST_URI_BATCH]},
+        )
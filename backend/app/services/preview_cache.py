@@ -0,0 +1,33 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from db import previews_collection
+
+# How long a preview can be turned into a playlist without recomputing it
+PREVIEW_TTL = int(os.getenv("PREVIEW_TTL", 900))
+
+
+def save_preview(spotify_id, dominant_mood, mood_analysis, days, track_uris):
+    """Remember a preview's resolved tracks and mood analysis; returns its preview ID"""
+    preview_id = uuid.uuid4().hex
+    previews_collection.insert_one({
+        "_id": preview_id,
+        "u": spotify_id,
+        "dominant_mood": dominant_mood,
+        "mood_analysis": mood_analysis,
+        "days": days,
+        "track_uris": track_uris,
+        "expires_at": datetime.utcnow() + timedelta(seconds=PREVIEW_TTL),
+    })
+    return preview_id
+
+
+def load_preview(preview_id, spotify_id):
+    """The user's unexpired preview with this ID, or None"""
+    # The TTL monitor only runs once a minute, so check expiry here too
+    return previews_collection.find_one({
+        "_id": preview_id,
+        "u": spotify_id,
+        "expires_at": {"$gt": datetime.utcnow()},
+    })
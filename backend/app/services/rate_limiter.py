@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+# App-wide Spotify calls per second (0 turns the limiter off) and burst size
+SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", 10))
+SPOTIFY_RATE_BURST = float(os.getenv("SPOTIFY_RATE_BURST", 20))
+# Per-user calls per second and burst size, so one user can't use up the app's budget
+SPOTIFY_USER_RATE_LIMIT = float(os.getenv("SPOTIFY_USER_RATE_LIMIT", 3))
+SPOTIFY_USER_RATE_BURST = float(os.getenv("SPOTIFY_USER_RATE_BURST", 10))
+# Share of the app-wide burst only interactive calls may use
+SPOTIFY_BACKGROUND_RESERVE = float(os.getenv("SPOTIFY_BACKGROUND_RESERVE", 0.25))
+# Longest a call waits for budget before failing, in seconds
+SPOTIFY_RATE_MAX_WAIT = float(os.getenv("SPOTIFY_RATE_MAX_WAIT", 5))
+SPOTIFY_BACKGROUND_MAX_WAIT = float(os.getenv("SPOTIFY_BACKGROUND_MAX_WAIT", 60))
+# Keep the buckets in this file (e.g. under /dev/shm) so every gunicorn worker
+# on the host shares one budget; unset keeps them per process
+SPOTIFY_RATE_LIMIT_FILE = os.getenv("SPOTIFY_RATE_LIMIT_FILE")
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+GLOBAL_BUCKET = "*"
+PAUSED_UNTIL = "paused_until"
+# Prune full (idle) user buckets once there are more than this many
+MAX_IDLE_BUCKETS = 1000
+
+
+class SpotifyRateLimited(requests.RequestException):
+    """Raised when a Spotify call can't get rate-limit budget within its max wait"""
+
+
+_context = threading.local()
+
+
+@contextmanager
+def spotify_priority(priority):
+    """Make Spotify calls on this thread use `priority` (INTERACTIVE or BACKGROUND)"""
+    previous = getattr(_context, "priority", None)
+    _context.priority = priority
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+
+def current_priority():
+    return getattr(_context, "priority", None) or INTERACTIVE
+
+
+class LocalBucketStore:
+    """Bucket state for this process only"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    @contextmanager
+    def locked(self):
+        with self._lock:
+            yield self._buckets
+
+
+class FileBucketStore:
+    """Bucket state in a small JSON file under flock, shared by every process on the host"""
+
+    def __init__(self, path):
+        import fcntl  # POSIX only, so only needed when a shared file is configured
+
+        self._fcntl = fcntl
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            with os.fdopen(fd, "r+") as f:
+                self._fcntl.flock(f, self._fcntl.LOCK_EX)
+                try:
+                    try:
+                        buckets = json.loads(f.read() or "{}")
+                    except ValueError:
+                        buckets = {}
+                    yield buckets
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(buckets))
+                    f.flush()
+                finally:
+                    self._fcntl.flock(f, self._fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """
+    Token buckets for Spotify calls: one app-wide, one per user. A call takes
+    a token from each bucket it applies to, waiting for refill if needed.
+    Background calls leave `background_reserve` of the app-wide burst
+    untouched, so interactive calls still get through while they queue.
+    """
+
+    def __init__(self, rate, burst, user_rate, user_burst, background_reserve=0.25,
+                 max_wait=5, background_max_wait=60, store=None):
+        self.rate = rate
+        self.burst = burst
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.background_reserve = background_reserve
+        self.max_wait = {INTERACTIVE: max_wait, BACKGROUND: background_max_wait}
+        self.store = store or LocalBucketStore()
+
+    def acquire(self, user_id=None, priority=None, deadline=None):
+        """Block until the call may go out; raises SpotifyRateLimited after the max wait.
+
+        With `deadline` (a time.monotonic() value) it gives up as soon as the
+        call can't go out before then.
+        """
+        if self.rate <= 0:
+            return
+
+        priority = priority or current_priority()
+        max_deadline = time.monotonic() + self.max_wait[priority]
+        deadline = max_deadline if deadline is None else min(deadline, max_deadline)
+        while True:
+            with self.store.locked() as buckets:
+                wait = self._take(buckets, user_id, priority, time.time())
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise SpotifyRateLimited(f"No Spotify rate budget for a {priority} call within {self.max_wait[priority]}s")
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold every call for `seconds`, e.g. when Spotify answers 429 with Retry-After"""
+        if self.rate <= 0:
+            return
+        with self.store.locked() as buckets:
+            buckets[PAUSED_UNTIL] = max(buckets.get(PAUSED_UNTIL, 0), time.time() + seconds)
+
+    def _take(self, buckets, user_id, priority, now):
+        """Take a token from each applicable bucket, or return how long to wait first"""
+        limits = [(GLOBAL_BUCKET, self.rate, self.burst,
+                   self.burst * self.background_reserve if priority == BACKGROUND else 0)]
+        if user_id and self.user_rate > 0:
+            limits.append((f"u:{user_id}", self.user_rate, self.user_burst, 0))
+
+        wait = buckets.get(PAUSED_UNTIL, 0) - now
+        levels = []
+        for key, rate, burst, reserve in limits:
+            tokens, updated = buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0, now - updated) * rate)
+            levels.append((key, tokens))
+            wait = max(wait, (reserve + 1 - tokens) / rate)
+
+        if wait > 0:
+            return wait
+
+        for key, tokens in levels:
+            buckets[key] = (tokens - 1, now)
+        if len(buckets) > MAX_IDLE_BUCKETS:
+            self._prune(buckets, now)
+        return 0
+
+    def _prune(self, buckets, now):
+        # A bucket that has refilled completely is the same as no bucket
+        for key, value in list(buckets.items()):
+            if key.startswith("u:") and value[0] + (now - value[1]) * self.user_rate >= self.user_burst:
+                del buckets[key]
+
+
+rate_limiter = RateLimiter(
+    rate=SPOTIFY_RATE_LIMIT,
+    burst=SPOTIFY_RATE_BURST,
+    user_rate=SPOTIFY_USER_RATE_LIMIT,
+    user_burst=SPOTIFY_USER_RATE_BURST,
+    background_reserve=SPOTIFY_BACKGROUND_RESERVE,
+    max_wait=SPOTIFY_RATE_MAX_WAIT,
+    background_max_wait=SPOTIFY_BACKGROUND_MAX_WAIT,
+    store=FileBucketStore(SPOTIFY_RATE_LIMIT_FILE) if SPOTIFY_RATE_LIMIT_FILE else None,
+)
@@ -0,0 +1,40 @@
+import hashlib
+from datetime import datetime
+
+from db import recommendation_cache_collection
+from app.services.single_flight import freeze
+
+
+def _cache_id(spotify_id, mood_params):
+    digest = hashlib.sha1(repr(freeze(mood_params)).encode("utf-8")).hexdigest()[:16]
+    return f"{spotify_id}:{digest}"
+
+
+def _slim(track):
+    """Just the track fields previews and playlists use"""
+    album = track.get("album") or {}
+    return {
+        "id": track.get("id"),
+        "uri": track["uri"],
+        "name": track.get("name"),
+        "artists": [{"name": artist.get("name")} for artist in track.get("artists", [])],
+        "album": {"name": album.get("name", ""), "images": album.get("images", [])[:1]},
+        "preview_url": track.get("preview_url"),
+    }
+
+
+def save_last_good(spotify_id, mood_params, tracks):
+    """Remember the user's latest successful recommendations for this mood"""
+    recommendation_cache_collection.update_one(
+        {"_id": _cache_id(spotify_id, mood_params)},
+        {"$set": {"tracks": [_slim(track) for track in tracks], "fetched_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def load_last_good(spotify_id, mood_params, limit):
+    """The user's last good recommendations for this mood: {"tracks", "fetched_at"}, or None"""
+    entry = recommendation_cache_collection.find_one({"_id": _cache_id(spotify_id, mood_params)})
+    if not entry or not entry.get("tracks"):
+        return None
+    return {"tracks": entry["tracks"][:limit], "fetched_at": entry["fetched_at"]}
@@ -1,19 +1,25 @@
-import requests
+from app.services.spotify_client import spotify
 from app.services.mood_mapper import MOOD_TO_SEED
 
-def get_tracks_for_mood(mood, spotify_token):
+def get_tracks_for_mood(mood, spotify_token=None, limit=5, user_id=None):
+    """Track URIs for the mood; with user_id the client picks (and refreshes on 401) the token"""
     params = MOOD_TO_SEED.get(mood, MOOD_TO_SEED["neutral"])
 
-    res = requests.get(
-        "https://api.spotify.com/v1/recommendations",
-        headers={"Authorization": f"Bearer {spotify_token}"},
+    res = spotify.get(
+        "/recommendations",
+        access_token=spotify_token,
+        user_id=user_id,
         params={
-            "limit": 5,
+            "limit": limit,
             "seed_genres": "pop",
             "target_valence": params["valence"],
             "target_energy": params["energy"],
         },
     )
 
+    if res.status_code != 200:
+        print(f"⚠️ Couldn't get tracks for {mood}: {res.status_code} - {res.text}")
+        return []
+
     tracks = res.json().get("tracks", [])
     return [track["uri"] for track in tracks]
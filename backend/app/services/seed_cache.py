@@ -0,0 +1,130 @@
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from db import spotify_seeds_collection
+from app.services.spotify_client import SpotifyDeadlineExceeded, spotify
+from app.services.rate_limiter import BACKGROUND, spotify_priority
+from app.services.single_flight import single_flight
+
+# A user's top tracks change over weeks; serve cached seeds for this long...
+SEED_CACHE_TTL = int(os.getenv("SEED_CACHE_TTL", 24 * 3600))
+# ...and keep at most this many users in memory (least recently used go first)
+SEED_CACHE_SIZE = int(os.getenv("SEED_CACHE_SIZE", 10000))
+
+# spotify_id -> {"track_ids": [...], "fetched_at": <datetime>}
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_refreshing = set()
+
+
+def _fetch_top_ids(spotify_id, kind, limit, deadline=None):
+    response = spotify.get(
+        f"/me/top/{kind}",
+        user_id=spotify_id,
+        params={"limit": limit, "time_range": "medium_term"},
+        deadline=deadline
+    )
+    if response.status_code != 200:
+        print(f"⚠️ Couldn't get top {kind}: {response.status_code} - {response.text}")
+        return None
+    return [item["id"] for item in response.json().get("items", [])]
+
+
+def fetch_top_track_ids(spotify_id, limit=5, deadline=None):
+    """Ask Spotify for the user's top tracks; returns their IDs, or None on failure"""
+    return _fetch_top_ids(spotify_id, "tracks", limit, deadline)
+
+
+def fetch_top_artist_ids(spotify_id, limit=5, deadline=None):
+    """Ask Spotify for the user's top artists; returns their IDs, or None on failure"""
+    return _fetch_top_ids(spotify_id, "artists", limit, deadline)
+
+
+def _remember(spotify_id, entry):
+    with _cache_lock:
+        _cache[spotify_id] = entry
+        _cache.move_to_end(spotify_id)
+        while len(_cache) > SEED_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _refresh(spotify_id, deadline=None):
+    """Fetch and store fresh seeds; returns the entry, or None if Spotify failed"""
+    track_ids = fetch_top_track_ids(spotify_id, deadline=deadline)
+    if track_ids is None:
+        return None
+
+    # Track seeds alone still work; missing artist seeds wait for the next refresh
+    try:
+        artist_ids = fetch_top_artist_ids(spotify_id, deadline=deadline) or []
+    except SpotifyDeadlineExceeded:
+        artist_ids = []
+
+    entry = {"track_ids": track_ids, "artist_ids": artist_ids, "fetched_at": datetime.utcnow()}
+    spotify_seeds_collection.update_one({"_id": spotify_id}, {"$set": entry}, upsert=True)
+    _remember(spotify_id, entry)
+    return entry
+
+
+def _refresh_in_background(spotify_id):
+    with _cache_lock:
+        if spotify_id in _refreshing:
+            return
+        _refreshing.add(spotify_id)
+
+    def run():
+        try:
+            with spotify_priority(BACKGROUND):
+                _refresh(spotify_id)
+        except Exception as e:
+            print(f"❌ Background seed refresh failed for {spotify_id}: {e}")
+            traceback.print_exc()
+        finally:
+            with _cache_lock:
+                _refreshing.discard(spotify_id)
+
+    threading.Thread(target=run, name=f"seed-refresh-{spotify_id}", daemon=True).start()
+
+
+@single_flight(key=lambda spotify_id, deadline=None: spotify_id)
+def get_seeds(spotify_id, deadline=None):
+    """
+    The user's cached seed entry: {"track_ids", "artist_ids", "fetched_at"}.
+    Served from memory, then Mongo; stale entries are returned immediately
+    and refreshed in the background. Returns None if nothing is cached and
+    Spotify can't be reached. A fetch for a user with nothing cached stops
+    at `deadline` (see SpotifyClient.request).
+    """
+    with _cache_lock:
+        entry = _cache.get(spotify_id)
+        if entry is not None:
+            _cache.move_to_end(spotify_id)
+
+    if entry is None:
+        entry = spotify_seeds_collection.find_one({"_id": spotify_id}, {"_id": 0})
+        if entry is not None:
+            _remember(spotify_id, entry)
+
+    if entry is None:
+        return _refresh(spotify_id, deadline)
+
+    # Entries stored before artist seeds existed are refreshed like stale ones
+    if datetime.utcnow() - entry["fetched_at"] > timedelta(seconds=SEED_CACHE_TTL) \
+            or "artist_ids" not in entry:
+        _refresh_in_background(spotify_id)
+    return entry
+
+
+def get_seed_track_ids(spotify_id, deadline=None):
+    """The user's top track IDs for recommendation seeds, or None if unavailable"""
+    entry = get_seeds(spotify_id, deadline=deadline)
+    return entry["track_ids"] if entry else None
+
+
+def get_seed_artist_ids(spotify_id, deadline=None):
+    """The user's top artist IDs for recommendation seeds, or None if unavailable"""
+    entry = get_seeds(spotify_id, deadline=deadline)
+    return entry.get("artist_ids") if entry else None
@@ -1,12 +1,307 @@
-from transformers import pipeline
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import TimeoutError
+
+from app.services.micro_batcher import BatcherFullError, MicroBatcher
+from app.services.sentiment_cache import cache_key, make_sentiment_cache
+from app.services.inference_pool import InferenceQueueFullError, InferenceTimeoutError, make_inference_pool
+
+# The pipeline's default sentiment model, pinned so restarts don't silently change it
+SENTIMENT_MODEL = os.getenv("SENTIMENT_MODEL", "distilbert/distilbert-base-uncased-finetuned-sst-2-english")
+SENTIMENT_MODEL_REVISION = os.getenv("SENTIMENT_MODEL_REVISION") or None
+# Part of every cached result's key; bump it when the weights change under the same name/revision
+SENTIMENT_MODEL_VERSION = os.getenv(
+    "SENTIMENT_MODEL_VERSION", f"{SENTIMENT_MODEL}@{SENTIMENT_MODEL_REVISION or 'main'}"
+)
+# Requests gathered into one forward pass...
+SENTIMENT_MAX_BATCH = int(os.getenv("SENTIMENT_MAX_BATCH", 32))
+# ...waiting at most this long for company
+SENTIMENT_BATCH_WAIT_MS = float(os.getenv("SENTIMENT_BATCH_WAIT_MS", 5))
+# Texts waiting for a batch before new requests are turned away (503)
+SENTIMENT_QUEUE_SIZE = int(os.getenv("SENTIMENT_QUEUE_SIZE", 256))
+# Longest a caller waits for its result, in seconds
+SENTIMENT_TIMEOUT = float(os.getenv("SENTIMENT_TIMEOUT", 30))
+# Long texts are scored in windows overlapping by this many tokens...
+SENTIMENT_WINDOW_OVERLAP = int(os.getenv("SENTIMENT_WINDOW_OVERLAP", 64))
+# ...and at most this many windows (about 28k tokens by default); the rest is ignored
+SENTIMENT_MAX_WINDOWS = int(os.getenv("SENTIMENT_MAX_WINDOWS", 64))
+
+def run_in_os_thread(fn, *args):
+    """
+    fn(*args) on a real OS thread when gevent has patched threading (there,
+    "threads" are greenlets and a model load or forward pass would stall
+    every request in the worker); a plain call otherwise.
+    """
+    try:
+        from gevent import get_hub, monkey
+    except ImportError:
+        return fn(*args)
+    if not monkey.is_module_patched("threading"):
+        return fn(*args)
+    return get_hub().threadpool.apply(fn, args)
+
+
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
 
 class SentimentAnalyzer:
-    def __init__(self):
-        self.analyzer = pipeline("sentiment-analysis")
+    """
+    Text sentiment via a transformers pipeline, loaded on first use or by
+    warm_up(), never at import. With an InferencePool the model lives in
+    separate processes and this object only batches, caches and forwards;
+    it keeps just the tokenizer, to split long texts without a round trip.
+    Without one, a model loaded in a gunicorn master (see gunicorn.conf.py)
+    is shared copy-on-write by the forked workers.
+    """
+
+    def __init__(self, model=SENTIMENT_MODEL, revision=SENTIMENT_MODEL_REVISION,
+                 version=SENTIMENT_MODEL_VERSION, cache=None, pool=None):
+        self.model = model
+        self.revision = revision
+        self.version = version
+        # Repeated texts are answered from here and never reach the model
+        self.cache = cache
+        self.pool = pool
+        self.analyzer = None
+        # Here even with a pool: splitting texts into windows needs no model
+        self.tokenizer = None
+        # Tokens per window, known once the model is loaded
+        self.window = None
+        self.state = NOT_LOADED
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+        # Fast tokenizers raise "Already borrowed" when used from two threads at once
+        self._tokenizer_lock = threading.Lock()
+        self._batcher = None
+        self._batcher_pid = None
+        self._warm_up_started = False
+
+    def load(self):
+        """Load the pipeline, or start the pool's model processes (once); safe to call from many threads"""
+        with self._lock:
+            if self.state == READY:
+                return
+            self.state = LOADING
+            started = time.monotonic()
+            try:
+                if self.pool:
+                    self.window = run_in_os_thread(self.pool.start)
+                    self.tokenizer = run_in_os_thread(self._load_tokenizer)
+                else:
+                    self.analyzer = run_in_os_thread(self._load_pipeline)
+                    self.tokenizer = self.analyzer.tokenizer
+                    self.window = self.window_size()
+            except Exception as e:
+                self.state = FAILED
+                self.error = str(e)
+                raise
+            self.load_seconds = round(time.monotonic() - started, 2)
+            self.state = READY
+            self.error = None
+            print(f"🧠 Loaded sentiment model {self.model} in {self.load_seconds}s")
+
+    def _load_pipeline(self):
+        # transformers itself takes seconds to import, so it waits until here too
+        from transformers import pipeline
+
+        return pipeline("sentiment-analysis", model=self.model, revision=self.revision)
+
+    def _load_tokenizer(self):
+        from transformers import AutoTokenizer
+
+        return AutoTokenizer.from_pretrained(self.model, revision=self.revision)
+
+    def warm_up(self):
+        """Load the model and run one inference so the first real request isn't slow"""
+        self.load()
+        self.analyze_batch(["warming up"])
+
+    def start_warm_up(self):
+        """warm_up() on a background thread (once per process); returns immediately"""
+        with self._lock:
+            if self._warm_up_started:
+                return
+            self._warm_up_started = True
+
+        def run():
+            try:
+                self.warm_up()
+            except Exception as e:
+                print(f"❌ Sentiment model failed to load: {e}")
+                traceback.print_exc()
+
+        threading.Thread(target=run, name="sentiment-warm-up", daemon=True).start()
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def status(self):
+        return {
+            "state": self.state,
+            "model": self.model,
+            "version": self.version,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+            "cache": self.cache.stats() if self.cache else None,
+            "inference_pool": self.pool.stats() if self.pool else None,
+        }
+
+    @property
+    def batcher(self):
+        # Threads don't survive a fork, so each worker process starts its own
+        if self._batcher is None or self._batcher_pid != os.getpid():
+            with self._lock:
+                if self._batcher is None or self._batcher_pid != os.getpid():
+                    # Concurrent requests share batched forward passes
+                    self._batcher = MicroBatcher(
+                        self.analyze_batch,
+                        max_batch_size=SENTIMENT_MAX_BATCH,
+                        max_wait=SENTIMENT_BATCH_WAIT_MS / 1000,
+                        name="sentiment-batcher",
+                        # One batch in flight per model process
+                        concurrency=self.pool.workers if self.pool else 1,
+                        max_queue=SENTIMENT_QUEUE_SIZE
+                    )
+                    self._batcher_pid = os.getpid()
+        return self._batcher
+
+    def analyze_batch(self, texts):
+        """Run the pipeline once over many texts"""
+        if self.state != READY:
+            self.load()
+        if self.pool:
+            return run_in_os_thread(self.pool.call, "analyze_batch", list(texts))
+        return run_in_os_thread(self._analyze_local, list(texts))
+
+    def _analyze_local(self, texts):
+        import torch
+
+        tokenizer, model = self.analyzer.tokenizer, self.analyzer.model
+        # Only tokenizing needs the lock; forward passes from several batches overlap
+        with self._tokenizer_lock:
+            # Truncate so one over-long text can't fail everyone else's batch
+            inputs = tokenizer(
+                texts, truncation=True, padding=True, return_tensors="pt",
+                max_length=self.window + tokenizer.num_special_tokens_to_add()
+            )
+        with torch.inference_mode():
+            logits = model(**inputs.to(model.device)).logits
+
+        # Same scores the sentiment-analysis pipeline reports
+        if model.config.num_labels == 1 or model.config.problem_type == "multi_label_classification":
+            scores = logits.sigmoid()
+        else:
+            scores = logits.softmax(dim=-1)
+        best = scores.max(dim=-1)
+        return [
+            {"label": model.config.id2label[int(index)], "score": float(score)}
+            for score, index in zip(best.values, best.indices)
+        ]
+
+    def window_size(self):
+        """Tokens of text that fit in one forward pass"""
+        tokenizer = self.tokenizer
+        # model_max_length is a huge sentinel for some tokenizers
+        return min(tokenizer.model_max_length, 512) - tokenizer.num_special_tokens_to_add()
+
+    def split_windows(self, text):
+        """
+        Character spans of overlapping windows that each fit the model,
+        from a single tokenization of the text. Short texts are one span.
+        """
+        if self.state != READY:
+            self.load()
+
+        # Only the tokenizer can tell: byte-level BPE turns one character into several tokens
+        window = self.window
+        tokenizer = self.tokenizer
+        with self._tokenizer_lock:
+            offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        if len(offsets) <= window:
+            return [(0, len(text))]
+
+        stride = max(window - SENTIMENT_WINDOW_OVERLAP, 1)
+        spans = []
+        for start in range(0, len(offsets), stride):
+            end = min(start + window, len(offsets))
+            spans.append((offsets[start][0], offsets[end - 1][1]))
+            if end == len(offsets) or len(spans) == SENTIMENT_MAX_WINDOWS:
+                break
+        return spans
+
+    def analyze_long_text(self, text, spans=None):
+        """
+        Score a text of any length: overlapping windows go through the model
+        in batches, and their scores are combined, weighted by window length.
+        Returns {"label", "score", "segments": [{"start", "end", "label", "score"}], "truncated"}.
+        """
+        spans = spans or self.split_windows(text)
+        results = self.analyze_texts([text[start:end] for start, end in spans])
+
+        weights = [end - start for start, end in spans]
+        labels = {result["label"] for result in results}
+        mass = dict.fromkeys(labels, 0.0)
+        for result, weight in zip(results, weights):
+            mass[result["label"]] += result["score"] * weight
+            # The pipeline only reports the top label; share the rest among the others
+            for other in labels - {result["label"]}:
+                mass[other] += (1 - result["score"]) / (len(labels) - 1) * weight
+        label = max(mass, key=mass.get)
 
-    def analyze_text(self, text):
-        result = self.analyzer(text)[0]
         return {
-        "label": result["label"],
-        "score": result["score"]
-    }
+            "label": label,
+            "score": mass[label] / (sum(weights) or 1),
+            "segments": [
+                {"start": start, "end": end, "label": result["label"], "score": result["score"]}
+                for (start, end), result in zip(spans, results)
+            ],
+            "truncated": spans[-1][1] < len(text.rstrip()),
+        }
+
+    def analyze_text(self, text):
+        return self.analyze_texts([text])[0]
+
+    def analyze_texts(self, texts):
+        """Results for many texts, in order; cached ones skip the model"""
+        keys = [cache_key(text, self.version) for text in texts]
+        results = self.cache.get_many(keys) if self.cache else {}
+
+        # Each distinct uncached text goes to the model once
+        missing = {key: text for key, text in zip(keys, texts) if key not in results}
+        if missing:
+            try:
+                futures = self.batcher.submit_many(list(missing.values()))
+            except BatcherFullError as e:
+                raise InferenceQueueFullError(str(e))
+            # One deadline for the whole request, not one per text
+            deadline = time.monotonic() + SENTIMENT_TIMEOUT
+            try:
+                fresh = {
+                    key: future.result(timeout=max(deadline - time.monotonic(), 0))
+                    for key, future in zip(missing, futures)
+                }
+            except TimeoutError:
+                # Those still queued needn't run; nobody is waiting for them
+                for future in futures:
+                    future.cancel()
+                raise InferenceTimeoutError(f"No inference result within {SENTIMENT_TIMEOUT}s")
+            if self.cache:
+                self.cache.put_many(fresh)
+            results.update(fresh)
+
+        return [results[key] for key in keys]
+
+
+_analyzer = SentimentAnalyzer(cache=make_sentiment_cache(), pool=make_inference_pool(SENTIMENT_TIMEOUT))
+
+
+def get_analyzer():
+    """The process-wide analyzer (not loaded until used or warmed up)"""
+    return _analyzer
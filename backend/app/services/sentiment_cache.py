@@ -0,0 +1,102 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+# Results kept in memory (least recently used go first)
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", 50000))
+# Also keep results in Mongo, so they survive restarts and are shared by workers
+SENTIMENT_CACHE_PERSIST = os.getenv("SENTIMENT_CACHE_PERSIST", "0") == "1"
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Fold the differences that don't change a text's meaning: Unicode forms and whitespace"""
+    return _whitespace.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(text, model_version):
+    """Content address of a text's result under a given model version"""
+    return hashlib.sha256(f"{model_version}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class SentimentCache:
+    """Bounded LRU of analysis results by cache_key, optionally backed by Mongo (persist=True)"""
+
+    def __init__(self, capacity=50000, persist=False):
+        self.capacity = capacity
+        self.persist = persist
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "persisted_hits": 0}
+
+    @property
+    def collection(self):
+        if not self.persist:
+            return None
+        # Imported on use: the analyzer may be created in a gunicorn master,
+        # which must not open Mongo connections before forking
+        from db import sentiment_cache_collection
+
+        return sentiment_cache_collection
+
+    def _remember(self, results):
+        with self._lock:
+            for key, result in results.items():
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def get_many(self, keys):
+        """{key: result} for the keys that are cached"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing and self.persist:
+            stored = {
+                doc["_id"]: doc["result"]
+                for doc in self.collection.find({"_id": {"$in": missing}}, {"result": 1})
+            }
+            self._remember(stored)
+            found.update(stored)
+            with self._lock:
+                self._stats["persisted_hits"] += len(stored)
+
+        with self._lock:
+            self._stats["hits"] += sum(1 for key in keys if key in found)
+            self._stats["misses"] += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, results):
+        self._remember(results)
+        if results and self.persist:
+            now = datetime.utcnow()
+            self.collection.bulk_write([
+                UpdateOne({"_id": key}, {"$set": {"result": result, "created_at": now}}, upsert=True)
+                for key, result in results.items()
+            ], ordered=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else None,
+            }
+
+
+def make_sentiment_cache():
+    return SentimentCache(SENTIMENT_CACHE_SIZE, persist=SENTIMENT_CACHE_PERSIST)
@@ -0,0 +1,230 @@
+import os
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.rate_limiter import rate_limiter, SpotifyRateLimited
+from app.services.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, OPEN
+)
+
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+SPOTIFY_ACCOUNTS_URL = "https://accounts.spotify.com"
+
+# (connect, read) timeouts in seconds for every Spotify call
+SPOTIFY_CONNECT_TIMEOUT = float(os.getenv("SPOTIFY_CONNECT_TIMEOUT", 3.05))
+SPOTIFY_READ_TIMEOUT = float(os.getenv("SPOTIFY_READ_TIMEOUT", 10))
+# Retries after the first attempt, for 429s, 5xx and connection failures
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", 3))
+# Longest we'll honour a Retry-After (or back off) inside a request, in seconds
+SPOTIFY_MAX_RETRY_WAIT = float(os.getenv("SPOTIFY_MAX_RETRY_WAIT", 10))
+# Keep-alive connections kept per host
+SPOTIFY_POOL_SIZE = int(os.getenv("SPOTIFY_POOL_SIZE", 32))
+
+RETRY_STATUSES = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE", "HEAD", "OPTIONS"}
+
+# Endpoint families with their own circuit breaker; other endpoints have none
+CIRCUIT_FAMILIES = ("recommendations", "search", "playlists", "token")
+
+
+class SpotifyDeadlineExceeded(requests.Timeout):
+    """Raised when a call runs out of the time its caller gave it (see SpotifyClient.request)"""
+
+
+def _expired(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _fits(deadline, seconds):
+    """Whether waiting `seconds` still leaves time before `deadline` (a time.monotonic() value)"""
+    return deadline is None or time.monotonic() + seconds < deadline
+
+
+def endpoint_family(url):
+    """The circuit-breaker family a Spotify URL belongs to, or None"""
+    if url.startswith(SPOTIFY_ACCOUNTS_URL):
+        return "token" if url.startswith(SPOTIFY_ACCOUNTS_URL + "/api/token") else None
+    path = url[len(SPOTIFY_API_URL):] if url.startswith(SPOTIFY_API_URL) else url
+    if path.startswith("/recommendations"):
+        return "recommendations"
+    if path.startswith("/search"):
+        return "search"
+    if "/playlists" in path:
+        return "playlists"
+    return None
+
+
+class SpotifyClient:
+    """Pooled keep-alive HTTP client for the Spotify Web and Accounts APIs.
+
+    Returns plain `requests.Response` objects, so callers keep checking
+    status codes as before. Adds per-call timeouts, bounded retries with
+    jittered exponential backoff, and Retry-After handling for 429s.
+    Every attempt first takes budget from the rate limiter, and each endpoint
+    family fails fast (CircuitOpenError) while its circuit breaker is open.
+    """
+
+    def __init__(self, timeout=(3.05, 10), max_retries=3, max_retry_wait=10,
+                 backoff=0.5, pool_size=32, limiter=None, breakers=None):
+        self.timeout = timeout
+        self.limiter = limiter
+        self.breakers = breakers or {}
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self.backoff = backoff
+        # One shared session so every thread reuses the same keep-alive pool;
+        # Werkzeug spawns a thread per request, so per-thread sessions would
+        # reconnect every time
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, access_token=None, user_id=None, priority=None, **kwargs):
+        """Send a request, retrying transient failures; raises requests.RequestException when out of retries.
+
+        With `user_id` the user's cached access token is used, the call counts
+        against the user's rate bucket, and a 401 triggers one token refresh
+        and a single retry. `priority` overrides the thread's rate-limit
+        priority (see rate_limiter.spotify_priority). With `deadline` (a
+        time.monotonic() value) timeouts, retries and rate-limit waits all
+        fit before it; SpotifyDeadlineExceeded is raised once it has passed.
+        """
+        if user_id is None:
+            return self._send(method, url, access_token, priority=priority, **kwargs)
+
+        from app.services.spotify_token import get_access_token
+
+        access_token = get_access_token(user_id)
+        response = self._send(method, url, access_token, user_id=user_id, priority=priority, **kwargs)
+        if response.status_code == 401 and access_token:
+            print(f"🔑 Spotify rejected the token for {user_id}, refreshing and retrying")
+            fresh_token = get_access_token(user_id, rejected_token=access_token)
+            if fresh_token and fresh_token != access_token:
+                response = self._send(method, url, fresh_token, user_id=user_id, priority=priority, **kwargs)
+        return response
+
+    def circuit_open(self, family):
+        """Whether calls to the endpoint family are currently failing fast"""
+        breaker = self.breakers.get(family)
+        return breaker is not None and breaker.state == OPEN
+
+    def _send(self, method, url, access_token=None, user_id=None, priority=None, **kwargs):
+        if url.startswith("/"):
+            url = SPOTIFY_API_URL + url
+
+        breaker = self.breakers.get(endpoint_family(url))
+        if breaker is None:
+            return self._attempt(method, url, access_token, user_id, priority, **kwargs)
+
+        if not breaker.allow():
+            raise CircuitOpenError(f"Spotify {breaker.name} circuit is open")
+        try:
+            response = self._attempt(method, url, access_token, user_id, priority, **kwargs)
+        except (SpotifyRateLimited, SpotifyDeadlineExceeded):
+            # Our own limits, not a sign Spotify is down
+            breaker.record(None)
+            raise
+        except requests.RequestException:
+            breaker.record(False)
+            raise
+        except BaseException:
+            breaker.record(None)
+            raise
+        # Client errors are our fault, not a sign Spotify is down
+        breaker.record(response.status_code < 500 and response.status_code != 429)
+        return response
+
+    def _attempt(self, method, url, access_token=None, user_id=None, priority=None, timeout=None,
+                 deadline=None, **kwargs):
+        method = method.upper()
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+
+        attempt = 0
+        while True:
+            if _expired(deadline):
+                raise SpotifyDeadlineExceeded(f"No time left for Spotify {method} {url}")
+            if self.limiter:
+                self.limiter.acquire(user_id, priority, deadline=deadline)
+            try:
+                response = self.session.request(
+                    method, url, headers=headers, timeout=self._timeout(timeout, deadline), **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if _expired(deadline):
+                    raise SpotifyDeadlineExceeded(f"Spotify {method} {url} ran out of time") from e
+                # After a connect timeout nothing reached Spotify, so retrying is safe for any
+                # method; otherwise the request may have been processed, so only if that's harmless
+                delay = self._backoff(attempt)
+                safe = isinstance(e, requests.exceptions.ConnectTimeout) or method in IDEMPOTENT_METHODS
+                if attempt >= self.max_retries or not safe or not _fits(deadline, delay):
+                    raise
+            else:
+                if response.status_code == 429:
+                    wait = self._retry_after(response)
+                    if self.limiter:
+                        # Hold every other call too, not just this one
+                        self.limiter.pause(wait)
+                    if attempt >= self.max_retries or wait > self.max_retry_wait or not _fits(deadline, wait):
+                        return response
+                    print(f"⏳ Spotify rate limited {method} {url}, retrying in {wait:.1f}s")
+                    time.sleep(wait)
+                    attempt += 1
+                    continue
+                delay = self._backoff(attempt)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries \
+                        or method not in IDEMPOTENT_METHODS or not _fits(deadline, delay):
+                    return response
+
+            time.sleep(delay)
+            attempt += 1
+
+    def _timeout(self, timeout, deadline):
+        """The call's timeout, cut down to what's left before `deadline`"""
+        timeout = timeout or self.timeout
+        if deadline is None:
+            return timeout
+        remaining = max(deadline - time.monotonic(), 0.001)
+        if isinstance(timeout, tuple):
+            return tuple(min(part, remaining) for part in timeout)
+        return min(timeout, remaining)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads retries from concurrent requests apart
+        return random.uniform(0, min(self.max_retry_wait, self.backoff * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        try:
+            return max(float(response.headers.get("Retry-After", 1)), 0) + random.uniform(0, 0.25)
+        except ValueError:
+            return self._backoff(0)
+
+
+spotify = SpotifyClient(
+    timeout=(SPOTIFY_CONNECT_TIMEOUT, SPOTIFY_READ_TIMEOUT),
+    max_retries=SPOTIFY_MAX_RETRIES,
+    max_retry_wait=SPOTIFY_MAX_RETRY_WAIT,
+    pool_size=SPOTIFY_POOL_SIZE,
+    limiter=rate_limiter,
+    breakers={
+        family: CircuitBreaker(family, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+        for family in CIRCUIT_FAMILIES
+    },
+)
@@ -1,19 +1,35 @@
 # app/services/spotify_token.py
-import requests
 import os
+import threading
+from datetime import datetime, timedelta
+
+from db import users_collection
+from app.services.spotify_client import spotify, SPOTIFY_ACCOUNTS_URL
 
 CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 
+# Refresh tokens this many seconds before Spotify says they expire
+TOKEN_REFRESH_MARGIN = int(os.getenv("SPOTIFY_TOKEN_REFRESH_MARGIN", 120))
+
+# spotify_id -> {"access_token": ..., "expires_at": <datetime>}
+_token_cache = {}
+_refresh_locks = {}
+_refresh_locks_guard = threading.Lock()
+
+
 def refresh_spotify_access_token(access_token, refresh_token):
     """
-    Refresh Spotify access token if expired.
-    Returns a new token or the same token if still valid.
+    Refresh a Spotify access token.
+    Returns the new token, or the given one if the refresh failed.
     """
-    # Normally you'd check expiration; for simplicity, always refresh here
-    token_url = "https://accounts.spotify.com/api/token"
-    response = requests.post(
-        token_url,
+    data = _request_refresh(refresh_token)
+    return data.get("access_token", access_token)
+
+
+def _request_refresh(refresh_token):
+    response = spotify.post(
+        f"{SPOTIFY_ACCOUNTS_URL}/api/token",
         data={
             "grant_type": "refresh_token",
             "refresh_token": refresh_token,
@@ -25,5 +41,89 @@ def refresh_spotify_access_token(access_token, refresh_token):
         }
     )
 
-    data = response.json()
-    return data.get("access_token", access_token)
+    if response.status_code != 200:
+        print(f"❌ Spotify token refresh failed: {response.status_code} - {response.text}")
+        return {}
+    return response.json()
+
+
+def store_spotify_tokens(spotify_id, access_token, expires_in, refresh_token=None):
+    """Persist a fresh access token with its expiry and cache it in process"""
+    expires_at = datetime.utcnow() + timedelta(seconds=int(expires_in or 3600))
+    update = {
+        "spotify_access_token": access_token,
+        "spotify_token_expires_at": expires_at,
+    }
+    # Spotify only sometimes rotates the refresh token
+    if refresh_token:
+        update["spotify_refresh_token"] = refresh_token
+
+    users_collection.update_one({"spotify_id": spotify_id}, {"$set": update})
+    _token_cache[spotify_id] = {"access_token": access_token, "expires_at": expires_at}
+
+
+def _fresh(entry):
+    return (
+        entry is not None
+        and entry.get("access_token")
+        and entry.get("expires_at") is not None
+        and entry["expires_at"] - timedelta(seconds=TOKEN_REFRESH_MARGIN) > datetime.utcnow()
+    )
+
+
+def _refresh_lock(spotify_id):
+    with _refresh_locks_guard:
+        lock = _refresh_locks.get(spotify_id)
+        if lock is None:
+            lock = _refresh_locks[spotify_id] = threading.Lock()
+        return lock
+
+
+def get_access_token(spotify_id, rejected_token=None):
+    """
+    Return a usable access token for the user, refreshing it when it is
+    about to expire or when Spotify just rejected `rejected_token`.
+    Only one refresh per user runs at a time; concurrent callers wait for
+    it and reuse its result. Returns None if the user has no token at all.
+    """
+    cached = _token_cache.get(spotify_id)
+    if _fresh(cached) and cached["access_token"] != rejected_token:
+        return cached["access_token"]
+
+    with _refresh_lock(spotify_id):
+        # Another request may have refreshed while we waited for the lock
+        cached = _token_cache.get(spotify_id)
+        if _fresh(cached) and cached["access_token"] != rejected_token:
+            return cached["access_token"]
+
+        user = users_collection.find_one(
+            {"spotify_id": spotify_id},
+            {"spotify_access_token": 1, "spotify_refresh_token": 1, "spotify_token_expires_at": 1}
+        )
+        if not user or not user.get("spotify_access_token"):
+            return None
+
+        stored = {
+            "access_token": user["spotify_access_token"],
+            "expires_at": user.get("spotify_token_expires_at"),
+        }
+        if _fresh(stored) and stored["access_token"] != rejected_token:
+            _token_cache[spotify_id] = stored
+            return stored["access_token"]
+
+        refresh_token = user.get("spotify_refresh_token")
+        if not refresh_token:
+            return stored["access_token"]
+
+        print(f"🔄 Refreshing Spotify token for user {spotify_id}")
+        data = _request_refresh(refresh_token)
+        if not data.get("access_token"):
+            return stored["access_token"]
+
+        store_spotify_tokens(
+            spotify_id,
+            data["access_token"],
+            data.get("expires_in"),
+            data.get("refresh_token")
+        )
+        return data["access_token"]
@@ -0,0 +1,325 @@
+import csv
+import os
+import queue
+import threading
+import traceback
+from datetime import datetime
+
+import numpy as np
+from pymongo import UpdateOne
+
+from db import indexed_tracks_collection
+from app.services.audio_features import get_audio_features
+from app.services.rate_limiter import BACKGROUND, spotify_priority
+
+# Where the imported catalogue is kept between restarts
+TRACK_INDEX_PATH = os.getenv(
+    "TRACK_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "track_index.npz")
+)
+
+# Tempo differs from valence/energy by two orders of magnitude; this many BPM
+# away from target_tempo costs as much as 1.0 of valence or energy
+TEMPO_SCALE = 100.0
+
+# Recommendation batches waiting to be indexed; more are dropped, not queued
+TRACK_AUTOFILL_QUEUE = int(os.getenv("TRACK_AUTOFILL_QUEUE", 100))
+
+METADATA_FIELDS = ("name", "artist", "album", "image")
+FEATURE_COLUMNS = ("valence", "energy", "tempo")
+
+
+class TrackIndex:
+    """
+    In-memory catalogue of tracks and their audio features.
+    Valence, energy and tempo live in contiguous float32 arrays so a mood
+    query is a handful of vectorized operations over the whole catalogue.
+    The arrays keep spare capacity (doubling when full), so appending a few
+    tracks doesn't copy the catalogue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ids = []
+        self.row_by_id = {}
+        self._features = np.empty((0, 2), dtype=np.float32)  # valence, energy
+        self._tempo = np.empty(0, dtype=np.float32)
+        self.metadata = {field: [] for field in METADATA_FIELDS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def features(self):
+        return self._features[:len(self.ids)]
+
+    @property
+    def tempo(self):
+        return self._tempo[:len(self.ids)]
+
+    def _reserve(self, size):
+        # Caller holds self._lock. Readers keep using the old arrays they took.
+        if size <= len(self._tempo):
+            return
+        capacity = max(size, 2 * len(self._tempo), 1024)
+        features = np.empty((capacity, 2), dtype=np.float32)
+        tempo = np.empty(capacity, dtype=np.float32)
+        features[:len(self.ids)] = self.features
+        tempo[:len(self.ids)] = self.tempo
+        self._features, self._tempo = features, tempo
+
+    def add_tracks(self, tracks):
+        """Add or update tracks: dicts with id, valence, energy, tempo and optional metadata.
+
+        A track listed more than once in the batch takes its last values.
+        """
+        tracks = {track["id"]: track for track in tracks}.values()
+        new_ids = []
+        new_features = []
+        new_tempo = []
+        with self._lock:
+            for track in tracks:
+                row = self.row_by_id.get(track["id"])
+                values = (float(track["valence"]), float(track["energy"]))
+                if row is not None:
+                    self._features[row] = values
+                    self._tempo[row] = float(track["tempo"])
+                    for field in METADATA_FIELDS:
+                        if track.get(field):
+                            self.metadata[field][row] = track[field]
+                    continue
+
+                new_ids.append(track["id"])
+                new_features.append(values)
+                new_tempo.append(float(track["tempo"]))
+                for field in METADATA_FIELDS:
+                    self.metadata[field].append(track.get(field))
+
+            if new_ids:
+                start = len(self.ids)
+                self._reserve(start + len(new_ids))
+                # Rows are filled before ids grows, so readers never see them half written
+                self._features[start:start + len(new_ids)] = new_features
+                self._tempo[start:start + len(new_ids)] = new_tempo
+                self.ids.extend(new_ids)
+                self.row_by_id.update((track_id, start + i) for i, track_id in enumerate(new_ids))
+        return len(new_ids)
+
+    def nearest(self, mood_params, k=20, exclude=None):
+        """
+        The k tracks closest to the mood's target valence/energy (and
+        target_tempo, if given) that fall within its min/max tempo bounds.
+        Returns Spotify-shaped track dicts, closest first.
+        """
+        with self._lock:
+            features = self.features
+            tempo = self.tempo
+            ids = self.ids
+            metadata = self.metadata
+        if not len(ids):
+            return []
+
+        target = np.array(
+            [mood_params.get("target_valence", 0.5), mood_params.get("target_energy", 0.5)],
+            dtype=np.float32
+        )
+        distance = np.square(features - target).sum(axis=1)
+        if "target_tempo" in mood_params:
+            distance += np.square((tempo - mood_params["target_tempo"]) / TEMPO_SCALE)
+
+        allowed = np.ones(len(distance), dtype=bool)
+        if "min_tempo" in mood_params:
+            allowed &= tempo >= mood_params["min_tempo"]
+        if "max_tempo" in mood_params:
+            allowed &= tempo <= mood_params["max_tempo"]
+        for track_id in exclude or ():
+            row = self.row_by_id.get(track_id)
+            if row is not None and row < len(allowed):
+                allowed[row] = False
+        distance[~allowed] = np.inf
+
+        candidates = int(allowed.sum())
+        k = min(k, candidates)
+        if k <= 0:
+            return []
+
+        # argpartition is O(n); only the k winners get fully sorted
+        rows = np.argpartition(distance, k - 1)[:k]
+        rows = rows[np.argsort(distance[rows])]
+        return [self._track(int(row), ids, metadata) for row in rows]
+
+    def _track(self, row, ids, metadata):
+        track_id = ids[row]
+        image = metadata["image"][row]
+        return {
+            "id": track_id,
+            "uri": f"spotify:track:{track_id}",
+            "name": metadata["name"][row] or track_id,
+            "artists": [{"name": name} for name in (metadata["artist"][row] or "").split(", ") if name],
+            "album": {
+                "name": metadata["album"][row] or "",
+                "images": [{"url": image}] if image else []
+            },
+            "preview_url": None,
+        }
+
+    def save(self, path=TRACK_INDEX_PATH):
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written aside and renamed, so a crash never leaves half a file
+            temporary = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez_compressed(
+                temporary,
+                ids=np.asarray(self.ids, dtype=object),
+                features=self.features,
+                tempo=self.tempo,
+                **{field: np.asarray(values, dtype=object) for field, values in self.metadata.items()}
+            )
+            os.replace(temporary, path)
+
+    def load(self, path=TRACK_INDEX_PATH):
+        data = np.load(path, allow_pickle=True)
+        with self._lock:
+            self.ids = data["ids"].tolist()
+            self.row_by_id = {track_id: row for row, track_id in enumerate(self.ids)}
+            self._features = np.ascontiguousarray(data["features"], dtype=np.float32)
+            self._tempo = np.ascontiguousarray(data["tempo"], dtype=np.float32)
+            self.metadata = {field: data[field].tolist() for field in METADATA_FIELDS}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_track_index():
+    """The process-wide track index, loaded from TRACK_INDEX_PATH on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = TrackIndex()
+                if os.path.exists(TRACK_INDEX_PATH):
+                    index.load(TRACK_INDEX_PATH)
+                # Plus what autofill added since the file was written
+                batch = []
+                for doc in indexed_tracks_collection.find({}, {"added_at": 0}):
+                    batch.append({"id": doc["_id"], **doc})
+                    if len(batch) >= 10000:
+                        index.add_tracks(batch)
+                        batch = []
+                index.add_tracks(batch)
+                print(f"🎼 Loaded {len(index)} tracks into the local track index")
+                _index = index
+    return _index
+
+
+def index_spotify_tracks(spotify_id, tracks):
+    """
+    Add Spotify track objects (e.g. fresh recommendations) to the index with
+    their audio features, and store them so they survive restarts.
+    """
+    tracks = [track for track in tracks if track.get("id") and track["id"] not in get_track_index().row_by_id]
+    if not tracks:
+        return 0
+
+    # Nobody is waiting on this, so let interactive calls go first
+    with spotify_priority(BACKGROUND):
+        features = get_audio_features(spotify_id, [track["id"] for track in tracks])
+    entries = [
+        {
+            "id": track["id"],
+            "valence": features[track["id"]]["valence"],
+            "energy": features[track["id"]]["energy"],
+            "tempo": features[track["id"]]["tempo"],
+            "name": track.get("name"),
+            "artist": ", ".join(artist["name"] for artist in track.get("artists", [])),
+            "album": track.get("album", {}).get("name"),
+            "image": track["album"]["images"][0]["url"] if track.get("album", {}).get("images") else None,
+        }
+        for track in tracks if features.get(track["id"])
+    ]
+    if not entries:
+        return 0
+
+    now = datetime.utcnow()
+    indexed_tracks_collection.bulk_write([
+        UpdateOne(
+            {"_id": entry["id"]},
+            {"$set": {**{k: v for k, v in entry.items() if k != "id"}, "added_at": now}},
+            upsert=True
+        )
+        for entry in entries
+    ], ordered=False)
+    return get_track_index().add_tracks(entries)
+
+
+_autofill_queue = None
+_autofill_lock = threading.Lock()
+
+
+def _autofill_forever():
+    while True:
+        spotify_id, tracks = _autofill_queue.get()
+        try:
+            index_spotify_tracks(spotify_id, tracks)
+        except Exception as e:
+            print(f"❌ Failed to index recommended tracks: {e}")
+            traceback.print_exc()
+
+
+def queue_autofill(spotify_id, tracks):
+    """Index tracks on the single autofill worker; returns False (and drops them) if it's behind"""
+    global _autofill_queue
+    if _autofill_queue is None:
+        with _autofill_lock:
+            if _autofill_queue is None:
+                _autofill_queue = queue.Queue(maxsize=TRACK_AUTOFILL_QUEUE)
+                threading.Thread(target=_autofill_forever, name="track-autofill", daemon=True).start()
+    try:
+        _autofill_queue.put_nowait((spotify_id, tracks))
+        return True
+    except queue.Full:
+        return False
+
+
+def parse_track_row(row):
+    """A catalogue CSV row as an add_tracks entry, or None if it lacks an id or a feature"""
+    try:
+        track = {"id": (row.get("id") or "").strip()}
+        for column in FEATURE_COLUMNS:
+            track[column] = float(row[column])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not track["id"]:
+        return None
+    for field in METADATA_FIELDS:
+        track[field] = (row.get(field) or "").strip() or None
+    return track
+
+
+def import_tracks_csv(path, batch_size=50000):
+    """
+    Load a catalogue file into the index and save it to TRACK_INDEX_PATH.
+    Expects a header with id, valence, energy, tempo and optionally
+    name, artist, album, image. Rows missing an id or a feature are
+    skipped; returns (imported, skipped).
+    """
+    index = get_track_index()
+    imported = 0
+    skipped = 0
+    batch = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            track = parse_track_row(row)
+            if track is None:
+                skipped += 1
+                continue
+            batch.append(track)
+            if len(batch) >= batch_size:
+                imported += index.add_tracks(batch)
+                batch = []
+    if batch:
+        imported += index.add_tracks(batch)
+
+    index.save(TRACK_INDEX_PATH)
+    return imported, skipped
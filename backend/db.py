@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING
 import os
 from dotenv import load_dotenv
 
@@ -6,10 +6,122 @@ load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 
-client = MongoClient(MONGO_URI)
+# One pool per process; under gevent workers every in-flight request may want a connection
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+
+# connect=False: nothing is opened until the first operation, so a gunicorn
+# master that imports this (preload_app) forks no sockets or monitor threads
+client = MongoClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE, connect=False)
 db = client["moodbeats"]   # database name
 
 # Collections
 users_collection = db["users"]
 playlists_collection = db["playlists"]
 moods_collection = db["moods"]
+mood_rollups_collection = db["mood_rollups"]
+mood_open_runs_collection = db["mood_open_runs"]  # _id is the user; runs still being extended
+spotify_seeds_collection = db["spotify_seeds"]
+previews_collection = db["previews"]
+audio_features_collection = db["audio_features"]  # _id is the Spotify track ID
+indexed_tracks_collection = db["indexed_tracks"]  # _id is the Spotify track ID; autofilled track index entries
+migrations_collection = db["migrations"]
+moods_quarantine_collection = db["moods_quarantine"]  # legacy moods the migration couldn't convert
+playlist_jobs_collection = db["playlist_jobs"]
+recommendation_cache_collection = db["recommendation_cache"]
+sentiment_cache_collection = db["sentiment_cache"]  # _id is the text's cache key
+
+
+# Indexes replaced by later schema changes, dropped by ensure_indexes()
+SUPERSEDED_INDEXES = [
+    (moods_collection, ["user_time_emotion_confidence", "u_t_e_c"]),
+]
+
+
+def ensure_indexes():
+    """Create the indexes the API queries rely on (no-op if they already exist)"""
+    try:
+        # Covers every mood range scan: match on user + time range, project
+        # only emotion/confidence/count, so Mongo never touches the documents
+        moods_collection.create_index(
+            [("u", ASCENDING), ("t", DESCENDING), ("e", ASCENDING), ("c", ASCENDING), ("n", ASCENDING)],
+            name="u_t_e_c_n"
+        )
+
+        # One rollup document per user and day, upserted with $inc at ingest
+        mood_rollups_collection.create_index(
+            [("u", ASCENDING), ("d", ASCENDING)],
+            name="u_d",
+            unique=True
+        )
+
+        # Background playlist refresh workers poll for due refreshes
+        users_collection.create_index(
+            [("mood_refresh_at", ASCENDING)],
+            name="mood_refresh_at",
+            sparse=True
+        )
+
+        # The dashboard counts a user's playlists since midnight
+        playlists_collection.create_index(
+            [("spotify_id", ASCENDING), ("created_at", DESCENDING)],
+            name="spotify_id_created_at"
+        )
+
+        # The run sweeper looks for open runs nothing has arrived for
+        mood_open_runs_collection.create_index(
+            [("seen", ASCENDING)],
+            name="seen"
+        )
+
+        # Cached top-track seeds are refreshed long before this; it only
+        # clears out users who stopped using the app
+        spotify_seeds_collection.create_index(
+            [("fetched_at", ASCENDING)],
+            name="fetched_at_ttl",
+            expireAfterSeconds=30 * 24 * 3600
+        )
+
+        # Previews expire at their own expires_at
+        previews_collection.create_index(
+            [("expires_at", ASCENDING)],
+            name="expires_at_ttl",
+            expireAfterSeconds=0
+        )
+
+        # Finished jobs (and their idempotency keys) expire at their own expires_at
+        playlist_jobs_collection.create_index(
+            [("expires_at", ASCENDING)],
+            name="expires_at_ttl",
+            expireAfterSeconds=0
+        )
+
+        # A retried generate with the same Idempotency-Key finds the first job
+        playlist_jobs_collection.create_index(
+            [("u", ASCENDING), ("idempotency_key", ASCENDING)],
+            name="u_idempotency_key",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}}
+        )
+
+        # Last good recommendations are only served while Spotify is down;
+        # after a week they're too old to be worth it
+        recommendation_cache_collection.create_index(
+            [("fetched_at", ASCENDING)],
+            name="fetched_at_ttl",
+            expireAfterSeconds=7 * 24 * 3600
+        )
+
+        # Cached text sentiment; a month is plenty for repeated prompts
+        sentiment_cache_collection.create_index(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=30 * 24 * 3600
+        )
+
+        for collection, names in SUPERSEDED_INDEXES:
+            existing = collection.index_information()
+            for name in names:
+                if name in existing:
+                    collection.drop_index(name)
+    except Exception as e:
+        print(f"⚠️ Could not create indexes: {e}")
@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# gevent workers patch sockets, so every blocking Spotify (requests) and Mongo
+# (pymongo) call yields to other requests instead of holding a thread; one
+# worker keeps hundreds of generate/preview requests in flight
+worker_class = os.getenv("WORKER_CLASS", "gevent")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Concurrent requests per worker
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 1000))
+
+# Longer than the slowest request (Spotify retries and backoff included)
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+# With in-process inference (INFERENCE_WORKERS=0), SENTIMENT_PRELOAD=1 imports
+# the app in the master (see wsgi.py), which loads the text-emotion model once
+# before workers fork, so they share its weights copy-on-write instead of each
+# loading a copy (the server starts accepting requests only after it loads)
+if os.getenv("SENTIMENT_PRELOAD", "0") == "1" and os.getenv("INFERENCE_WORKERS", "1") == "0":
+    if worker_class == "gevent":
+        # The gevent worker patches after forking; ssl/requests imported by the
+        # preloaded app before that would stay unpatched, so patch first
+        from gevent import monkey
+
+        monkey.patch_all()
+    preload_app = True
+
+    def post_fork(server, worker):
+        # The preloaded app left Mongo alone (see create_app); each worker
+        # opens its own connections from here on
+        from db import ensure_indexes
+
+        ensure_indexes()
+
+# With model processes (INFERENCE_WORKERS>0) the master starts one inference
+# service that every web worker reaches over a unix socket, so the host holds
+# INFERENCE_WORKERS model copies rather than that many per web worker. Only
+# the stdlib is used here; the service loads the model in its own process.
+_inference_service = {"process": None, "stopping": False}
+
+
+def _run_inference_service():
+    # Restart it if it dies; it replaces hung or crashed model processes itself
+    while not _inference_service["stopping"]:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.services.inference_pool"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        _inference_service["process"] = process
+        code = process.wait()
+        if not _inference_service["stopping"]:
+            print(f"⚠️ Inference service exited with code {code}, restarting")
+            time.sleep(1)
+
+
+if int(os.getenv("INFERENCE_WORKERS", "1")) > 0:
+
+    def on_starting(server):
+        # Inherited by the service and by the workers forked after this hook
+        os.environ.setdefault("INFERENCE_ADDRESS", f"/tmp/moodbeats-inference-{os.getpid()}.sock")
+        os.environ["INFERENCE_AUTHKEY"] = secrets.token_hex(16)
+        threading.Thread(target=_run_inference_service, name="inference-service", daemon=True).start()
+
+    def on_exit(server):
+        _inference_service["stopping"] = True
+        process = _inference_service["process"]
+        if process and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# Let every worker on the host draw from one Spotify rate-limit budget
+raw_env = [
+    "SPOTIFY_RATE_LIMIT_FILE=" + os.getenv("SPOTIFY_RATE_LIMIT_FILE", "/tmp/moodbeats-spotify-rate.json"),
+]
@@ -0,0 +1,115 @@
+"""
+Maintenance commands for the MoodBeats backend.
+
+Usage:
+    python manage.py migrate-moods [--batch-size 1000]
+    python manage.py backfill-rollups
+    python manage.py import-tracks catalogue.csv
+"""
+
+import argparse
+
+from datetime import datetime
+
+from pymongo import ReplaceOne, DeleteOne
+
+from db import moods_collection, moods_quarantine_collection, migrations_collection, ensure_indexes
+from app.services.mood_schema import from_legacy
+from app.services.mood_rollups import backfill_rollups
+from app.services.track_index import import_tracks_csv, TRACK_INDEX_PATH
+
+MOODS_MIGRATION_ID = "moods_canonical_v1"
+
+
+def migrate_moods(batch_size=1000):
+    """Rewrite legacy mood documents into the canonical {u, t, e, c} shape.
+
+    Documents are processed in _id order and the last processed _id is
+    checkpointed after every batch, so an interrupted run resumes where it
+    stopped. Documents that cannot be converted are moved, unchanged, to
+    moods_quarantine (with the reason) for manual review; nothing is deleted
+    without being copied there first.
+    """
+    ensure_indexes()
+
+    checkpoint = migrations_collection.find_one({"_id": MOODS_MIGRATION_ID}) or {}
+    last_id = checkpoint.get("last_id")
+    migrated = checkpoint.get("migrated", 0)
+    quarantined = checkpoint.get("quarantined", checkpoint.get("dropped", 0))
+
+    if last_id is not None:
+        print(f"🔁 Resuming mood migration after {last_id} ({migrated} migrated so far)")
+
+    while True:
+        query = {"e": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        batch = list(moods_collection.find(query).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        quarantine = []
+        for doc in batch:
+            try:
+                operations.append(ReplaceOne({"_id": doc["_id"]}, from_legacy(doc)))
+                migrated += 1
+            except (TypeError, ValueError) as e:
+                print(f"⚠️ Quarantining unconvertible mood {doc['_id']}: {e}")
+                quarantine.append(ReplaceOne(
+                    {"_id": doc["_id"]},
+                    {**doc, "quarantine_reason": str(e), "quarantined_at": datetime.utcnow()},
+                    upsert=True
+                ))
+                operations.append(DeleteOne({"_id": doc["_id"]}))
+                quarantined += 1
+
+        # Copied out before they leave moods, so a crash in between loses nothing
+        if quarantine:
+            moods_quarantine_collection.bulk_write(quarantine, ordered=False)
+        moods_collection.bulk_write(operations, ordered=False)
+
+        last_id = batch[-1]["_id"]
+        migrations_collection.update_one(
+            {"_id": MOODS_MIGRATION_ID},
+            {"$set": {"last_id": last_id, "migrated": migrated, "quarantined": quarantined}},
+            upsert=True
+        )
+        print(f"📦 Migrated {migrated} moods ({quarantined} quarantined)")
+
+    migrations_collection.update_one(
+        {"_id": MOODS_MIGRATION_ID},
+        {"$set": {"completed": True}},
+        upsert=True
+    )
+    print(f"✅ Mood migration complete: {migrated} migrated, {quarantined} quarantined in moods_quarantine")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MoodBeats maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate-moods", help="Rewrite legacy mood documents to the canonical schema")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+
+    commands.add_parser("backfill-rollups", help="Rebuild the daily mood rollups from stored moods")
+
+    import_tracks = commands.add_parser("import-tracks", help="Load a track catalogue CSV into the local track index")
+    import_tracks.add_argument("path", help="CSV with id, valence, energy, tempo[, name, artist, album, image]")
+
+    args = parser.parse_args()
+
+    if args.command == "migrate-moods":
+        migrate_moods(args.batch_size)
+    elif args.command == "backfill-rollups":
+        ensure_indexes()
+        if backfill_rollups():
+            print("✅ Mood rollups rebuilt")
+    elif args.command == "import-tracks":
+        imported, skipped = import_tracks_csv(args.path)
+        print(f"✅ Imported {imported} new tracks into {TRACK_INDEX_PATH} ({skipped} incomplete rows skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,11 @@
+# Development server: python run.py (gunicorn uses wsgi.py)
+import os
+
 from app import create_app
-app=create_app()
-if __name__=="__main__":
-    app.run(debug=True)
\ No newline at end of file
+
+# Guarded: model processes started with "spawn" re-import this file as __mp_main__
+if __name__ == "__main__":
+    # The reloader runs this file in a watcher process and again in the server
+    # process it restarts (WERKZEUG_RUN_MAIN); only the server loads the model
+    app = create_app(warm_up=os.environ.get("WERKZEUG_RUN_MAIN") == "true")
+    app.run(debug=True)
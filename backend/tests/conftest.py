@@ -0,0 +1,23 @@
+import os
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI", "mongodb://localhost:27017")
+
+
+@pytest.fixture
+def mongo_db():
+    """A scratch database on the MongoDB at MONGO_TEST_URI, dropped afterwards; skips without a server"""
+    client = MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"No MongoDB at {MONGO_TEST_URI}")
+    db = client["moodbeats_test"]
+    client.drop_database(db)
+    yield db
+    client.drop_database(db)
+    client.close()
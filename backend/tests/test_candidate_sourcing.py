@@ -0,0 +1,123 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import candidate_sourcing
+from app.services.candidate_sourcing import source_candidates
+
+
+def tracks(*ids):
+    return [{"id": track_id, "uri": f"spotify:track:{track_id}"} for track_id in ids]
+
+
+class StubSpotify:
+    """Answers each source with its own tracks after its own delay, and records the deadlines it was given"""
+
+    def __init__(self, answers, delays=None):
+        self.answers = answers
+        self.delays = delays or {}
+        self.deadlines = []
+
+    def get(self, url, user_id=None, params=None, deadline=None):
+        self.deadlines.append(deadline)
+        if url == "/search":
+            source = "search"
+        else:
+            source = "top_tracks" if "seed_tracks" in params else "top_artists"
+        time.sleep(self.delays.get(source, 0))
+        if self.answers.get(source) is None:
+            return SimpleNamespace(status_code=500, text="")
+        body = {"tracks": self.answers[source]}
+        if source == "search":
+            body = {"tracks": {"items": self.answers[source]}}
+        return SimpleNamespace(status_code=200, json=lambda: body)
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    deadlines = []
+
+    def seeds(spotify_id, deadline=None):
+        deadlines.append(deadline)
+        return ["seed"]
+
+    def features(spotify_id, track_ids, deadline=None):
+        deadlines.append(deadline)
+        return {}
+
+    monkeypatch.setattr(candidate_sourcing, "get_seed_track_ids", seeds)
+    monkeypatch.setattr(candidate_sourcing, "get_seed_artist_ids", seeds)
+    monkeypatch.setattr(candidate_sourcing, "get_audio_features", features)
+
+    def answer(answers, delays=None):
+        spotify = StubSpotify(answers, delays)
+        monkeypatch.setattr(candidate_sourcing, "spotify", spotify)
+        return spotify, deadlines
+    return answer
+
+
+def ids(result):
+    return [track["id"] for track in result]
+
+
+def test_every_call_gets_the_same_absolute_deadline(sources):
+    spotify, seed_and_feature_deadlines = sources(
+        {"top_tracks": tracks("a"), "top_artists": tracks("b"), "search": tracks("c")}
+    )
+
+    started = time.monotonic()
+    source_candidates("alice", {}, timeout=2)
+
+    deadlines = set(spotify.deadlines + seed_and_feature_deadlines)
+    assert len(deadlines) == 1
+    assert started + 2 <= deadlines.pop() <= time.monotonic() + 2
+
+
+def test_unranked_candidates_keep_source_order_without_duplicates(sources):
+    sources({"top_tracks": tracks("a", "b"), "top_artists": tracks("b", "c"), "search": tracks("d", "a")})
+    assert ids(source_candidates("alice", {}, limit=10, timeout=2)) == ["a", "b", "c", "d"]
+
+
+def test_failed_sources_are_skipped(sources):
+    sources({"top_tracks": None, "top_artists": tracks("b"), "search": tracks("c")})
+    assert ids(source_candidates("alice", {}, limit=10, timeout=2)) == ["b", "c"]
+
+
+def test_a_source_missing_the_deadline_is_left_out(sources):
+    sources({"top_tracks": tracks("a"), "top_artists": tracks("b"), "search": tracks("c")}, {"top_tracks": 1})
+
+    started = time.monotonic()
+    result = source_candidates("alice", {}, limit=10, timeout=0.3)
+
+    assert ids(result) == ["b", "c"]
+    assert time.monotonic() - started < 0.6
+
+
+def test_nothing_in_time_returns_none(sources):
+    sources({"top_tracks": None, "top_artists": None, "search": tracks("c")}, {"search": 1})
+    assert source_candidates("alice", {}, timeout=0.2) is None
+
+
+def test_ranking_orders_by_distance_to_the_mood(sources, monkeypatch):
+    sources({"top_tracks": tracks("far", "unknown"), "top_artists": tracks("near"), "search": []})
+    features = {"far": {"valence": 0.0, "energy": 0.0}, "near": {"valence": 0.9, "energy": 0.8}}
+    monkeypatch.setattr(candidate_sourcing, "get_audio_features", lambda spotify_id, track_ids, deadline=None: features)
+
+    result = source_candidates("alice", {"target_valence": 0.9, "target_energy": 0.8}, limit=10, timeout=2)
+
+    assert ids(result) == ["near", "unknown", "far"]
+
+
+def test_ranking_past_the_deadline_falls_back_to_source_order(sources, monkeypatch):
+    sources({"top_tracks": tracks("far"), "top_artists": tracks("near"), "search": []})
+
+    def slow_features(spotify_id, track_ids, deadline=None):
+        time.sleep(1)
+        return {"far": {"valence": 0.0, "energy": 0.0}, "near": {"valence": 0.9, "energy": 0.8}}
+
+    monkeypatch.setattr(candidate_sourcing, "get_audio_features", slow_features)
+
+    result = source_candidates("alice", {"target_valence": 0.9, "target_energy": 0.8}, limit=10, timeout=0.3)
+
+    assert ids(result) == ["far", "near"]
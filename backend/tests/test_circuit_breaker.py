@@ -0,0 +1,94 @@
+import pytest
+
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def failing(breaker, times):
+    for _ in range(times):
+        assert breaker.allow()
+        breaker.record(False)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("recommendations", failure_threshold=3, reset_timeout=30)
+
+    failing(breaker, 2)
+    assert breaker.state == CLOSED
+    failing(breaker, 1)
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker("recommendations", failure_threshold=3, reset_timeout=30)
+
+    failing(breaker, 2)
+    breaker.record(True)
+    failing(breaker, 2)
+
+    assert breaker.state == CLOSED
+
+
+def test_lets_one_probe_through_after_the_reset_timeout(clock):
+    breaker = CircuitBreaker("recommendations", failure_threshold=1, reset_timeout=30)
+    failing(breaker, 1)
+
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = CircuitBreaker("recommendations", failure_threshold=1, reset_timeout=30)
+    failing(breaker, 1)
+    clock.now += 30
+
+    assert breaker.allow()
+    breaker.record(True)
+
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_for_another_timeout(clock):
+    breaker = CircuitBreaker("recommendations", failure_threshold=3, reset_timeout=30)
+    failing(breaker, 3)
+    clock.now += 30
+
+    failing(breaker, 1)
+
+    assert breaker.state == OPEN
+    clock.now += 29
+    assert not breaker.allow()
+
+
+def test_probe_that_never_reached_spotify_frees_the_slot(clock):
+    breaker = CircuitBreaker("recommendations", failure_threshold=1, reset_timeout=30)
+    failing(breaker, 1)
+    clock.now += 30
+
+    assert breaker.allow()
+    breaker.record(None)
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
@@ -0,0 +1,44 @@
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from app.routes import emotion_camera
+from app.services.mood_writer import BufferFullError
+
+
+@pytest.fixture
+def client(monkeypatch):
+    ingested = []
+    monkeypatch.setattr(emotion_camera, "ingest_moods", ingested.extend)
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test-secret-key-that-is-long-enough"
+    JWTManager(app)
+    app.register_blueprint(emotion_camera.emotion_cam_bp)
+    with app.app_context():
+        token = create_access_token(identity="alice")
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    client.ingested = ingested
+    return client
+
+
+def test_batch_goes_through_ingest_and_reports_invalid_samples(client):
+    response = client.post("/api/emotion/store-batch", json={"samples": [
+        {"emotion": "happy", "confidence": 92, "timestamp": "2026-01-15T13:40:00Z"},
+        {"emotion": "bored", "confidence": 50},
+        {"emotion": "sad", "confidence": 40, "timestamp": "2026-01-15T13:40:05Z"},
+    ]})
+
+    assert response.status_code == 200
+    assert response.json["stored"] == 2
+    assert [r["index"] for r in response.json["rejected"]] == [1]
+    assert [(record["u"], record["c"]) for record in client.ingested] == [("alice", 0.92), ("alice", 0.4)]
+
+
+def test_full_buffer_answers_503(client, monkeypatch):
+    def full(records):
+        raise BufferFullError("Mood buffer is full")
+
+    monkeypatch.setattr(emotion_camera, "ingest_moods", full)
+    response = client.post("/api/emotion/store-batch", json={"samples": [{"emotion": "happy", "confidence": 92}]})
+    assert response.status_code == 503
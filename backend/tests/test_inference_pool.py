@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from app.services import inference_pool, sentiment_analyzer
+from app.services.inference_pool import (
+    InferenceClient, InferencePool, InferenceQueueFullError, InferenceTimeoutError, InferenceWorkerError,
+    cpu_groups, parse_cpu_list, serve
+)
+
+
+class FakeAnalyzer:
+    """Loads instantly; texts "hang", "crash" and "bad" misbehave in the model process"""
+
+    def load(self):
+        self.window = 510
+
+    def analyze_batch(self, texts):
+        if "hang" in texts:
+            time.sleep(60)
+        if "crash" in texts:
+            os._exit(1)
+        if "bad" in texts:
+            raise ValueError("bad text")
+        return [text.upper() for text in texts]
+
+
+@pytest.fixture(autouse=True)
+def fake_model(monkeypatch):
+    # Model processes are forked, so they see the patched class
+    monkeypatch.setattr(sentiment_analyzer, "SentimentAnalyzer", FakeAnalyzer)
+
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(workers=1, queue_size=1, timeout=2, start_method="fork", load_timeout=10)
+    pool.start()
+    yield pool
+    while not pool._idle.empty():
+        pool._idle.get().kill()
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list("0-3, 6") == [0, 1, 2, 3, 6]
+    assert parse_cpu_list("") == []
+
+
+def test_cpu_groups_split_cpus_between_workers():
+    assert cpu_groups([0, 1, 2, 3], 2) == [[0, 1], [2, 3]]
+    assert cpu_groups([4], 2) == [[4], [4]]
+    assert cpu_groups([], 2) == [None, None]
+
+
+def test_calls_run_in_a_model_process(pool):
+    assert pool.start() == 510
+    assert pool.call("analyze_batch", ["happy", "sad"]) == ["HAPPY", "SAD"]
+
+
+def test_model_errors_reach_the_caller_and_keep_the_process(pool):
+    with pytest.raises(ValueError, match="bad text"):
+        pool.call("analyze_batch", ["bad"])
+    assert pool.call("analyze_batch", ["ok"]) == ["OK"]
+    assert pool.stats()["restarts"] == 0
+
+
+def test_hung_process_is_killed_and_replaced(pool):
+    with pytest.raises(InferenceTimeoutError):
+        pool.call("analyze_batch", ["hang"])
+
+    assert pool.stats()["restarts"] == 1
+    assert pool.call("analyze_batch", ["ok"]) == ["OK"]
+
+
+def test_crashed_process_is_replaced_and_the_call_retried_once(pool):
+    with pytest.raises(InferenceWorkerError):
+        pool.call("analyze_batch", ["crash"])
+
+    assert pool.stats()["restarts"] == 2
+    assert pool.call("analyze_batch", ["ok"]) == ["OK"]
+
+
+def test_calls_beyond_the_queue_size_are_turned_away(pool):
+    errors = []
+
+    def hang():
+        try:
+            pool.call("analyze_batch", ["hang"])
+        except Exception as e:
+            errors.append(e)
+
+    hung = threading.Thread(target=hang)
+    hung.start()
+    time.sleep(0.2)
+
+    with pytest.raises(InferenceQueueFullError):
+        pool.call("analyze_batch", ["ok"])
+    hung.join(5)
+    assert [type(e) for e in errors] == [InferenceTimeoutError]
+    assert pool.stats()["rejected"] == 1
+
+
+def test_web_workers_share_the_service_through_clients(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference_pool, "INFERENCE_WORKERS", 1)
+    monkeypatch.setattr(inference_pool, "INFERENCE_START_METHOD", "fork")
+    address = str(tmp_path / "inference.sock")
+    threading.Thread(target=serve, args=(address, b"secret"), daemon=True).start()
+
+    first = InferenceClient(address, b"secret", timeout=2, load_timeout=10)
+    second = InferenceClient(address, b"secret", timeout=2, load_timeout=10)
+
+    assert first.start() == 510
+    assert first.call("analyze_batch", ["happy"]) == ["HAPPY"]
+    assert second.call("analyze_batch", ["sad"]) == ["SAD"]
+    with pytest.raises(ValueError, match="bad text"):
+        second.call("analyze_batch", ["bad"])
+
+
+def test_client_reports_an_unreachable_service(tmp_path):
+    client = InferenceClient(str(tmp_path / "missing.sock"), b"secret", timeout=1, load_timeout=0)
+    with pytest.raises(InferenceWorkerError):
+        client.call("analyze_batch", ["happy"])
+
+
+# A script that starts a spawn pool from its entry point, like run.py's server does
+SPAWN_SCRIPT = """
+from app.services import sentiment_analyzer
+from app.services.inference_pool import InferencePool
+
+
+class FakeAnalyzer:
+    def load(self):
+        self.window = 510
+
+    def analyze_batch(self, texts):
+        return [text.upper() for text in texts]
+
+
+# At the top level: spawned model processes re-import this file as __mp_main__
+sentiment_analyzer.SentimentAnalyzer = FakeAnalyzer
+
+if __name__ == "__main__":
+    pool = InferencePool(workers=2, timeout=10, start_method="spawn", load_timeout=60)
+    print(pool.start(), pool.call("analyze_batch", ["happy"]))
+"""
+
+
+def test_spawn_pool_starts_from_a_script_entry_point(tmp_path):
+    script = tmp_path / "serve.py"
+    script.write_text(SPAWN_SCRIPT)
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    result = subprocess.run([sys.executable, str(script)], cwd=backend, capture_output=True, text=True,
+                            timeout=120, env={**os.environ, "PYTHONPATH": backend})
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "510 ['HAPPY']"
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from app.services.micro_batcher import BatcherFullError, MicroBatcher
+
+
+class Recorder:
+    """Batch function that records each batch and can be held until released"""
+
+    def __init__(self, hold=False):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        self.started.set()
+        self.release.wait(5)
+        return [item * 10 for item in items]
+
+
+def test_items_waiting_together_share_one_batch():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=4, max_wait=1)
+
+    futures = batcher.submit_many([1, 2, 3, 4])
+
+    assert [future.result(timeout=5) for future in futures] == [10, 20, 30, 40]
+    assert fn.batches == [[1, 2, 3, 4]]
+
+
+def test_batches_are_capped_at_max_batch_size():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=2, max_wait=0.01)
+
+    futures = batcher.submit_many([1, 2, 3, 4, 5])
+
+    assert [future.result(timeout=5) for future in futures] == [10, 20, 30, 40, 50]
+    assert [len(batch) for batch in fn.batches] == [2, 2, 1]
+
+
+def test_a_lone_item_goes_out_after_max_wait():
+    batcher = MicroBatcher(Recorder(), max_batch_size=32, max_wait=0.01)
+    assert batcher.submit(7).result(timeout=5) == 70
+
+
+def test_an_error_reaches_every_caller_in_the_batch():
+    def fail(items):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(fail, max_batch_size=2, max_wait=1)
+    futures = batcher.submit_many(["a", "b"])
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=5)
+    # The worker thread survives
+    batcher.fn = Recorder()
+    assert batcher.submit(1).result(timeout=5) == 10
+
+
+def test_cancelled_items_are_skipped():
+    fn = Recorder(hold=True)
+    batcher = MicroBatcher(fn, max_batch_size=1, max_wait=0)
+    running = batcher.submit(1)
+    fn.started.wait(5)
+
+    cancelled, kept = batcher.submit_many([2, 3])
+    cancelled.cancel()
+    fn.release.set()
+
+    assert running.result(timeout=5) == 10
+    assert kept.result(timeout=5) == 30
+    assert fn.batches == [[1], [3]]
+
+
+def test_full_queue_rejects_whole_submissions():
+    fn = Recorder(hold=True)
+    batcher = MicroBatcher(fn, max_batch_size=1, max_wait=0, max_queue=2)
+    running = batcher.submit(1)
+    fn.started.wait(5)
+
+    queued = batcher.submit(2)
+    with pytest.raises(BatcherFullError):
+        batcher.submit_many([3, 4])
+    assert batcher.stats()["queued"] == 1
+    last = batcher.submit(5)
+    with pytest.raises(BatcherFullError):
+        batcher.submit(6)
+
+    fn.release.set()
+    assert [future.result(timeout=5) for future in (running, queued, last)] == [10, 20, 50]
+    assert batcher.stats()["rejected"] == 3
+
+
+def test_concurrency_runs_batches_in_parallel():
+    both_running = threading.Barrier(2, timeout=5)
+
+    def fn(items):
+        both_running.wait()
+        return items
+
+    batcher = MicroBatcher(fn, max_batch_size=1, max_wait=0, concurrency=2)
+    futures = batcher.submit_many(["a", "b"])
+
+    assert [future.result(timeout=5) for future in futures] == ["a", "b"]
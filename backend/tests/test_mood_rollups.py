@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo import ASCENDING
+
+from app.services import mood_rollups, mood_writer
+from app.services.mood_rollups import (
+    ROLLUP_LIVE_ID, apply_rollups, backfill_rollups, day_start, mood_totals, rollups_ready
+)
+
+
+@pytest.fixture
+def collections(mongo_db, monkeypatch):
+    """Point mood_rollups at scratch collections, with the indexes ensure_indexes() creates"""
+    mongo_db.mood_rollups.create_index([("u", ASCENDING), ("d", ASCENDING)], name="u_d", unique=True)
+    monkeypatch.setattr(mood_rollups, "moods_collection", mongo_db.moods)
+    monkeypatch.setattr(mood_rollups, "mood_rollups_collection", mongo_db.mood_rollups)
+    monkeypatch.setattr(mood_rollups, "migrations_collection", mongo_db.migrations)
+    monkeypatch.setattr(mood_rollups, "_backfilled", False)
+    monkeypatch.setattr(mood_rollups, "_backfill_checked_at", None)
+    monkeypatch.setattr(mood_rollups, "_live_marked", False)
+    return mongo_db
+
+
+def store(db, docs):
+    """Store moods the way ingest does: insert, then $inc the rollups"""
+    docs = [dict(doc) for doc in docs]
+    db.moods.insert_many(docs)
+    apply_rollups(docs)
+
+
+def rollup(db, user_id, day):
+    return db.mood_rollups.find_one({"u": user_id, "d": day}, {"_id": 0, "n": 1, "cs": 1})
+
+
+def test_day_start_drops_the_time_of_day():
+    assert day_start(datetime(2026, 1, 15, 23, 59, 59, 999999)) == datetime(2026, 1, 15)
+
+
+def test_apply_rollups_counts_samples_and_runs_per_day(collections):
+    day = datetime(2026, 1, 15)
+    store(collections, [
+        {"u": "alice", "t": day + timedelta(hours=1), "e": 1, "c": 0.5},
+        {"u": "alice", "t": day + timedelta(hours=2), "e": 1, "c": 0.7},
+        {"u": "alice", "t": day + timedelta(hours=3), "e": 2, "c": 0.4, "te": day + timedelta(hours=4), "n": 10},
+        {"u": "alice", "t": day + timedelta(days=1), "e": 1, "c": 1.0},
+    ])
+
+    first = rollup(collections, "alice", day)
+    assert first["n"] == {"1": 2, "2": 10}
+    assert first["cs"]["1"] == pytest.approx(1.2)
+    assert first["cs"]["2"] == pytest.approx(4.0)
+    assert rollup(collections, "alice", day + timedelta(days=1))["n"] == {"1": 1}
+
+
+def test_mood_totals_scans_only_the_partial_first_day(collections):
+    collections.migrations.insert_one({"_id": mood_rollups.ROLLUP_BACKFILL_ID, "completed": True})
+    day = datetime(2026, 1, 15)
+    store(collections, [
+        {"u": "alice", "t": day + timedelta(hours=6), "e": 1, "c": 0.5},   # before `since`
+        {"u": "alice", "t": day + timedelta(hours=18), "e": 1, "c": 0.5},  # same day, after `since`
+        {"u": "alice", "t": day + timedelta(days=1), "e": 2, "c": 0.8},
+        {"u": "bob", "t": day + timedelta(days=1), "e": 2, "c": 0.8},
+    ])
+
+    counts, confidence_sums = mood_totals("alice", day + timedelta(hours=12))
+
+    assert dict(counts) == {1: 1, 2: 1}
+    assert confidence_sums[2] == pytest.approx(0.8)
+
+
+def test_mood_totals_scans_moods_until_the_backfill_ran(collections):
+    day = datetime(2026, 1, 15)
+    # Stored before rollups existed: no rollup documents
+    collections.moods.insert_one({"u": "alice", "t": day, "e": 3, "c": 0.6})
+
+    assert not rollups_ready()
+    counts, _ = mood_totals("alice", day - timedelta(days=1))
+    assert dict(counts) == {3: 1}
+
+
+def test_backfill_stops_short_of_days_ingest_keeps_live(collections):
+    today = day_start(datetime.utcnow())
+    collections.moods.insert_one({"u": "alice", "t": today - timedelta(days=2), "e": 1, "c": 0.5})
+    store(collections, [{"u": "alice", "t": today + timedelta(minutes=1), "e": 2, "c": 0.5}])
+
+    # Live since today: only days before today may be rebuilt, so it isn't done yet
+    assert backfill_rollups() is False
+    assert not rollups_ready()
+    assert rollup(collections, "alice", today - timedelta(days=2))["n"] == {"1": 1}
+    assert rollup(collections, "alice", today)["n"] == {"2": 1}
+
+
+def test_backfill_completes_once_it_reaches_the_live_days(collections):
+    today = day_start(datetime.utcnow())
+    collections.migrations.insert_one({"_id": ROLLUP_LIVE_ID, "since": today - timedelta(days=3)})
+    collections.moods.insert_many([
+        {"u": "alice", "t": today - timedelta(days=5), "e": 1, "c": 0.5},
+        {"u": "alice", "t": today - timedelta(days=5, hours=-1), "e": 1, "c": 0.3},
+    ])
+    # A live day's rollup already holds the ingest-time count; the backfill must leave it alone
+    collections.mood_rollups.insert_one({"u": "alice", "d": today - timedelta(days=1), "n": {"4": 7}, "cs": {"4": 7.0}})
+    collections.moods.insert_one({"u": "alice", "t": today - timedelta(days=1), "e": 4, "c": 1.0})
+
+    assert backfill_rollups() is True
+    assert rollups_ready()
+    rebuilt = rollup(collections, "alice", today - timedelta(days=5))
+    assert rebuilt["n"] == {"1": 2}
+    assert rebuilt["cs"]["1"] == pytest.approx(0.8)
+    assert rollup(collections, "alice", today - timedelta(days=1))["n"] == {"4": 7}
+
+
+def test_a_run_crossing_midnight_is_rolled_up_on_both_days(collections):
+    midnight = datetime(2026, 1, 16)
+    run = {"u": "alice", "t": midnight - timedelta(minutes=30), "te": midnight + timedelta(minutes=30),
+           "e": 1, "c": 0.5, "n": 7}
+    store(collections, [run])
+
+    assert rollup(collections, "alice", midnight - timedelta(days=1))["n"] == {"1": 3}
+    assert rollup(collections, "alice", midnight)["n"] == {"1": 4}
+
+
+def test_a_scan_counts_only_the_part_of_a_run_inside_the_range(collections):
+    midnight = datetime(2026, 1, 16)
+    collections.moods.insert_one({"u": "alice", "t": midnight - timedelta(minutes=30),
+                                  "te": midnight + timedelta(minutes=30), "e": 1, "c": 0.5, "n": 7})
+
+    counts, confidence_sums = mood_rollups.sum_moods("alice", midnight, midnight + timedelta(days=1))
+
+    assert dict(counts) == {1: 4}
+    assert confidence_sums[1] == pytest.approx(2.0)
+
+
+def test_backfill_splits_runs_crossing_midnight(collections):
+    today = day_start(datetime.utcnow())
+    collections.migrations.insert_one({"_id": ROLLUP_LIVE_ID, "since": today - timedelta(days=3)})
+    midnight = today - timedelta(days=5)
+    collections.moods.insert_one({"u": "alice", "t": midnight - timedelta(minutes=30),
+                                  "te": midnight + timedelta(minutes=30), "e": 1, "c": 0.5, "n": 7})
+
+    backfill_rollups()
+
+    assert rollup(collections, "alice", midnight - timedelta(days=1))["n"] == {"1": 3}
+    assert rollup(collections, "alice", midnight)["n"] == {"1": 4}
+
+
+def test_a_new_database_needs_no_backfill(collections):
+    store(collections, [{"u": "alice", "t": datetime(2026, 1, 15), "e": 1, "c": 0.5}])
+    assert rollups_ready()
+
+
+def test_not_backfilled_is_rechecked_only_after_a_while(collections, monkeypatch):
+    assert not rollups_ready()
+    collections.migrations.insert_one({"_id": mood_rollups.ROLLUP_BACKFILL_ID, "completed": True})
+    assert not rollups_ready()
+
+    monkeypatch.setattr(mood_rollups, "_backfill_checked_at", 0)
+    assert rollups_ready()
+
+
+def test_records_an_earlier_attempt_inserted_are_rolled_up_on_retry(collections, monkeypatch):
+    monkeypatch.setattr(mood_writer, "moods_collection", collections.moods)
+    day = datetime(2026, 1, 15)
+    records = [{"u": "alice", "t": day, "e": 1, "c": 0.5}, {"u": "alice", "t": day, "e": 2, "c": 0.5}]
+    # The first attempt's insert landed but raised (say, the reply was lost) before rolling up
+    collections.moods.insert_one(records[0])
+
+    with pytest.raises(mood_writer.BulkWriteError):
+        mood_writer.write_moods(records)
+
+    assert rollup(collections, "alice", day)["n"] == {"1": 1, "2": 1}
+    assert collections.moods.count_documents({}) == 2
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from app.services.mood_runs import expand_runs, split_chunks, to_document
+
+START = datetime(2026, 1, 15, 12, 0, 0)
+
+
+def sample(seconds, emotion=1, confidence=0.8):
+    return {"u": "alice", "t": START + timedelta(seconds=seconds), "e": emotion, "c": confidence}
+
+
+def split(records, max_samples=10, max_span=3600, max_gap=60):
+    return split_chunks(records, max_samples, timedelta(seconds=max_span), timedelta(seconds=max_gap))
+
+
+def test_consecutive_samples_of_one_emotion_form_one_chunk():
+    records = [sample(0), sample(5), sample(10)]
+    assert split(records) == [records]
+
+
+def test_emotion_change_starts_a_chunk():
+    records = [sample(0), sample(5, emotion=2), sample(10, emotion=2), sample(15)]
+    assert [len(chunk) for chunk in split(records)] == [1, 2, 1]
+
+
+def test_gap_longer_than_max_gap_starts_a_chunk():
+    records = [sample(0), sample(60), sample(121)]
+    assert [len(chunk) for chunk in split(records)] == [2, 1]
+
+
+def test_chunks_respect_max_samples_and_span():
+    assert [len(chunk) for chunk in split([sample(i) for i in range(7)], max_samples=3)] == [3, 3, 1]
+    assert [len(chunk) for chunk in split([sample(i * 30) for i in range(5)], max_span=60)] == [2, 2, 1]
+
+
+def test_to_document_reports_the_mean_confidence():
+    run = {"u": "alice", "t": START, "te": START + timedelta(seconds=10), "e": 1, "n": 4, "cs": 3.0}
+    assert to_document(run) == {"u": "alice", "t": START, "te": run["te"], "e": 1, "c": 0.75, "n": 4}
+
+
+def test_expand_runs_spreads_runs_into_samples_newest_first():
+    run = {"u": "alice", "t": START, "te": START + timedelta(seconds=20), "e": 1, "c": 0.5, "n": 3}
+    single = {"u": "alice", "t": START - timedelta(seconds=30), "e": 2, "c": 0.9}
+
+    samples = expand_runs([run, single], limit=10)
+
+    assert [s["t"] for s in samples] == [
+        START + timedelta(seconds=20), START + timedelta(seconds=10), START, START - timedelta(seconds=30)
+    ]
+    assert [s["e"] for s in samples] == [1, 1, 1, 2]
+    assert len(expand_runs([run, single], limit=2)) == 2
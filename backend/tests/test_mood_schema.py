@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.services.mood_schema import (
+    CAMERA_CONFIDENCE_SCALE, EMOTION_CODES, from_legacy, make_mood_record, normalize_confidence, parse_timestamp,
+    samples_between
+)
+
+
+def test_confidence_is_scaled_to_its_source():
+    assert normalize_confidence(92, CAMERA_CONFIDENCE_SCALE) == pytest.approx(0.92)
+    assert normalize_confidence("0.5") == 0.5
+
+
+@pytest.mark.parametrize("confidence", [-0.1, 1.5, float("nan"), float("inf"), float("-inf"), "nan"])
+def test_confidence_outside_0_1_is_rejected(confidence):
+    with pytest.raises(ValueError):
+        normalize_confidence(confidence)
+
+
+def test_timestamps_become_naive_utc():
+    assert parse_timestamp("2026-01-15T13:40:00Z") == datetime(2026, 1, 15, 13, 40)
+    assert parse_timestamp("2026-01-15T15:40:00+02:00") == datetime(2026, 1, 15, 13, 40)
+
+
+def test_make_mood_record_accepts_aliases():
+    record = make_mood_record("alice", "Fearful", 0.4, "2026-01-15T13:40:00Z")
+    assert record == {"u": "alice", "t": datetime(2026, 1, 15, 13, 40), "e": EMOTION_CODES["fear"], "c": 0.4}
+
+
+def test_legacy_camera_moods_were_percentages():
+    doc = {"_id": ObjectId(), "user_id": "alice", "emotion": "happy", "confidence": 80,
+           "timestamp": "2026-01-15T13:40:00Z"}
+    assert from_legacy(doc)["c"] == pytest.approx(0.8)
+
+
+def test_legacy_dashboard_moods_were_fractions():
+    doc = {"_id": ObjectId(), "spotify_id": "alice", "mood": "sad", "confidence": 0.8,
+           "timestamp": datetime(2026, 1, 15, 13, 40)}
+    record = from_legacy(doc)
+    assert record["c"] == pytest.approx(0.8)
+    assert record["_id"] == doc["_id"]
+
+
+def test_legacy_mood_without_timestamp_keeps_its_creation_time():
+    created = datetime(2025, 6, 1, 8, 30)
+    doc = {"_id": ObjectId.from_datetime(created), "spotify_id": "alice", "mood": "sad", "confidence": 0.8}
+    assert from_legacy(doc)["t"] == created
+
+
+def test_legacy_mood_without_timestamp_or_objectid_is_rejected():
+    with pytest.raises(ValueError, match="timestamp"):
+        from_legacy({"_id": "legacy-1", "spotify_id": "alice", "mood": "sad", "confidence": 0.8})
+
+
+def test_legacy_mood_without_confidence_is_rejected():
+    with pytest.raises(ValueError, match="confidence"):
+        from_legacy({"_id": ObjectId(), "spotify_id": "alice", "mood": "sad", "timestamp": datetime.utcnow()})
+
+
+MIDNIGHT = datetime(2026, 1, 16)
+
+
+def test_a_sample_is_inside_or_outside_the_window():
+    sample = {"t": MIDNIGHT, "e": 1, "c": 0.5}
+    assert samples_between(sample, MIDNIGHT, MIDNIGHT + timedelta(days=1)) == 1
+    assert samples_between(sample, None, MIDNIGHT) == 0
+
+
+def test_a_run_straddling_midnight_is_split_between_the_days():
+    # 7 samples every 10 minutes from 23:30 to 00:30: 3 before midnight, 4 from it
+    run = {"t": MIDNIGHT - timedelta(minutes=30), "te": MIDNIGHT + timedelta(minutes=30), "e": 1, "c": 0.5, "n": 7}
+    assert samples_between(run, MIDNIGHT - timedelta(days=1), MIDNIGHT) == 3
+    assert samples_between(run, MIDNIGHT, MIDNIGHT + timedelta(days=1)) == 4
+    assert samples_between(run, MIDNIGHT) == 4
+    assert samples_between(run) == 7
+
+
+def test_a_run_is_clipped_at_both_ends_of_the_window():
+    run = {"t": MIDNIGHT, "te": MIDNIGHT + timedelta(seconds=90), "e": 1, "c": 0.5, "n": 10}
+    # Samples at 0, 10, ..., 90 s
+    assert samples_between(run, MIDNIGHT + timedelta(seconds=15), MIDNIGHT + timedelta(seconds=45)) == 3
+    assert samples_between(run, MIDNIGHT + timedelta(seconds=100)) == 0
+
+
+def test_split_counts_always_add_up_to_the_run():
+    run = {"t": MIDNIGHT - timedelta(seconds=3599), "te": MIDNIGHT + timedelta(seconds=1), "e": 1, "c": 0.5, "n": 721}
+    for edge in range(-3600, 3600, 37):
+        cut = MIDNIGHT + timedelta(seconds=edge)
+        assert samples_between(run, None, cut) + samples_between(run, cut) == 721
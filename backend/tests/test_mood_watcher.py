@@ -0,0 +1,74 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.services.mood_watcher import PlaylistRefreshScheduler
+
+
+class SlowUsers:
+    """Stands in for users_collection; every update waits until `release` is set"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.updates = []
+
+    def update_one(self, query, update):
+        self.release.wait(5)
+        self.updates.append(query)
+        return SimpleNamespace(modified_count=0)
+
+
+def scheduler(users, queue_size=10):
+    return PlaylistRefreshScheduler(lambda user_id, emotion: None, users, concurrency=0, queue_size=queue_size)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def sample(user_id, emotion=1, at=datetime(2024, 1, 1)):
+    return {"u": user_id, "e": emotion, "t": at}
+
+
+def test_submit_does_not_wait_for_mongo():
+    users = SlowUsers()
+    watcher = scheduler(users)
+
+    started = time.monotonic()
+    assert watcher.submit([sample("alice")])
+    assert time.monotonic() - started < 0.5
+
+    users.release.set()
+    assert wait_for(lambda: len(users.updates) == 2)
+
+
+def test_batches_that_queue_up_are_watched_together():
+    users = SlowUsers()
+    watcher = scheduler(users)
+    watcher.submit([sample("alice")])
+    assert wait_for(lambda: watcher.stats()["pending"] == 0)
+
+    # While alice's update is stuck, two batches for bob arrive
+    watcher.submit([sample("bob", at=datetime(2024, 1, 1))])
+    watcher.submit([sample("bob", emotion=2, at=datetime(2024, 1, 1) + timedelta(seconds=1))])
+    users.release.set()
+
+    assert wait_for(lambda: len(users.updates) == 4)
+    assert [query["spotify_id"] for query in users.updates] == ["alice", "alice", "bob", "bob"]
+    assert users.updates[-1]["mood_watch_e"] == 2
+
+
+def test_batches_beyond_the_queue_are_dropped():
+    users = SlowUsers()
+    watcher = scheduler(users, queue_size=1)
+    watcher.submit([sample("alice")])
+    assert wait_for(lambda: watcher.stats()["pending"] == 0)
+
+    assert watcher.submit([sample("bob")])
+    assert not watcher.submit([sample("carol"), sample("dave")])
+    assert watcher.stats()["dropped"] == 2
+    users.release.set()
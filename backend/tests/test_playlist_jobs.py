@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo import ASCENDING
+
+from app.services import playlist_jobs
+from app.services.playlist_jobs import (
+    JOB_FAILED, JOB_RUNNING, JOB_SUCCEEDED, JobQueueFullError, PlaylistJobPool, get_job, submit_job, wait_for_job
+)
+
+
+@pytest.fixture
+def jobs(mongo_db, monkeypatch):
+    """Scratch playlist_jobs collection (with the idempotency index) and a fresh one-worker pool"""
+    mongo_db.playlist_jobs.create_index(
+        [("u", ASCENDING), ("idempotency_key", ASCENDING)],
+        name="u_idempotency_key",
+        unique=True,
+        partialFilterExpression={"idempotency_key": {"$exists": True}}
+    )
+    monkeypatch.setattr(playlist_jobs, "playlist_jobs_collection", mongo_db.playlist_jobs)
+    monkeypatch.setattr(playlist_jobs, "_pool", PlaylistJobPool(workers=1, queue_size=10, heartbeat=0.1))
+    return mongo_db.playlist_jobs
+
+
+def test_job_runs_and_records_its_result(jobs):
+    job, created = submit_job("alice", {"mood": "happy"}, lambda user, params: ({"mood": params["mood"]}, 201))
+
+    finished = wait_for_job(job, timeout=5, poll_interval=0.01)
+
+    assert created
+    assert finished["status"] == JOB_SUCCEEDED
+    assert finished["http_status"] == 201
+    assert finished["result"] == {"mood": "happy"}
+
+
+def test_same_idempotency_key_returns_the_existing_job(jobs):
+    calls = []
+
+    def task(user, params):
+        calls.append(user)
+        return {"ok": True}, 200
+
+    first, created = submit_job("alice", {}, task, idempotency_key="key-1")
+    wait_for_job(first, timeout=5, poll_interval=0.01)
+    again, created_again = submit_job("alice", {}, task, idempotency_key="key-1")
+    # Keys are per user
+    other, created_other = submit_job("bob", {}, task, idempotency_key="key-1")
+    wait_for_job(other, timeout=5, poll_interval=0.01)
+
+    assert created and not created_again and created_other
+    assert again["_id"] == first["_id"]
+    assert again["status"] == JOB_SUCCEEDED
+    assert calls == ["alice", "bob"]
+
+
+def test_failing_task_marks_the_job_failed_and_the_worker_survives(jobs):
+    def crash(user, params):
+        raise RuntimeError("Spotify is down")
+
+    crashed, _ = submit_job("alice", {}, crash)
+    after, _ = submit_job("alice", {}, lambda user, params: ({}, 200))
+
+    crashed = wait_for_job(crashed, timeout=5, poll_interval=0.01)
+    after = wait_for_job(after, timeout=5, poll_interval=0.01)
+
+    assert crashed["status"] == JOB_FAILED
+    assert crashed["http_status"] == 500
+    assert crashed["result"] == {"error": "Spotify is down"}
+    assert after["status"] == JOB_SUCCEEDED
+
+
+def test_error_status_marks_the_job_failed(jobs):
+    job, _ = submit_job("alice", {}, lambda user, params: ({"error": "No tracks"}, 404))
+    assert wait_for_job(job, timeout=5, poll_interval=0.01)["status"] == JOB_FAILED
+
+
+def test_full_queue_rejects_the_job_and_frees_its_key(jobs, monkeypatch):
+    monkeypatch.setattr(playlist_jobs, "_pool", PlaylistJobPool(workers=0, queue_size=1))
+
+    submit_job("alice", {}, lambda user, params: ({}, 200))
+    with pytest.raises(JobQueueFullError):
+        submit_job("alice", {}, lambda user, params: ({}, 200), idempotency_key="key-2")
+
+    assert jobs.count_documents({"idempotency_key": "key-2"}) == 0
+
+
+def test_job_abandoned_by_its_worker_is_reported_failed(jobs):
+    stale = datetime.utcnow() - timedelta(seconds=playlist_jobs.PLAYLIST_JOB_TIMEOUT + 1)
+    jobs.insert_one({"_id": "lost", "u": "alice", "status": JOB_RUNNING, "created_at": stale, "updated_at": stale})
+
+    job = get_job("lost", "alice")
+
+    assert job["status"] == JOB_FAILED
+    assert jobs.find_one({"_id": "lost"})["status"] == JOB_FAILED
+    assert get_job("lost", "bob") is None
+
+
+def test_long_job_is_kept_alive_by_the_heartbeat(jobs, monkeypatch):
+    monkeypatch.setattr(playlist_jobs, "PLAYLIST_JOB_TIMEOUT", 1)
+    release = threading.Event()
+    job, _ = submit_job("alice", {}, lambda user, params: (release.wait(5) and {}, 200))
+
+    time.sleep(1.5)
+    assert get_job(job["_id"], "alice")["status"] == JOB_RUNNING
+    release.set()
+
+    assert wait_for_job(job, timeout=5, poll_interval=0.01)["status"] == JOB_SUCCEEDED
+
+
+def test_job_given_up_on_keeps_its_failed_status(jobs, monkeypatch):
+    monkeypatch.setattr(playlist_jobs, "_pool", PlaylistJobPool(workers=1, queue_size=10, heartbeat=60))
+    release = threading.Event()
+    job, _ = submit_job("alice", {}, lambda user, params: (release.wait(5) and {}, 200))
+    while jobs.find_one({"_id": job["_id"]})["status"] != JOB_RUNNING:
+        time.sleep(0.01)
+
+    # Its process stalled past the timeout, so a poll gives up on it
+    stale = datetime.utcnow() - timedelta(seconds=playlist_jobs.PLAYLIST_JOB_TIMEOUT + 1)
+    jobs.update_one({"_id": job["_id"]}, {"$set": {"updated_at": stale}})
+    assert get_job(job["_id"], "alice")["status"] == JOB_FAILED
+    release.set()
+    time.sleep(0.2)
+
+    assert jobs.find_one({"_id": job["_id"]})["result"] == {"error": "Job was interrupted, please try again"}
@@ -0,0 +1,170 @@
+import random
+
+import pytest
+
+from app.services import playlist_service
+from app.services.playlist_service import plan_moves, sync_playlist
+
+
+def move(items, range_start, insert_before):
+    """Spotify's reorder: the item at range_start is moved to before the item at insert_before"""
+    items = list(items)
+    item = items[range_start]
+    items.insert(insert_before, item)
+    del items[range_start + 1 if insert_before < range_start else range_start]
+    return items
+
+
+class Response:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        assert self.status_code < 400
+
+
+class FakeSpotify:
+    """One playlist held in memory, changed by the same calls the Web API takes"""
+
+    def __init__(self, uris):
+        self.uris = list(uris)
+        self.snapshot = 0
+        self.calls = []
+
+    def _changed(self):
+        self.snapshot += 1
+        return Response({"snapshot_id": f"snap-{self.snapshot}"})
+
+    def get(self, url, user_id=None, params=None):
+        self.calls.append(("GET", url))
+        if url.endswith("/tracks"):
+            return Response({"items": [{"track": {"uri": uri}} for uri in self.uris], "next": None})
+        return Response({"snapshot_id": f"snap-{self.snapshot}"})
+
+    def post(self, url, user_id=None, json=None):
+        self.calls.append(("POST", len(json["uris"])))
+        self.uris += json["uris"]
+        return self._changed()
+
+    def delete(self, url, user_id=None, json=None):
+        self.calls.append(("DELETE", len(json["tracks"])))
+        removed = {track["uri"] for track in json["tracks"]}
+        self.uris = [uri for uri in self.uris if uri not in removed]
+        return self._changed()
+
+    def put(self, url, user_id=None, json=None):
+        if "uris" in json:
+            self.calls.append(("REPLACE", len(json["uris"])))
+            self.uris = list(json["uris"])
+        else:
+            self.calls.append(("MOVE", json["range_start"], json["insert_before"]))
+            self.uris = move(self.uris, json["range_start"], json["insert_before"])
+        return self._changed()
+
+
+class Users:
+    def update_one(self, query, update):
+        pass
+
+
+@pytest.fixture
+def playlist(monkeypatch):
+    def with_tracks(uris, cached=True):
+        spotify = FakeSpotify(uris)
+        monkeypatch.setattr(playlist_service, "spotify", spotify)
+        monkeypatch.setattr(playlist_service, "users_collection", Users())
+        monkeypatch.setattr(playlist_service, "get_or_create_playlist", lambda user: "playlist-1")
+        user = {"spotify_id": "alice", "mood_playlist_id": "playlist-1"}
+        if cached:
+            user.update(mood_playlist_snapshot_id="snap-0", mood_playlist_uris=list(uris))
+        return spotify, user
+    return with_tracks
+
+
+def uris(*names):
+    return [f"spotify:track:{name}" for name in names]
+
+
+def test_plan_moves_reorders_any_permutation():
+    rng = random.Random(3)
+    for size in range(1, 30):
+        current = list(range(size))
+        desired = rng.sample(current, size)
+
+        moves = plan_moves(current, desired)
+
+        for range_start, insert_before in moves:
+            current = move(current, range_start, insert_before)
+        assert current == desired
+        assert len(moves) <= max(size - 1, 0)
+
+
+def test_plan_moves_is_empty_when_already_in_order():
+    assert plan_moves(["a", "b"], ["a", "b"]) == []
+
+
+def test_reorder_only_sends_moves(playlist):
+    spotify, user = playlist(uris(*"abcdefghij"))
+
+    result = sync_playlist(user, uris(*"abcdefghji"))
+
+    assert spotify.uris == uris(*"abcdefghji")
+    assert [call[0] for call in spotify.calls] == ["GET", "MOVE"]
+    assert result["added"] == result["removed"] == 0
+
+
+def test_changes_send_removals_then_additions_then_moves(playlist):
+    current = [f"spotify:track:{i}" for i in range(250)]
+    desired = current[1:]
+    desired[0], desired[1] = desired[1], desired[0]
+    desired.append("spotify:track:new")
+    spotify, user = playlist(current)
+
+    result = sync_playlist(user, desired)
+
+    assert spotify.uris == desired
+    assert spotify.calls[1:] == [("DELETE", 1), ("POST", 1), ("MOVE", 1, 0)]
+    assert (result["added"], result["removed"]) == (1, 1)
+    assert user["mood_playlist_uris"] == desired
+    assert user["mood_playlist_snapshot_id"] == result["snapshot_id"] == "snap-3"
+
+
+def test_rewrites_when_that_takes_fewer_calls(playlist):
+    spotify, user = playlist(uris(*"abcdef"))
+
+    sync_playlist(user, uris(*"fedcba"))
+
+    assert spotify.uris == uris(*"fedcba")
+    assert spotify.calls[1:] == [("REPLACE", 6)]
+
+
+def test_duplicates_on_spotify_are_cleaned_up_by_a_rewrite(playlist):
+    spotify, user = playlist(uris(*"abca"))
+
+    sync_playlist(user, uris(*"abc"))
+
+    assert spotify.uris == uris(*"abc")
+    assert spotify.calls[1:] == [("REPLACE", 3)]
+
+
+def test_a_playlist_changed_outside_moodbeats_is_read_first(playlist):
+    spotify, user = playlist(uris(*"abc"), cached=False)
+
+    sync_playlist(user, uris(*"abd"))
+
+    assert spotify.uris == uris(*"abd")
+    assert ("GET", "/playlists/playlist-1/tracks") in spotify.calls
+
+
+def test_removals_are_sent_in_batches_of_100(playlist):
+    current = [f"spotify:track:{i}" for i in range(350)]
+    spotify, user = playlist(current)
+
+    sync_playlist(user, current[150:])
+
+    assert spotify.uris == current[150:]
+    assert spotify.calls[1:] == [("DELETE", 100), ("DELETE", 50)]
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Builds the app the way a preloading gunicorn master does, then lists its threads
+PRELOAD_SCRIPT = """
+import threading
+from app import create_app
+
+create_app(preload=True)
+print(sorted(thread.name for thread in threading.enumerate()))
+"""
+
+
+def test_preloaded_app_leaves_mongo_alone():
+    env = {**os.environ, "MONGO_URI": "mongodb://127.0.0.1:9", "SENTIMENT_WARMUP": "0"}
+    result = subprocess.run([sys.executable, "-c", PRELOAD_SCRIPT], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    # No index creation (which would wait out server selection) and no pymongo monitor threads to fork
+    assert "Could not create indexes" not in result.stdout
+    assert result.stdout.strip().splitlines()[-1] == "['MainThread']"
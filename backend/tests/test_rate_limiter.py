@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+from app.services.rate_limiter import (
+    BACKGROUND, GLOBAL_BUCKET, INTERACTIVE, FileBucketStore, RateLimiter, SpotifyRateLimited, spotify_priority,
+    current_priority
+)
+
+NOW = 1_000_000.0
+
+
+def limiter(**kwargs):
+    options = {"rate": 10, "burst": 4, "user_rate": 1, "user_burst": 2, "background_reserve": 0.5, "max_wait": 0}
+    options.update(kwargs)
+    return RateLimiter(**options)
+
+
+def test_burst_goes_out_at_once_then_calls_wait_for_refill():
+    buckets = {}
+    rl = limiter(user_rate=0)
+
+    assert [rl._take(buckets, None, INTERACTIVE, NOW) for _ in range(4)] == [0] * 4
+    assert rl._take(buckets, None, INTERACTIVE, NOW) == pytest.approx(0.1)
+    # A token is back once 1 / rate seconds have passed
+    assert rl._take(buckets, None, INTERACTIVE, NOW + 0.11) == 0
+
+
+def test_background_calls_leave_the_reserve_to_interactive_ones():
+    buckets = {}
+    rl = limiter(user_rate=0)
+
+    assert rl._take(buckets, None, BACKGROUND, NOW) == 0
+    assert rl._take(buckets, None, BACKGROUND, NOW) == 0
+    # Half the burst (2 tokens) is held back from background calls
+    assert rl._take(buckets, None, BACKGROUND, NOW) > 0
+    assert rl._take(buckets, None, INTERACTIVE, NOW) == 0
+    assert rl._take(buckets, None, INTERACTIVE, NOW) == 0
+
+
+def test_each_user_has_their_own_bucket():
+    buckets = {}
+    rl = limiter()
+
+    assert rl._take(buckets, "alice", INTERACTIVE, NOW) == 0
+    assert rl._take(buckets, "alice", INTERACTIVE, NOW) == 0
+    assert rl._take(buckets, "alice", INTERACTIVE, NOW) == pytest.approx(1.0)
+    assert rl._take(buckets, "bob", INTERACTIVE, NOW) == 0
+
+
+def test_a_waiting_call_takes_no_tokens():
+    buckets = {}
+    rl = limiter()
+    rl._take(buckets, "alice", INTERACTIVE, NOW)
+    rl._take(buckets, "alice", INTERACTIVE, NOW)
+    app_tokens = buckets[GLOBAL_BUCKET][0]
+
+    rl._take(buckets, "alice", INTERACTIVE, NOW)
+
+    assert buckets[GLOBAL_BUCKET][0] == app_tokens
+
+
+def test_pause_holds_every_call():
+    rl = limiter(max_wait=0)
+    rl.pause(30)
+    with pytest.raises(SpotifyRateLimited):
+        rl.acquire(priority=INTERACTIVE)
+
+
+def test_acquire_gives_up_after_the_max_wait():
+    rl = limiter(user_rate=0, burst=1, max_wait=0)
+    rl.acquire()
+    with pytest.raises(SpotifyRateLimited):
+        rl.acquire()
+
+
+def test_acquire_waits_for_refill_within_the_max_wait():
+    rl = limiter(user_rate=0, rate=50, burst=1, max_wait=1)
+    rl.acquire()
+    rl.acquire()
+
+
+def test_zero_rate_turns_the_limiter_off():
+    rl = limiter(rate=0, burst=0)
+    for _ in range(100):
+        rl.acquire(user_id="alice")
+
+
+def test_processes_sharing_a_file_share_one_budget(tmp_path):
+    path = str(tmp_path / "rate.json")
+    first = limiter(user_rate=0, burst=2, store=FileBucketStore(path))
+    second = limiter(user_rate=0, burst=2, store=FileBucketStore(path))
+
+    first.acquire()
+    second.acquire()
+    with pytest.raises(SpotifyRateLimited):
+        first.acquire()
+
+
+def test_priority_is_scoped_to_the_block():
+    assert current_priority() == INTERACTIVE
+    with spotify_priority(BACKGROUND):
+        assert current_priority() == BACKGROUND
+    assert current_priority() == INTERACTIVE
+
+
+def test_acquire_gives_up_at_once_when_budget_would_come_after_the_deadline():
+    rl = limiter(rate=1, burst=1, user_rate=0, max_wait=10)
+    rl.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(SpotifyRateLimited):
+        rl.acquire(deadline=started + 0.1)
+    assert time.monotonic() - started < 0.1
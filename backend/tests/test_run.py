@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a spawned model process does with the script that started it
+MP_MAIN_SCRIPT = """
+import runpy
+import threading
+
+namespace = runpy.run_path("run.py", run_name="__mp_main__")
+print("app" in namespace, sorted(thread.name for thread in threading.enumerate()))
+"""
+
+
+def test_run_py_builds_no_app_when_re_imported_by_a_model_process():
+    result = subprocess.run([sys.executable, "-c", MP_MAIN_SCRIPT], cwd=BACKEND, capture_output=True, text=True,
+                            timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "False ['MainThread']"
@@ -0,0 +1,102 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import sentiment_analyzer
+from app.services.inference_pool import InferenceQueueFullError, InferenceTimeoutError
+from app.services.sentiment_analyzer import READY, SentimentAnalyzer
+
+
+class ByteTokenizer:
+    """Byte-level tokenizer: one token per UTF-8 byte, so "é" is two tokens over one character"""
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False):
+        offsets = []
+        for index, character in enumerate(text):
+            offsets += [(index, index + 1)] * len(character.encode())
+        return {"offset_mapping": offsets}
+
+
+def loaded(window):
+    analyzer = SentimentAnalyzer()
+    analyzer.tokenizer = ByteTokenizer()
+    analyzer.window = window
+    analyzer.state = READY
+    return analyzer
+
+
+@pytest.fixture(autouse=True)
+def windows(monkeypatch):
+    monkeypatch.setattr(sentiment_analyzer, "SENTIMENT_WINDOW_OVERLAP", 2)
+    monkeypatch.setattr(sentiment_analyzer, "SENTIMENT_MAX_WINDOWS", 64)
+
+
+def test_text_that_fits_is_one_window():
+    assert loaded(5).split_windows("abcde") == [(0, 5)]
+
+
+def test_fewer_characters_than_the_window_can_still_overflow_it():
+    # 4 characters, 8 tokens
+    assert loaded(5).split_windows("éééé") == [(0, 3), (1, 4)]
+
+
+def test_windows_overlap_and_cover_the_text():
+    assert loaded(5).split_windows("abcdefghij") == [(0, 5), (3, 8), (6, 10)]
+
+
+def test_windows_stop_at_the_limit(monkeypatch):
+    monkeypatch.setattr(sentiment_analyzer, "SENTIMENT_MAX_WINDOWS", 2)
+    assert loaded(5).split_windows("abcdefghij") == [(0, 5), (3, 8)]
+
+
+def test_windows_are_split_here_even_with_a_model_pool():
+    def call(method, *args):
+        raise AssertionError(f"{method} went to a model process")
+
+    analyzer = loaded(5)
+    analyzer.pool = SimpleNamespace(call=call)
+
+    assert analyzer.split_windows("abcdefghij") == [(0, 5), (3, 8), (6, 10)]
+
+
+def test_long_text_score_weights_windows_by_length():
+    analyzer = loaded(5)
+    analyzer.analyze_texts = lambda texts: [
+        {"label": "POSITIVE", "score": 0.9}, {"label": "NEGATIVE", "score": 0.8}
+    ][:len(texts)]
+
+    result = analyzer.analyze_long_text("abcdefghij", spans=[(0, 5), (5, 10)])
+
+    assert result["label"] == "POSITIVE"
+    assert result["score"] == pytest.approx(0.55)
+    assert [segment["label"] for segment in result["segments"]] == ["POSITIVE", "NEGATIVE"]
+    assert not result["truncated"]
+
+
+def test_long_text_reports_an_ignored_tail():
+    analyzer = loaded(5)
+    analyzer.analyze_texts = lambda texts: [{"label": "POSITIVE", "score": 0.9}] * len(texts)
+    assert analyzer.analyze_long_text("abcdefghij", spans=[(0, 5)])["truncated"]
+
+
+def test_slow_model_times_out_as_an_inference_timeout(monkeypatch):
+    monkeypatch.setattr(sentiment_analyzer, "SENTIMENT_TIMEOUT", 0.1)
+    analyzer = loaded(5)
+    analyzer.analyze_batch = lambda texts: time.sleep(1) or [{"label": "POSITIVE", "score": 1.0}] * len(texts)
+
+    with pytest.raises(InferenceTimeoutError):
+        analyzer.analyze_texts(["slow"])
+
+
+def test_texts_beyond_the_queue_size_are_turned_away(monkeypatch):
+    monkeypatch.setattr(sentiment_analyzer, "SENTIMENT_QUEUE_SIZE", 2)
+    release = threading.Event()
+    analyzer = loaded(5)
+    analyzer.analyze_batch = lambda texts: release.wait(5) and [{"label": "POSITIVE", "score": 1.0}] * len(texts)
+
+    with pytest.raises(InferenceQueueFullError):
+        analyzer.analyze_texts(["one", "two", "three"])
+    release.set()
+    assert analyzer.analyze_texts(["one", "two"]) == [{"label": "POSITIVE", "score": 1.0}] * 2
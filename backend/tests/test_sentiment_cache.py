@@ -0,0 +1,63 @@
+from app.services.sentiment_analyzer import SentimentAnalyzer
+from app.services.sentiment_cache import SentimentCache, cache_key
+
+
+def test_texts_differing_only_in_whitespace_and_unicode_form_share_a_key():
+    assert cache_key("  so\thappy\n today ", "v1") == cache_key("so happy today", "v1")
+    # NFC "é" and "e" + combining acute, and a full-width letter
+    assert cache_key("café", "v1") == cache_key("café", "v1")
+    assert cache_key("Ａ", "v1") == cache_key("A", "v1")
+
+
+def test_different_texts_and_model_versions_get_different_keys():
+    assert cache_key("happy", "v1") != cache_key("sad", "v1")
+    assert cache_key("Happy", "v1") != cache_key("happy", "v1")
+    assert cache_key("happy", "v1") != cache_key("happy", "v2")
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = SentimentCache(capacity=2)
+    cache.put_many({"a": 1, "b": 2})
+    cache.get_many(["a"])
+
+    cache.put_many({"c": 3})
+
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+    assert cache.stats()["size"] == 2
+
+
+def test_stats_count_hits_and_misses_per_lookup():
+    cache = SentimentCache(capacity=10)
+    cache.put_many({"a": 1})
+
+    cache.get_many(["a", "a", "b"])
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_rate"] == 0.667
+
+
+def test_analyzer_sends_each_uncached_text_to_the_model_once():
+    sent = []
+    analyzer = SentimentAnalyzer(cache=SentimentCache(capacity=10), version="v1")
+    analyzer.analyze_batch = lambda texts: sent.extend(texts) or [{"label": "POSITIVE", "score": 1.0}] * len(texts)
+
+    analyzer.analyze_texts(["happy", " happy ", "sad"])
+    analyzer.analyze_texts(["happy", "sad", "calm"])
+
+    assert [text.strip() for text in sent] == ["happy", "sad", "calm"]
+
+
+def test_persisted_results_survive_a_new_cache(mongo_db, monkeypatch):
+    import db
+
+    monkeypatch.setattr(db, "sentiment_cache_collection", mongo_db.sentiment_cache)
+    SentimentCache(capacity=10, persist=True).put_many({"a": {"label": "POSITIVE", "score": 0.9}})
+
+    fresh = SentimentCache(capacity=10, persist=True)
+
+    assert fresh.get_many(["a", "b"]) == {"a": {"label": "POSITIVE", "score": 0.9}}
+    assert fresh.stats()["persisted_hits"] == 1
+    # Kept in memory from then on
+    fresh.persist = False
+    assert fresh.get_many(["a"]) == {"a": {"label": "POSITIVE", "score": 0.9}}
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from app.services.single_flight import SingleFlight, freeze, single_flight
+
+
+def run_concurrently(group, key, fn, callers):
+    """Start a leader blocked inside fn, then `callers` followers on the same key; returns their outcomes"""
+    entered = threading.Event()
+    release = threading.Event()
+    outcomes = []
+
+    def blocking():
+        entered.set()
+        release.wait(5)
+        return fn()
+
+    def call(target):
+        try:
+            outcomes.append(("ok", group.do(key, target)))
+        except Exception as e:
+            outcomes.append(("error", e))
+
+    threads = [threading.Thread(target=call, args=(blocking,))]
+    threads[0].start()
+    entered.wait(5)
+    threads += [threading.Thread(target=call, args=(fn,)) for _ in range(callers)]
+    for thread in threads[1:]:
+        thread.start()
+    # Let the followers reach the wait before the leader finishes
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"tracks": [1, 2, 3]}
+
+    outcomes = run_concurrently(SingleFlight(), "alice", fetch, callers=5)
+
+    assert len(calls) == 1
+    assert outcomes == [("ok", {"tracks": [1, 2, 3]})] * 6
+
+
+def test_concurrent_callers_share_the_exception():
+    error = RuntimeError("Spotify is down")
+
+    def fail():
+        raise error
+
+    outcomes = run_concurrently(SingleFlight(), "alice", fail, callers=3)
+
+    assert outcomes == [("error", error)] * 4
+
+
+def test_different_keys_run_separately():
+    group = SingleFlight()
+    assert group.do("alice", lambda: 1) == 1
+    assert group.do("bob", lambda: 2) == 2
+
+
+def test_nothing_is_cached_after_the_call():
+    group = SingleFlight()
+    results = iter([1, 2])
+    assert group.do("alice", lambda: next(results)) == 1
+    assert group.do("alice", lambda: next(results)) == 2
+
+    with pytest.raises(ValueError):
+        group.do("alice", lambda: int("x"))
+    assert group.do("alice", lambda: 3) == 3
+
+
+def test_decorator_keys_calls_with_the_key_function():
+    calls = []
+
+    @single_flight(key=lambda user, params: (user, freeze(params)))
+    def recommend(user, params):
+        calls.append(user)
+        return user
+
+    assert recommend("alice", {"limit": 5}) == "alice"
+    assert recommend.__name__ == "recommend"
+    assert calls == ["alice"]
+
+
+def test_freeze_makes_equal_values_equal_keys():
+    assert freeze({"b": [1, 2], "a": {"x": 1}}) == freeze({"a": {"x": 1}, "b": (1, 2)})
+    assert freeze({"a": 1}) != freeze({"a": 2})
+    hash(freeze({"seeds": ["a", "b"], "mood": {"valence": 0.5}}))
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+import requests
+
+from app.services.circuit_breaker import CLOSED, CircuitBreaker
+from app.services.spotify_client import SpotifyClient, SpotifyDeadlineExceeded
+
+
+def response(status_code, retry_after=None):
+    res = requests.Response()
+    res.status_code = status_code
+    if retry_after is not None:
+        res.headers["Retry-After"] = str(retry_after)
+    return res
+
+
+class FakeSession:
+    """Answers each request with the next outcome: a status code, or an exception to raise"""
+
+    def __init__(self, *outcomes, delay=0):
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.timeouts = []
+
+    def request(self, method, url, headers=None, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        time.sleep(self.delay)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def client(*outcomes, delay=0):
+    spotify = SpotifyClient(breakers={"search": CircuitBreaker("search", failure_threshold=1)})
+    spotify.session = FakeSession(*outcomes, delay=delay)
+    spotify._backoff = lambda attempt: 0.3
+    return spotify
+
+
+def test_retries_transient_errors_without_a_deadline():
+    spotify = client(response(503), requests.ConnectionError(), response(200))
+    assert spotify.get("/search").status_code == 200
+
+
+def test_timeouts_are_cut_to_what_is_left_of_the_deadline():
+    spotify = client(response(200))
+
+    spotify.get("/search", deadline=time.monotonic() + 1)
+
+    connect, read = spotify.session.timeouts[0]
+    assert 0.9 < connect <= 1 and 0.9 < read <= 1
+
+
+def test_retries_stop_when_the_backoff_would_pass_the_deadline():
+    spotify = client(response(503), response(200))
+
+    assert spotify.get("/search", deadline=time.monotonic() + 0.2).status_code == 503
+    assert len(spotify.session.timeouts) == 1
+
+
+def test_a_retry_after_past_the_deadline_is_not_waited_out():
+    spotify = client(response(429, retry_after=2), response(200))
+
+    started = time.monotonic()
+    assert spotify.get("/search", deadline=started + 1).status_code == 429
+    assert time.monotonic() - started < 0.5
+
+
+def test_a_passed_deadline_sends_nothing_and_leaves_the_circuit_alone():
+    spotify = client(response(200))
+
+    with pytest.raises(SpotifyDeadlineExceeded):
+        spotify.get("/search", deadline=time.monotonic())
+
+    assert spotify.session.timeouts == []
+    assert spotify.breakers["search"].state == CLOSED
+
+
+def test_a_timeout_cut_short_by_the_deadline_is_not_a_spotify_failure():
+    spotify = client(requests.ReadTimeout(), delay=0.1)
+
+    with pytest.raises(SpotifyDeadlineExceeded):
+        spotify.get("/search", deadline=time.monotonic() + 0.05)
+
+    assert spotify.breakers["search"].state == CLOSED
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from app.services.track_index import TEMPO_SCALE, TrackIndex
+
+
+def track(track_id, valence=0.5, energy=0.5, tempo=120.0, **metadata):
+    return {"id": track_id, "valence": valence, "energy": energy, "tempo": tempo, **metadata}
+
+
+def test_duplicate_ids_in_one_batch_keep_the_last_values():
+    index = TrackIndex()
+
+    assert index.add_tracks([track("a", valence=0.1), track("a", valence=0.9, name="Second")]) == 1
+
+    assert index.ids == ["a"]
+    assert index.features[0, 0] == pytest.approx(0.9)
+    assert index.nearest({"target_valence": 0.9})[0]["name"] == "Second"
+
+
+def test_duplicates_of_an_existing_track_in_one_batch_update_it():
+    index = TrackIndex()
+    index.add_tracks([track("a"), track("b")])
+
+    assert index.add_tracks([track("b", energy=0.2), track("c"), track("b", energy=0.8)]) == 1
+
+    assert index.ids == ["a", "b", "c"]
+    assert index.features[index.row_by_id["b"], 1] == pytest.approx(0.8)
+
+
+def test_updates_change_values_and_keep_metadata_not_given():
+    index = TrackIndex()
+    index.add_tracks([track("a", tempo=100, name="Song", artist="Band")])
+
+    index.add_tracks([track("a", tempo=140, name="Song (Remastered)")])
+
+    assert len(index) == 1
+    assert index.tempo[0] == pytest.approx(140)
+    found = index.nearest({}, k=1)[0]
+    assert found["name"] == "Song (Remastered)"
+    assert found["artists"] == [{"name": "Band"}]
+
+
+def test_growing_past_capacity_keeps_every_row():
+    index = TrackIndex()
+    for start in range(0, 3000, 500):
+        index.add_tracks([track(f"t{i}", valence=i / 3000) for i in range(start, start + 500)])
+
+    assert len(index) == 3000
+    assert index.features[:, 0] == pytest.approx(np.arange(3000) / 3000)
+    assert all(index.ids[row] == track_id for track_id, row in index.row_by_id.items())
+
+
+def test_nearest_matches_a_full_sort():
+    rng = np.random.default_rng(7)
+    index = TrackIndex()
+    index.add_tracks([
+        track(f"t{i}", valence=v, energy=e, tempo=t)
+        for i, (v, e, t) in enumerate(zip(rng.random(2000), rng.random(2000), rng.uniform(60, 180, 2000)))
+    ])
+    mood = {"target_valence": 0.3, "target_energy": 0.7, "target_tempo": 110, "min_tempo": 80, "max_tempo": 150}
+
+    found = [t["id"] for t in index.nearest(mood, k=25, exclude=["t0", "t1"])]
+
+    # Same float32 arithmetic as the index, so only the selection differs
+    target = np.array([0.3, 0.7], dtype=np.float32)
+    tempo = index.tempo
+    distance = np.square(index.features - target).sum(axis=1) + np.square((tempo - 110) / TEMPO_SCALE)
+    expected = sorted(
+        (d, track_id) for track_id, d, t in zip(index.ids, distance, tempo)
+        if 80 <= t <= 150 and track_id not in ("t0", "t1")
+    )[:25]
+    assert found == [track_id for _, track_id in expected]
+
+
+def test_nearest_returns_fewer_when_few_tracks_qualify():
+    index = TrackIndex()
+    index.add_tracks([track("slow", tempo=70), track("fast", tempo=170)])
+
+    assert [t["id"] for t in index.nearest({"max_tempo": 90}, k=5)] == ["slow"]
+    assert TrackIndex().nearest({}, k=5) == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = TrackIndex()
+    index.add_tracks([track("a", valence=0.2, name="Song"), track("b", energy=0.9)])
+    path = str(tmp_path / "index.npz")
+
+    index.save(path)
+    loaded = TrackIndex()
+    loaded.load(path)
+
+    assert loaded.ids == ["a", "b"]
+    assert loaded.features == pytest.approx(index.features)
+    assert loaded.nearest({"target_valence": 0.2}, k=1)[0]["name"] == "Song"
+    loaded.add_tracks([track("c")])
+    assert loaded.row_by_id["c"] == 2
@@ -0,0 +1,16 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# (run.py is the development server)
+import os
+
+from app import create_app
+
+PRELOAD = os.getenv("SENTIMENT_PRELOAD", "0") == "1" and os.getenv("INFERENCE_WORKERS", "1") == "0"
+
+if PRELOAD:
+    # Imported in the gunicorn master (preload_app): load the model here, once,
+    # and the forked workers share its weights copy-on-write
+    from app.services.sentiment_analyzer import get_analyzer
+
+    get_analyzer().load()
+
+app = create_app(preload=PRELOAD)
@@ -42,6 +42,8 @@ export default function DashboardPage() {
 
   const videoRef = useRef<HTMLVideoElement>(null)
   const intervalRef = useRef<NodeJS.Timeout | null>(null)
+  // Idempotency key of the generate in progress, shared by double clicks and retries
+  const generateKeyRef = useRef<string | null>(null)
 
   const [loading, setLoading] = useState(true)
   const [sidebarOpen, setSidebarOpen] = useState(false)
@@ -55,11 +57,15 @@ export default function DashboardPage() {
   const [playlistLoading, setPlaylistLoading] = useState(false)
   const [moodAnalysis, setMoodAnalysis] = useState<MoodAnalysis | null>(null)
   const [previewTracks, setPreviewTracks] = useState<Track[]>([])
+  const [previewId, setPreviewId] = useState<string | null>(null)
   const [playlistResult, setPlaylistResult] = useState<PlaylistResult | null>(null)
   const [showPreview, setShowPreview] = useState(false)
   const [days, setDays] = useState(7)
   const [numTracks, setNumTracks] = useState(20)
 
+  // A preview only stands for the settings it was made with
+  useEffect(() => setPreviewId(null), [days, numTracks])
+
   const API_URL = 'http://127.0.0.1:5000'
 
   /* -------------------- AUTH (SAVE JWT FROM URL) -------------------- */
@@ -211,6 +217,7 @@ export default function DashboardPage() {
 
       const data = await response.json()
       setPreviewTracks(data.recommendations)
+      setPreviewId(data.preview_id ?? null)
       setMoodAnalysis(data.mood_analysis)
     } catch (error) {
       console.error('Error:', error)
@@ -222,27 +229,62 @@ export default function DashboardPage() {
 
   /* -------------------- GENERATE PLAYLIST -------------------- */
   const generatePlaylist = async () => {
+    // One key per playlist: clicks before this one settles reuse it and get the same job
+    if (!generateKeyRef.current) generateKeyRef.current = crypto.randomUUID()
+    const idempotencyKey = generateKeyRef.current
+    let settled = false
+
     setPlaylistLoading(true)
     setPlaylistResult(null)
     try {
       const response = await fetch(`${API_URL}/api/playlist/generate`, {
         method: 'POST',
-        headers: getAuthHeaders(),
+        headers: {
+          ...getAuthHeaders(),
+          'Idempotency-Key': idempotencyKey,
+          // Ask for a job to poll instead of holding the request open
+          Prefer: 'respond-async',
+        },
         body: JSON.stringify({
           days,
           num_tracks: numTracks,
+          // Reuse the previewed tracks so the playlist matches what was shown
+          ...(previewId ? { preview_id: previewId } : {}),
         }),
       })
 
-      if (!response.ok) throw new Error('Failed to generate playlist')
+      if (!response.ok) {
+        settled = true
+        throw new Error('Failed to generate playlist')
+      }
+
+      let data = await response.json()
+
+      // 202: the playlist is built in the background, poll until it's done
+      if (response.status === 202) {
+        let job = data
+        while (job.status === 'queued' || job.status === 'running') {
+          await new Promise((resolve) => setTimeout(resolve, 1000))
+          const jobResponse = await fetch(`${API_URL}${job.status_url}`, {
+            headers: getAuthHeaders(),
+          })
+          if (!jobResponse.ok) throw new Error('Failed to get playlist job')
+          job = await jobResponse.json()
+        }
+        settled = true
+        if (job.status !== 'succeeded') throw new Error('Failed to generate playlist')
+        data = job.result
+      }
+      settled = true
 
-      const data = await response.json()
       setPlaylistResult(data)
       setMoodAnalysis(data.mood_analysis)
     } catch (error) {
       console.error('Error:', error)
       alert('Failed to generate playlist')
     } finally {
+      // After a network error the next click retries the same job; otherwise it's a new playlist
+      if (settled && generateKeyRef.current === idempotencyKey) generateKeyRef.current = null
       setPlaylistLoading(false)
     }
   }